@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""Benchmarks of the Kodos evaluation pipeline.
+
+Each scenario generates a corpus (from 1 KB up to 50 MB, with sparse or
+dense matches, with few or many groups) and times the steps Kodos goes
+through when the inputs change:
+
+- evaluate: compile and scan the whole text (onComputeRegex/onValidRegex)
+- rematch: update the result after a one-character edit (onSearchEdit)
+- groups: read the groups of 100 matches (onMatchNumberChange)
+- replace: rebuild the replaced text (onReplaceNumberChange)
+- stream: scan the text by chunks (batch mode on the standard input)
+
+The other scenarios time:
+
+- prefilter: the required-literal prefilter (kodos.prefilter) against a
+  plain finditer, on a log where the literal is rare and on a text full of it
+- model: SimpleTableModel's setRows/clear/append, if PyQt4 is available
+
+The timings (the best of several runs) can be saved as a JSON baseline, and
+compared to a previous baseline: the run fails if a step got slower than the
+baseline by more than a threshold. Baselines are only comparable on the same
+machine.
+
+    python benchmarks/bench.py --save baseline.json
+    python benchmarks/bench.py --compare baseline.json --threshold 0.25
+
+"""
+
+import json
+import optparse
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from kodos import engine, prefilter, stream
+
+
+KB = 1024
+MB = 1024 * KB
+
+SIZES = [1 * KB, 64 * KB, 1 * MB, 10 * MB, 50 * MB]
+
+PATTERNS = {
+    # One match every thousand lines or so
+    'sparse': r'ERROR user_id=(\d+)',
+    # Several matches per line
+    'dense': r'(\w+)=(\w+)',
+    # One match per line, with a lot of groups
+    'groups': (r'(?P<date>(\d{4})-(\d\d)-(\d\d)) (?P<time>(\d\d):(\d\d):(\d\d))'
+               r' (?P<level>\w+) (\w+) id=(?P<id>\d+) user=(?P<user>\w+)'),
+}
+
+REPLACE = r'<\1>'
+
+# A pattern whose required literal doesn't start it
+PREFILTERED = r'\w{1,8} user_id=(\d+)'
+
+
+def generateCorpus(size, seed=42):
+    """Return a log-like text of about `size` bytes, always the same for a
+    given seed"""
+
+    generator = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        if generator.randint(0, 999) == 0:
+            line = "2011-02-01 12:%02d:%02d ERROR user_id=%d failed" % (
+                generator.randint(0, 59), generator.randint(0, 59),
+                generator.randint(0, 99999))
+        else:
+            line = ("2011-02-01 12:%02d:%02d INFO request id=%d user=u%d "
+                    "path=/p%d" % (
+                        generator.randint(0, 59), generator.randint(0, 59),
+                        generator.randint(0, 99999),
+                        generator.randint(0, 999),
+                        generator.randint(0, 99)))
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def measure(function, repeat):
+    """Return the best time of `repeat` calls to `function`"""
+
+    best = None
+    for i in range(repeat):
+        started = time.time()
+        function()
+        elapsed = time.time() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def formatSize(size):
+    if size >= MB:
+        return "%dMB" % (size // MB)
+    return "%dKB" % (size // KB)
+
+
+def pipelineScenarios(sizes, repeat):
+    for size in sizes:
+        text = generateCorpus(size)
+        # One character changed close to the end, as when fixing a typo
+        position = max(0, len(text) - 100)
+        edited = text[:position] + "X" + text[position + 1:]
+        edit = engine.Edit(position, 1, 1)
+
+        for name, pattern in sorted(PATTERNS.items()):
+            scenario = "%s/%s" % (name, formatSize(size))
+            result = engine.evaluate(pattern, 0, text, REPLACE)
+            count = len(result)
+            matches = range(0, count, max(1, count // 100))
+
+            def readGroups():
+                for index in matches:
+                    for group in range(1, result.groups + 1):
+                        result.group(text, index, group)
+
+            steps = [
+                ('evaluate', lambda: engine.evaluate(
+                    pattern, 0, text, REPLACE)),
+                ('rematch', lambda: engine.rematch(result, edited, edit)),
+                ('groups', readGroups),
+                ('replace', lambda: engine.substitute(text, result)),
+                ('stream', lambda: stream.scanText(pattern, 0, text)),
+            ]
+            for step, function in steps:
+                yield "%s/%s" % (scenario, step), measure(function, repeat)
+
+
+def prefilterScenarios(repeat, size=1 * MB):
+    import re
+
+    regex = re.compile(PREFILTERED)
+    literal = prefilter.requiredLiteral(PREFILTERED)
+    texts = [
+        ('rare', generateCorpus(size)),
+        # The literal everywhere, and no match at all
+        ('common', ("user_id= " * (size // 9 + 1))[:size]),
+    ]
+    for name, text in texts:
+        scenario = "prefilter/%s/%s" % (name, formatSize(size))
+        steps = [
+            ('prefilter', lambda: list(prefilter.finditer(
+                regex, text, literal))),
+            ('finditer', lambda: list(regex.finditer(text))),
+        ]
+        for step, function in steps:
+            yield "%s/%s" % (scenario, step), measure(function, repeat)
+
+
+def modelScenarios(repeat, rows=10000):
+    try:
+        from PyQt4.QtCore import QCoreApplication
+        from kodos.model import SimpleTableModel
+    except ImportError:
+        sys.stderr.write("PyQt4 isn't available, skipping the model "
+                         "benchmarks\n")
+        return
+
+    application = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    values = [("group%d" % i, "value%d" % i) for i in range(rows)]
+    model = SimpleTableModel(["Group Name", "Match"])
+
+    def setRows():
+        model.setRows(values)
+
+    def append():
+        model.clear()
+        for row in values[:1000]:
+            model.append(row)
+
+    for step, function in [('setRows', setRows),
+                           ('clear', model.clear),
+                           ('append', append)]:
+        yield "model/%d/%s" % (rows, step), measure(function, repeat)
+
+
+def compare(results, baseline, threshold, floor):
+    """Return the list of the steps which got slower than the baseline"""
+
+    regressions = []
+    for key, elapsed in sorted(results.items()):
+        reference = baseline.get(key)
+        if reference is None or max(elapsed, reference) < floor:
+            continue
+        if elapsed > reference * (1 + threshold):
+            regressions.append((key, reference, elapsed))
+    return regressions
+
+
+def main(args=None):
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option(
+        "--save", metavar="FILE",
+        help="write the results as a JSON baseline in FILE")
+    parser.add_option(
+        "--compare", metavar="FILE",
+        help="compare the results with the JSON baseline in FILE")
+    parser.add_option(
+        "--threshold", type="float", default=0.25,
+        help="relative slowdown considered as a regression "
+             "(default: %default)")
+    parser.add_option(
+        "--floor", type="float", default=0.001, metavar="SECONDS",
+        help="ignore the steps faster than this, which are too noisy "
+             "(default: %default)")
+    parser.add_option(
+        "--max-size", type="int", default=SIZES[-1], metavar="BYTES",
+        help="size of the largest corpus (default: %default)")
+    parser.add_option(
+        "--repeat", type="int", default=3,
+        help="number of runs of each step (default: %default)")
+    options, args = parser.parse_args(args)
+
+    sizes = [size for size in SIZES if size <= options.max_size]
+
+    results = {}
+    scenarios = [pipelineScenarios(sizes, options.repeat),
+                 prefilterScenarios(options.repeat),
+                 modelScenarios(options.repeat)]
+    for scenario in scenarios:
+        for key, elapsed in scenario:
+            results[key] = elapsed
+            sys.stdout.write("%-40s %10.4fs\n" % (key, elapsed))
+            sys.stdout.flush()
+
+    if options.save:
+        baseline = {
+            'python'   : platform.python_version(),
+            'platform' : platform.platform(),
+            'results'  : results,
+        }
+        with open(options.save, 'w') as output:
+            json.dump(baseline, output, indent=2, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as baselineFile:
+            baseline = json.load(baselineFile)['results']
+
+        regressions = compare(results, baseline, options.threshold,
+                              options.floor)
+        for key, reference, elapsed in regressions:
+            sys.stdout.write("REGRESSION %s: %.4fs -> %.4fs (+%d%%)\n" % (
+                key, reference, elapsed, 100 * (elapsed / reference - 1)))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
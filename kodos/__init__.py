@@ -1 +1,30 @@
-from kodos.main import run
+import sys
+
+
+def run(args=None):
+    """Main entry point of the application.
+
+    The GUI is only imported when it is needed, so that the batch mode can
+    run without PyQt4.
+    """
+
+    if args is None:
+        args = sys.argv[1:]
+
+    if [arg for arg in args if arg.startswith('--batch')]:
+        from kodos import batch
+        return batch.run(args)
+
+    # Time the imports too, when profiling the startup
+    startup = None
+    if '--profile-startup' in args:
+        from kodos import timing
+        startup = timing.Tracer(enabled=True)
+        startup.begin()
+        with startup.stage("import PyQt4"):
+            from PyQt4 import QtCore, QtGui
+        with startup.stage("import kodos.main"):
+            import kodos.main
+
+    from kodos.main import run
+    return run(args, startup)
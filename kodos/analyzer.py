@@ -0,0 +1,494 @@
+"""Detect the regex shapes prone to catastrophic backtracking.
+
+The patterns are parsed with the stdlib parser (sre_parse), and their syntax
+tree is checked for the shapes which make a backtracking engine try an
+exponential (or polynomial) number of ways to match a text before failing:
+
+- nested unbounded quantifiers, like "(a+)+" or "(\w+\s?)*";
+- alternatives which can match the same text under a quantifier, like
+  "(\w|\d)+";
+- adjacent quantifiers matching the same characters, like "\d+\d*" or
+  ".*.*".
+
+This is a heuristic: it may miss some dangerous patterns, and flag some
+harmless ones. The character sets are only tracked for the ASCII range.
+
+"""
+
+import sre_constants
+import sre_parse
+
+from kodos import engine
+
+
+# Risk levels of the findings
+POLYNOMIAL = 1
+EXPONENTIAL = 2
+
+RISKS = {
+    POLYNOMIAL  : "polynomial",
+    EXPONENTIAL : "exponential",
+}
+
+# How many analyses are kept around by analyze()
+ANALYSES_CACHE_SIZE = 64
+
+# Nodes of the syntax tree holding a parenthesized subexpression. In Python
+# 2.7, the conditional "(?(1)...)" is wrapped in a non-capturing subpattern.
+_GROUPS = (sre_constants.SUBPATTERN, sre_constants.ASSERT,
+           sre_constants.ASSERT_NOT)
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_CHARACTERS = (sre_constants.LITERAL, sre_constants.NOT_LITERAL,
+               sre_constants.ANY, sre_constants.IN, sre_constants.CATEGORY)
+
+# Characters matched by the categories; None stands for "any character"
+_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT : frozenset(map(ord, "0123456789")),
+    sre_constants.CATEGORY_SPACE : frozenset(map(ord, " \t\n\r\f\v")),
+    sre_constants.CATEGORY_WORD  : frozenset(
+        [c for c in xrange(128) if chr(c).isalnum()] + [ord("_")]),
+}
+
+# Ranges larger than this are considered as matching any character
+_MAX_RANGE = 1024
+
+_INLINE_FLAGS = "iLmsux"
+
+
+class Finding(object):
+    """A part of a pattern prone to catastrophic backtracking.
+
+    [start, end[ is the position of the offending subexpression in the
+    pattern.
+    """
+
+    def __init__(self, risk, message, start, end):
+        self.risk = risk
+        self.message = message
+        self.start = start
+        self.end = end
+
+    def __str__(self):
+        return "%s (%s backtracking)" % (self.message, RISKS[self.risk])
+
+    def __repr__(self):
+        return "<Finding %r at %d-%d>" % (str(self), self.start, self.end)
+
+
+def risk(findings):
+    """Return the highest risk of a list of findings, or 0"""
+
+    return max([finding.risk for finding in findings] or [0])
+
+
+_analyses = engine.LRUCache(ANALYSES_CACHE_SIZE)
+
+
+def analyze(pattern, flags=0):
+    """Return the list of Findings of a pattern, the riskiest first.
+
+    Invalid patterns have no findings: evaluating them reports the error.
+    """
+
+    key = (type(pattern), pattern, flags)
+    findings = _analyses.get(key)
+    if findings is None:
+        findings = _analyze(pattern, flags)
+        _analyses.put(key, findings)
+    return findings
+
+
+def _analyze(pattern, flags):
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (sre_constants.error, IndexError, OverflowError, RuntimeError):
+        return []
+
+    flags = parsed.pattern.flags
+    analyzer = _Analyzer(
+        pattern, parenSpans(pattern, flags & sre_constants.SRE_FLAG_VERBOSE),
+        flags & sre_constants.SRE_FLAG_IGNORECASE)
+    analyzer.walk(parsed.data, (0, len(pattern)), 0)
+
+    findings = sorted(analyzer.findings.itervalues(),
+                      key=lambda finding: (-finding.risk, finding.start))
+    return findings
+
+
+def parenSpans(pattern, verbose):
+    """Return the [start, end[ spans of the parenthesized subexpressions of
+    a pattern, in the order of their opening parenthesis.
+
+    Only the parentheses which appear as a node of the syntax tree are
+    returned: not the inline flags, the comments and the named
+    backreferences.
+    """
+
+    spans = []
+    stack = []
+    length = len(pattern)
+    index = 0
+
+    while index < length:
+        char = pattern[index]
+
+        if char == "\\":
+            index += 2
+            continue
+
+        if char == "[":
+            # Skip the character set, in which "]" may come first
+            index += 1
+            if pattern[index:index + 1] == "^":
+                index += 1
+            if pattern[index:index + 1] == "]":
+                index += 1
+            while index < length and pattern[index] != "]":
+                index += 2 if pattern[index] == "\\" else 1
+            index += 1
+            continue
+
+        if verbose and char == "#":
+            newline = pattern.find("\n", index)
+            index = length if newline == -1 else newline + 1
+            continue
+
+        if char == "(":
+            if pattern.startswith("(?#", index):
+                closing = pattern.find(")", index)
+                index = length if closing == -1 else closing + 1
+                continue
+
+            if (pattern.startswith("(?P=", index)
+                    or (pattern[index + 1:index + 2] == "?"
+                        and pattern[index + 2:index + 3] in _INLINE_FLAGS
+                        and pattern[index + 2:index + 3])):
+                stack.append(None)
+            else:
+                stack.append(len(spans))
+                spans.append([index, length])
+
+            if pattern.startswith("(?(", index):
+                # The condition isn't a subexpression
+                closing = pattern.find(")", index + 3)
+                index = length if closing == -1 else closing + 1
+                continue
+
+        elif char == ")" and stack:
+            opened = stack.pop()
+            if opened is not None:
+                spans[opened][1] = index + 1
+
+        index += 1
+
+    return [tuple(span) for span in spans]
+
+
+def _quantifierEnd(pattern, position):
+    """Return the end of the quantifier starting at `position`"""
+
+    if pattern[position:position + 1] == "{":
+        closing = pattern.find("}", position)
+        position = len(pattern) if closing == -1 else closing + 1
+    elif pattern[position:position + 1] in ("*", "+", "?"):
+        position += 1
+    else:
+        return position
+
+    # Lazy quantifier
+    if pattern[position:position + 1] == "?":
+        position += 1
+    return position
+
+
+def _items(subpattern):
+    return getattr(subpattern, 'data', subpattern)
+
+
+def _isUnbounded(op, av):
+    return op in _REPEATS and av[1] >= sre_constants.MAXREPEAT
+
+
+def _minWidth(op, av):
+    """Return the minimal number of characters a node matches"""
+
+    if op in _CHARACTERS:
+        return 1
+    if op == sre_constants.SUBPATTERN:
+        return _sequenceMinWidth(av[-1])
+    if op == sre_constants.BRANCH:
+        return min(_sequenceMinWidth(branch) for branch in av[1])
+    if op in _REPEATS:
+        return av[0] * _sequenceMinWidth(av[2])
+    # Assertions, and the backreferences which may be empty
+    return 0
+
+
+def _sequenceMinWidth(subpattern):
+    return sum(_minWidth(op, av) for op, av in _items(subpattern))
+
+
+class _Except(frozenset):
+    """The set of every character but the ones it holds, as matched by
+    "[^abc]" for instance"""
+
+
+def _union(first, second):
+    if first is None or second is None:
+        return None
+    if isinstance(first, _Except) and isinstance(second, _Except):
+        return _Except(first & second)
+    if isinstance(second, _Except):
+        first, second = second, first
+    if isinstance(first, _Except):
+        return _Except(first - second) or None
+    return first | second
+
+
+def _isEmpty(chars):
+    return chars is not None and not isinstance(chars, _Except) and not chars
+
+
+def _overlap(first, second):
+    if _isEmpty(first) or _isEmpty(second):
+        return False
+    if first is None or second is None:
+        return True
+    if isinstance(second, _Except):
+        first, second = second, first
+    if isinstance(first, _Except):
+        # The complements always overlap: there are infinitely many
+        # characters
+        return isinstance(second, _Except) or bool(second - first)
+    return bool(first & second)
+
+
+class _Analyzer(object):
+
+    def __init__(self, pattern, spans, ignoreCase):
+        self.pattern = pattern
+        self.spans = spans
+        self.ignoreCase = ignoreCase
+
+        # Index of the next parenthesized subexpression met by the walk
+        self.paren = 0
+        # Findings, by (message, start, end), to drop the duplicates
+        self.findings = {}
+
+    def add(self, risk, message, span):
+        start, end = span
+        key = (message, start, end)
+        finding = self.findings.get(key)
+        if finding is None or finding.risk < risk:
+            self.findings[key] = Finding(risk, message, start, end)
+
+    def nextParen(self, enclosing):
+        if self.paren < len(self.spans):
+            span = self.spans[self.paren]
+        else:
+            span = enclosing
+        self.paren += 1
+        return span
+
+    def repeatSpan(self, body, enclosing):
+        """Return the position of a quantified subexpression, if it is
+        parenthesized, and the enclosing span otherwise"""
+
+        items = _items(body)
+        if (len(items) == 1 and items[0][0] in _GROUPS
+                and self.paren < len(self.spans)):
+            start, end = self.spans[self.paren]
+            return start, _quantifierEnd(self.pattern, end)
+        return enclosing
+
+    # Character sets
+    def fold(self, chars):
+        if chars is None or not self.ignoreCase:
+            return chars
+        # The excluded characters of an _Except are folded the same way
+        return type(chars)(chars | frozenset(ord(chr(c).swapcase())
+                                             for c in chars if c < 128))
+
+    def charset(self, op, av):
+        """Return the characters matched by a one-character node"""
+
+        if op == sre_constants.LITERAL:
+            return self.fold(frozenset([av]))
+        if op == sre_constants.NOT_LITERAL:
+            return self.fold(_Except([av]))
+        if op == sre_constants.CATEGORY:
+            return _CATEGORIES.get(av)
+        if op != sre_constants.IN:
+            # ANY
+            return None
+
+        chars = frozenset()
+        negated = av and av[0][0] == sre_constants.NEGATE
+        for itemOp, itemAv in av[1:] if negated else av:
+            if itemOp == sre_constants.LITERAL:
+                chars |= frozenset([itemAv])
+            elif itemOp == sre_constants.RANGE:
+                low, high = itemAv
+                if high - low > _MAX_RANGE:
+                    return None
+                chars |= frozenset(xrange(low, high + 1))
+            elif itemOp == sre_constants.CATEGORY:
+                category = _CATEGORIES.get(itemAv)
+                if category is None:
+                    return None
+                chars |= category
+            else:
+                return None
+        if negated:
+            chars = _Except(chars)
+        return self.fold(chars)
+
+    def chars(self, subpattern):
+        """Return all the characters a sequence can match"""
+
+        chars = frozenset()
+        for op, av in _items(subpattern):
+            if op in _CHARACTERS:
+                chars = _union(chars, self.charset(op, av))
+            elif op == sre_constants.SUBPATTERN:
+                chars = _union(chars, self.chars(av[-1]))
+            elif op == sre_constants.BRANCH:
+                for branch in av[1]:
+                    chars = _union(chars, self.chars(branch))
+            elif op in _REPEATS:
+                chars = _union(chars, self.chars(av[2]))
+            elif op in (sre_constants.GROUPREF,
+                        sre_constants.GROUPREF_EXISTS):
+                return None
+        return chars
+
+    def firsts(self, subpattern):
+        """Return the characters a sequence can start with"""
+
+        chars = frozenset()
+        for op, av in _items(subpattern):
+            if op in _CHARACTERS:
+                chars = _union(chars, self.charset(op, av))
+            elif op == sre_constants.SUBPATTERN:
+                chars = _union(chars, self.firsts(av[-1]))
+            elif op == sre_constants.BRANCH:
+                for branch in av[1]:
+                    chars = _union(chars, self.firsts(branch))
+            elif op in _REPEATS:
+                chars = _union(chars, self.firsts(av[2]))
+            elif op in (sre_constants.GROUPREF,
+                        sre_constants.GROUPREF_EXISTS):
+                return None
+
+            if _minWidth(op, av):
+                break
+        return chars
+
+    # The shapes
+    def hasFreeRepeat(self, subpattern):
+        """Tell if a sequence holds an unbounded repeat while everything else
+        in it can match the empty string: repeating the sequence is then
+        ambiguous."""
+
+        items = _items(subpattern)
+        for index, (op, av) in enumerate(items):
+            rest = items[:index] + items[index + 1:]
+            if any(_minWidth(restOp, restAv) for restOp, restAv in rest):
+                continue
+
+            if _isUnbounded(op, av):
+                return True
+            if op == sre_constants.SUBPATTERN and self.hasFreeRepeat(av[-1]):
+                return True
+            if op == sre_constants.BRANCH and any(
+                    self.hasFreeRepeat(branch) for branch in av[1]):
+                return True
+        return False
+
+    def hasOverlappingBranches(self, subpattern):
+        """Tell if a sequence holds alternatives which can match the same
+        text"""
+
+        for op, av in _items(subpattern):
+            if op == sre_constants.BRANCH:
+                branches = av[1]
+                for index, branch in enumerate(branches):
+                    for other in branches[index + 1:]:
+                        if (_sequenceMinWidth(branch) == 0
+                                and _sequenceMinWidth(other) == 0):
+                            return True
+                        if _overlap(self.firsts(branch), self.firsts(other)):
+                            return True
+                children = branches
+            elif op == sre_constants.SUBPATTERN:
+                children = [av[-1]]
+            elif op in _REPEATS:
+                children = [av[2]]
+            else:
+                continue
+
+            if any(self.hasOverlappingBranches(child) for child in children):
+                return True
+        return False
+
+    def checkAdjacent(self, located, repeats, enclosing):
+        """Look for adjacent unbounded repeats matching the same characters
+        in a sequence of (op, av, span) nodes"""
+
+        for index, (op, av, span) in enumerate(located):
+            if not _isUnbounded(op, av):
+                continue
+
+            chars = self.chars(av[2])
+            for otherOp, otherAv, otherSpan in located[index + 1:]:
+                if (_isUnbounded(otherOp, otherAv)
+                        and _overlap(chars, self.chars(otherAv[2]))):
+                    if span != enclosing and otherSpan != enclosing:
+                        span = (span[0], otherSpan[1])
+                    else:
+                        span = enclosing
+                    self.add(EXPONENTIAL if repeats else POLYNOMIAL,
+                             "Adjacent quantifiers matching the same "
+                             "characters", span)
+                    break
+                if _minWidth(otherOp, otherAv):
+                    break
+
+    def walk(self, subpattern, enclosing, repeats):
+        """Check a sequence of nodes; `enclosing` is the span of the
+        innermost parenthesized subexpression holding it, and `repeats` the
+        number of unbounded repeats around it."""
+
+        located = []
+        for op, av in _items(subpattern):
+            span = enclosing
+
+            if op in _GROUPS:
+                span = self.nextParen(enclosing)
+                self.walk(av[-1], span, repeats)
+
+            elif op in _REPEATS:
+                body = av[2]
+                span = self.repeatSpan(body, enclosing)
+                if _isUnbounded(op, av):
+                    if self.hasFreeRepeat(body):
+                        self.add(EXPONENTIAL, "Nested quantifiers", span)
+                    elif self.hasOverlappingBranches(body):
+                        self.add(EXPONENTIAL, "Alternatives matching the "
+                                 "same text under a quantifier", span)
+                    self.walk(body, span, repeats + 1)
+                else:
+                    self.walk(body, span, repeats)
+
+            elif op == sre_constants.BRANCH:
+                for branch in av[1]:
+                    self.walk(branch, enclosing, repeats)
+
+            elif op == sre_constants.GROUPREF_EXISTS:
+                for branch in av[1:]:
+                    if branch is not None:
+                        self.walk(branch, enclosing, repeats)
+
+            located.append((op, av, span))
+
+        self.checkAdjacent(located, repeats, enclosing)
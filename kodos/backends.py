@@ -0,0 +1,136 @@
+"""The regex engines the patterns can be evaluated with.
+
+A backend adapts a re-like module to what Kodos needs: compiling patterns,
+mapping the flags, and telling which exceptions report an invalid pattern.
+The compiled patterns are expected to provide the API of the re ones
+(search(), finditer(), sub(), groups, groupindex), and so do their matches.
+
+The stdlib re backend is always available. The other ones are only available
+if their module can be imported.
+
+"""
+
+import re
+import sys
+from collections import OrderedDict
+
+
+# Name of the backend used when none is specified
+DEFAULT = 're'
+
+# The flags, by their one-letter name (as in "(?imsx)"), and the name of the
+# attribute holding their value in the re-like modules
+FLAG_NAMES = OrderedDict([
+    ('I', 'IGNORECASE'),
+    ('L', 'LOCALE'),
+    ('M', 'MULTILINE'),
+    ('S', 'DOTALL'),
+    ('U', 'UNICODE'),
+    ('X', 'VERBOSE'),
+])
+
+
+class Backend(object):
+    """A regex engine, built around a re-like module"""
+
+    # Name the backend is selected by
+    name = None
+    # Short description displayed in the GUI
+    description = None
+    # Whether sub() skips an empty match adjacent to the previous match,
+    # which finditer() still reports
+    subSkipsAdjacentEmpty = False
+
+    def __init__(self, module):
+        self.module = module
+
+        # The backend flags, by their one-letter name
+        self.flags = OrderedDict()
+        for letter, attribute in FLAG_NAMES.iteritems():
+            if hasattr(module, attribute):
+                self.flags[letter] = getattr(module, attribute)
+
+        # Exceptions raised when compiling an invalid pattern (re raises an
+        # IndexError for "(?P<>)")
+        self.errors = (module.error, IndexError)
+
+    def compile(self, pattern, flags=0):
+        return self.module.compile(pattern, flags)
+
+    def parseFlags(self, letters):
+        """Return the flags of this backend named by `letters` (like "IM")"""
+
+        flags = 0
+        for letter in letters.upper():
+            try:
+                flags |= self.flags[letter]
+            except KeyError:
+                raise ValueError("Unknown regex flag: %r" % letter)
+        return flags
+
+
+class ReBackend(Backend):
+    name = 're'
+    description = "Python standard re module"
+    # Up to Python 3.7
+    subSkipsAdjacentEmpty = sys.version_info < (3, 7)
+
+    def __init__(self):
+        super(ReBackend, self).__init__(re)
+
+
+class RegexBackend(Backend):
+    name = 'regex'
+    description = "Third-party regex module"
+
+    def __init__(self):
+        import regex
+        super(RegexBackend, self).__init__(regex)
+
+
+# The known backends, by name, in the order they are presented
+BACKENDS = OrderedDict()
+
+_instances = {}
+
+
+def register(backend):
+    """Make a Backend subclass known to Kodos"""
+
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+def get(name=DEFAULT):
+    """Return the backend called `name`.
+
+    Raise a ValueError if there is no such backend, or if it is unavailable.
+    """
+
+    backend = _instances.get(name)
+    if backend is None:
+        try:
+            backend = _instances[name] = BACKENDS[name]()
+        except KeyError:
+            raise ValueError("Unknown regex engine: %r" % name)
+        except ImportError, e:
+            raise ValueError("The %r regex engine is unavailable: %s"
+                             % (name, e))
+    return backend
+
+
+def available():
+    """Return the names of the backends which can be used"""
+
+    names = []
+    for name in BACKENDS:
+        try:
+            get(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return names
+
+
+register(ReBackend)
+register(RegexBackend)
@@ -0,0 +1,453 @@
+"""Count the steps a backtracking matcher takes to run a pattern.
+
+The pattern is run by a small backtracking matcher, built from its syntax
+tree (as parsed by sre_parse), which counts the steps and the backtracks of
+each parenthesized subexpression of the pattern: the work done by the
+nodes which aren't in any parenthesis is counted for the whole pattern.
+
+The matcher follows the semantics of the re one, but none of its
+optimizations: the counts tell where a pattern spends its time, not exactly
+how many operations re does. Character classes and case folding only handle
+the ASCII range.
+
+"""
+
+import sre_constants as sre
+import sre_parse
+import sys
+
+from kodos import analyzer
+
+
+# Number of steps after which the matcher gives up
+DEFAULT_BUDGET = 1000000
+
+# The matcher recurses for each node, and for each iteration of a repeat
+# which isn't over a single character.
+RECURSION_LIMIT = 4000
+
+_SPACES = frozenset(" \t\n\r\f\v")
+
+
+def _isWord(char):
+    return char.isalnum() or char == "_"
+
+
+_CATEGORIES = {
+    sre.CATEGORY_DIGIT         : lambda char: char.isdigit(),
+    sre.CATEGORY_NOT_DIGIT     : lambda char: not char.isdigit(),
+    sre.CATEGORY_SPACE         : lambda char: char in _SPACES,
+    sre.CATEGORY_NOT_SPACE     : lambda char: char not in _SPACES,
+    sre.CATEGORY_WORD          : _isWord,
+    sre.CATEGORY_NOT_WORD      : lambda char: not _isWord(char),
+    sre.CATEGORY_LINEBREAK     : lambda char: char == "\n",
+    sre.CATEGORY_NOT_LINEBREAK : lambda char: char != "\n",
+}
+
+
+class _Exhausted(Exception):
+    """Raised when the matcher ran out of steps"""
+
+
+class StepCount(object):
+    """The steps and backtracks taken to run a pattern over a text.
+
+    `spans` are the [start, end[ positions, in the pattern, of the
+    subexpressions the counts are given for: the first one is the whole
+    pattern, then come its parenthesized subexpressions. `steps` and
+    `backtracks` are the counts of each of them.
+
+    `matches` lists the (start, end, steps, backtracks) of each match found,
+    where the counts include the failed attempts since the previous match.
+    If the budget of steps ran out, `exhausted` is set and `scanned` is the
+    offset at which the matcher gave up.
+    """
+
+    def __init__(self, pattern, spans, error=None):
+        self.pattern = pattern
+        self.spans = spans
+        self.steps = [0] * len(spans)
+        self.backtracks = [0] * len(spans)
+        self.matches = []
+        self.exhausted = False
+        self.scanned = 0
+        self.error = error
+
+    def totalSteps(self):
+        return sum(self.steps)
+
+    def totalBacktracks(self):
+        return sum(self.backtracks)
+
+    def summary(self):
+        """Return the counts, as a text"""
+
+        if self.error is not None:
+            return "Steps not counted: %s" % self.error
+
+        text = "%d steps, %d backtracks" % (self.totalSteps(),
+                                            self.totalBacktracks())
+        if self.exhausted:
+            text += " (gave up at offset %d)" % self.scanned
+        return text
+
+
+class _Matcher(object):
+    """Build the matching functions of a syntax tree.
+
+    Each node is compiled to a function taking the position at which it
+    should match, and a continuation, called with the position following
+    the node: it returns the end of the whole match, or None.
+    """
+
+    def __init__(self, text, flags, count, budget):
+        self.text = text
+        self.end = len(text)
+        self.ignoreCase = flags & sre.SRE_FLAG_IGNORECASE
+        self.dotAll = flags & sre.SRE_FLAG_DOTALL
+        self.multiLine = flags & sre.SRE_FLAG_MULTILINE
+        self.count = count
+        self.budget = budget
+        self.used = 0
+        # The (start, end) of the groups matched so far
+        self.marks = {}
+        # Index of the next parenthesized subexpression met while building
+        self.paren = 0
+
+    def step(self, region):
+        self.count.steps[region] += 1
+        self.used += 1
+        if self.used > self.budget:
+            raise _Exhausted()
+
+    def backtrack(self, region):
+        self.count.backtracks[region] += 1
+
+    # Single characters
+    def fold(self, char):
+        return char.lower() if self.ignoreCase else char
+
+    def predicate(self, op, av):
+        """Return a function telling if a character matches a one-character
+        node, or None if the node isn't one"""
+
+        fold = self.fold
+        if op == sre.LITERAL:
+            literal = fold(chr(av))
+            return lambda char: fold(char) == literal
+        if op == sre.NOT_LITERAL:
+            literal = fold(chr(av))
+            return lambda char: fold(char) != literal
+        if op == sre.ANY:
+            if self.dotAll:
+                return lambda char: True
+            return lambda char: char != "\n"
+        if op != sre.IN:
+            return None
+
+        negate = False
+        tests = []
+        for itemOp, itemAv in av:
+            if itemOp == sre.NEGATE:
+                negate = True
+            elif itemOp == sre.LITERAL:
+                tests.append(lambda char, literal=fold(chr(itemAv)):
+                             fold(char) == literal)
+            elif itemOp == sre.RANGE:
+                tests.append(self.inRange(*itemAv))
+            elif itemOp == sre.CATEGORY:
+                tests.append(_CATEGORIES.get(itemAv, lambda char: False))
+
+        if negate:
+            return lambda char: not any(test(char) for test in tests)
+        return lambda char: any(test(char) for test in tests)
+
+    def inRange(self, low, high):
+        if not self.ignoreCase:
+            return lambda char: low <= ord(char) <= high
+        return lambda char: any(low <= ord(c) <= high
+                                for c in (char, char.lower(), char.upper()))
+
+    def at(self, code, pos):
+        text, end = self.text, self.end
+        if code == sre.AT_BEGINNING:
+            return pos == 0 or (self.multiLine and text[pos - 1] == "\n")
+        if code == sre.AT_BEGINNING_STRING:
+            return pos == 0
+        if code == sre.AT_END:
+            return (pos == end or (pos == end - 1 and text[pos] == "\n")
+                    or (self.multiLine and text[pos] == "\n"))
+        if code == sre.AT_END_STRING:
+            return pos == end
+
+        before = pos > 0 and _isWord(text[pos - 1])
+        after = pos < end and _isWord(text[pos])
+        if code == sre.AT_BOUNDARY:
+            return before != after
+        return before == after
+
+    # Building the matching functions
+    def sequence(self, subpattern, region):
+        nodes = [self.node(op, av, region) for op, av in subpattern]
+
+        def chain(index):
+            if index == len(nodes):
+                return lambda pos, k: k(pos)
+            first, rest = nodes[index], chain(index + 1)
+            return lambda pos, k: first(pos, lambda p: rest(p, k))
+
+        return chain(0)
+
+    def nextRegion(self):
+        self.paren += 1
+        return min(self.paren, len(self.count.spans) - 1)
+
+    def node(self, op, av, region):
+        predicate = self.predicate(op, av)
+        if predicate is not None:
+            return self.single(predicate, region)
+
+        if op == sre.AT:
+            def at(pos, k):
+                self.step(region)
+                return k(pos) if self.at(av, pos) else None
+            return at
+
+        if op == sre.SUBPATTERN:
+            group, subpattern = av
+            return self.group(group, self.sequence(
+                subpattern, self.nextRegion()), region)
+
+        if op == sre.BRANCH:
+            return self.branch(
+                [self.sequence(branch, region) for branch in av[1]], region)
+
+        if op in (sre.MAX_REPEAT, sre.MIN_REPEAT):
+            low, high, body = av
+            greedy = op == sre.MAX_REPEAT
+            if len(body) == 1:
+                predicate = self.predicate(*body[0])
+                if predicate is not None:
+                    return self.repeatSingle(predicate, low, high, greedy,
+                                             region)
+            return self.repeat(self.sequence(body, region), low, high,
+                               greedy, region)
+
+        if op == sre.GROUPREF:
+            return self.groupref(av, region)
+
+        if op == sre.GROUPREF_EXISTS:
+            group, yes, no = av
+            yes = self.sequence(yes, region)
+            no = self.sequence(no or [], region)
+
+            def exists(pos, k):
+                self.step(region)
+                if group in self.marks:
+                    return yes(pos, k)
+                return no(pos, k)
+            return exists
+
+        if op in (sre.ASSERT, sre.ASSERT_NOT):
+            direction, subpattern = av
+            return self.assertion(
+                op == sre.ASSERT, direction, subpattern,
+                self.sequence(subpattern, self.nextRegion()), region)
+
+        raise ValueError("Unsupported regex construct: %s" % op)
+
+    def single(self, predicate, region):
+        text = self.text
+
+        def single(pos, k):
+            self.step(region)
+            if pos < self.end and predicate(text[pos]):
+                return k(pos + 1)
+            return None
+        return single
+
+    def repeatSingle(self, predicate, low, high, greedy, region):
+        """A repeat of a one-character node, which doesn't recurse for each
+        character"""
+
+        text = self.text
+
+        def repeat(pos, k):
+            self.step(region)
+            limit = min(self.end, pos + high)
+            count = pos
+            while count < pos + low:
+                if count >= limit or not predicate(text[count]):
+                    return None
+                self.step(region)
+                count += 1
+
+            if greedy:
+                while count < limit and predicate(text[count]):
+                    self.step(region)
+                    count += 1
+                while True:
+                    result = k(count)
+                    if result is not None or count == pos + low:
+                        return result
+                    self.backtrack(region)
+                    count -= 1
+
+            while True:
+                result = k(count)
+                if result is not None:
+                    return result
+                if count >= limit or not predicate(text[count]):
+                    return None
+                self.backtrack(region)
+                self.step(region)
+                count += 1
+
+        return repeat
+
+    def repeat(self, body, low, high, greedy, region):
+
+        def iterate(pos, k, count):
+            self.step(region)
+
+            def again(p):
+                # An empty iteration would loop forever
+                if p == pos and count >= low:
+                    return None
+                return iterate(p, k, count + 1)
+
+            if greedy:
+                if count < high:
+                    result = body(pos, again)
+                    if result is not None:
+                        return result
+                    if count >= low:
+                        self.backtrack(region)
+                return k(pos) if count >= low else None
+
+            if count >= low:
+                result = k(pos)
+                if result is not None:
+                    return result
+                if count < high:
+                    self.backtrack(region)
+            if count < high:
+                return body(pos, again)
+            return None
+
+        return lambda pos, k: iterate(pos, k, 0)
+
+    def group(self, group, body, region):
+        marks = self.marks
+
+        def match(pos, k):
+            self.step(region)
+            if group is None:
+                return body(pos, k)
+
+            def close(p):
+                saved = marks.get(group)
+                marks[group] = (pos, p)
+                result = k(p)
+                if result is None:
+                    if saved is None:
+                        del marks[group]
+                    else:
+                        marks[group] = saved
+                return result
+            return body(pos, close)
+        return match
+
+    def branch(self, branches, region):
+
+        def match(pos, k):
+            self.step(region)
+            for index, branch in enumerate(branches):
+                if index:
+                    self.backtrack(region)
+                result = branch(pos, k)
+                if result is not None:
+                    return result
+            return None
+        return match
+
+    def groupref(self, group, region):
+        text = self.text
+
+        def match(pos, k):
+            self.step(region)
+            if group not in self.marks:
+                return None
+            start, end = self.marks[group]
+            matched = text[start:end]
+            candidate = text[pos:pos + len(matched)]
+            if self.fold(candidate) != self.fold(matched):
+                return None
+            return k(pos + len(matched))
+        return match
+
+    def assertion(self, positive, direction, subpattern, body, region):
+        width = subpattern.getwidth()[0] if direction < 0 else 0
+
+        def match(pos, k):
+            self.step(region)
+            if direction < 0:
+                start = pos - width
+                matched = start >= 0 and body(
+                    start, lambda p: p if p == pos else None) is not None
+            else:
+                matched = body(pos, lambda p: p) is not None
+            if matched != positive:
+                return None
+            return k(pos)
+        return match
+
+
+def countSteps(pattern, flags, text, budget=DEFAULT_BUDGET):
+    """Run a pattern over a text like re.finditer(), counting the steps
+    taken by each of its subexpressions; return a StepCount"""
+
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (sre.error, IndexError, OverflowError, RuntimeError), e:
+        return StepCount(pattern, [(0, len(pattern))], str(e))
+
+    flags = parsed.pattern.flags
+    spans = [(0, len(pattern))] + analyzer.parenSpans(
+        pattern, flags & sre.SRE_FLAG_VERBOSE)
+    count = StepCount(pattern, spans)
+
+    matcher = _Matcher(text, flags, count, budget)
+    try:
+        run = matcher.sequence(parsed.data, 0)
+    except ValueError, e:
+        count.error = str(e)
+        return count
+
+    if sys.getrecursionlimit() < RECURSION_LIMIT:
+        sys.setrecursionlimit(RECURSION_LIMIT)
+
+    pos = 0
+    steps = backtracks = 0
+    try:
+        while pos <= len(text):
+            count.scanned = pos
+            matcher.marks.clear()
+            end = run(pos, lambda p: p)
+            if end is None:
+                pos += 1
+                continue
+
+            total, totalBacktracks = (count.totalSteps(),
+                                      count.totalBacktracks())
+            count.matches.append((pos, end, total - steps,
+                                  totalBacktracks - backtracks))
+            steps, backtracks = total, totalBacktracks
+            pos = end if end > pos else pos + 1
+        count.scanned = len(text)
+    except _Exhausted:
+        count.exhausted = True
+    except RuntimeError:
+        count.error = "the pattern recursed too deeply"
+
+    return count
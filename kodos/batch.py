@@ -0,0 +1,262 @@
+"""Headless batch mode: run a regex over files, the way Kodos would.
+
+    run-kodos --batch PATTERN [--flags FLAGS] [--engine NAME] [--jobs N]
+              [FILE...]
+
+The files are scanned in parallel by a pool of processes, and each match is
+written on the standard output as a JSON object, one per line. The matches
+are sent back by the processes in batches, as they are found: the batches of
+the files scanned at the same time may be interleaved. Statistics
+about the whole run are written as a JSON object on the standard error once
+every file has been scanned. The standard input is scanned (by chunks) if no
+file is given, or for the "-" file.
+
+This doesn't need PyQt4: only the GUI-independent modules are used.
+
+"""
+
+import json
+import multiprocessing
+import optparse
+import os
+import Queue
+import sys
+import time
+
+from kodos import backends, engine, largefile, stream
+
+
+# Number of matches the processes of the pool send back at once
+BATCH_SIZE = 1000
+
+# How often, in seconds, the pool is checked for failed scans while no
+# batch arrives
+POLL_INTERVAL = 0.5
+
+# The queue the processes of the pool send their batches to
+_queue = None
+
+
+def _decode(value):
+    if value is None:
+        return None
+    return value.decode('utf-8', 'replace')
+
+
+def matchRecord(path, number, spans, groupindex, slice):
+    """Return the JSON-able description of a match.
+
+    `spans` is the flat tuple of the spans of the match and of its groups (see
+    kodos.engine.EvaluationResult), and `slice(start, end)` returns a part of
+    the text the match has been found in.
+    """
+
+    def group(index):
+        start, end = spans[2 * index], spans[2 * index + 1]
+        if start == -1:
+            return None
+        return _decode(slice(start, end))
+
+    return {
+        'file'   : path,
+        'match'  : number,
+        'start'  : spans[0],
+        'end'    : spans[1],
+        'text'   : group(0),
+        'groups' : [group(i) for i in range(1, len(spans) // 2)],
+        'named'  : dict((name, group(index))
+                        for name, index in groupindex.iteritems()),
+    }
+
+
+def _initWorker(queue):
+    global _queue
+    _queue = queue
+
+
+def scanPath(job):
+    """Scan a file, in a process of the pool.
+
+    The matches are sent to the queue of the pool, already serialized as
+    JSON, as ('lines', lines) messages of up to BATCH_SIZE lines. A final
+    ('done', (size, error)) message is sent once the file has been scanned,
+    or couldn't be.
+    """
+
+    path, pattern, flags, backend = job
+    size = 0
+    error = None
+    try:
+        size = _scanPath(path, pattern, flags, backend)
+    except EnvironmentError, e:
+        error = str(e)
+    finally:
+        _queue.put(('done', (size, error)))
+
+
+def _scanPath(path, pattern, flags, backend):
+    size = os.path.getsize(path)
+    if not size:
+        # Empty files can't be memory-mapped
+        return 0
+
+    text = largefile.MappedFile(path)
+    try:
+        regex = engine.compile(pattern, flags, backend)
+        groups = range(regex.groups + 1)
+        slice = lambda start, end: text[start:end]
+        lines = []
+        number = 0
+        for match in engine.finditer(regex, pattern, flags, text.mapped,
+                                     backend):
+            number += 1
+            spans = []
+            for group in groups:
+                spans.extend(match.span(group))
+            lines.append(json.dumps(matchRecord(path, number, spans,
+                                                regex.groupindex, slice)))
+            if len(lines) == BATCH_SIZE:
+                _queue.put(('lines', lines))
+                lines = []
+        if lines:
+            _queue.put(('lines', lines))
+    finally:
+        text.close()
+
+    return size
+
+
+def scanStdin(pattern, flags, backend, output):
+    """Scan the standard input by chunks, and return the (size, matches)
+    scanned"""
+
+    regex = engine.compile(pattern, flags, backend)
+    scanner = stream.StreamScanner(regex, sys.stdin)
+    for spans in scanner:
+        record = matchRecord('-', scanner.progress.matches, spans,
+                             regex.groupindex, scanner.text)
+        output.write(json.dumps(record) + '\n')
+
+    return scanner.progress.scanned, scanner.progress.matches
+
+
+def scanPaths(paths, pattern, flags, backend, jobs, output, errors, stats):
+    """Scan files in a pool of `jobs` processes, write their matches as they
+    arrive, and add up the statistics of the scans to `stats`"""
+
+    # A bounded queue stops the processes when the output can't keep up
+    queue = multiprocessing.Queue(2 * jobs)
+    pool = multiprocessing.Pool(min(jobs, len(paths)), _initWorker, (queue,))
+    try:
+        scans = pool.map_async(
+            scanPath, [(path, pattern, flags, backend) for path in paths],
+            chunksize=1)
+        pending = len(paths)
+        while pending:
+            try:
+                kind, payload = queue.get(timeout=POLL_INTERVAL)
+            except Queue.Empty:
+                if scans.ready():
+                    # Raises the exception a scan failed with, if any
+                    scans.get()
+                continue
+
+            if kind == 'lines':
+                stats['matches'] += len(payload)
+                for line in payload:
+                    output.write(line + '\n')
+                output.flush()
+                continue
+
+            pending -= 1
+            size, error = payload
+            if error is not None:
+                errors.write("kodos: %s\n" % error)
+                stats['errors'] += 1
+            else:
+                stats['files'] += 1
+                stats['bytes'] += size
+        scans.get()
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def parseArgs(args):
+    parser = optparse.OptionParser(
+        usage="%prog --batch PATTERN [options] [FILE...]")
+    parser.add_option(
+        "--batch", metavar="PATTERN",
+        help="run PATTERN over the files without starting the GUI")
+    parser.add_option(
+        "--flags", default="", metavar="FLAGS",
+        help="regex flags, by their one-letter name: %s"
+             % "".join(backends.FLAG_NAMES))
+    parser.add_option(
+        "--engine", type="choice", choices=list(backends.BACKENDS),
+        default=backends.DEFAULT, metavar="NAME",
+        help="regex engine, one of: %s (default: %%default)"
+             % ", ".join(backends.BACKENDS))
+    parser.add_option(
+        "--jobs", type="int", default=multiprocessing.cpu_count(),
+        metavar="N",
+        help="number of files scanned in parallel (default: %default)")
+
+    options, paths = parser.parse_args(args)
+    if options.batch is None:
+        parser.error("--batch is required")
+    if options.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    try:
+        options.flags = backends.get(options.engine).parseFlags(options.flags)
+    except ValueError, e:
+        parser.error(str(e))
+
+    return options, paths or ['-']
+
+
+def run(args=None, output=sys.stdout, errors=sys.stderr):
+    """Entry point of the batch mode.
+
+    Return 0 if something matched, 1 if nothing did, and 2 if an error
+    occured, like grep.
+    """
+
+    if args is None:
+        args = sys.argv[1:]
+    options, paths = parseArgs(args)
+    pattern, flags, backend = options.batch, options.flags, options.engine
+
+    try:
+        engine.compile(pattern, flags, backend)
+    except backends.get(backend).errors, e:
+        errors.write("kodos: invalid pattern: %s\n" % e.args[0])
+        return 2
+
+    started = time.time()
+    stats = {'files': 0, 'bytes': 0, 'matches': 0, 'errors': 0}
+
+    if '-' in paths:
+        size, matches = scanStdin(pattern, flags, backend, output)
+        stats['files'] += 1
+        stats['bytes'] += size
+        stats['matches'] += matches
+        paths = [path for path in paths if path != '-']
+
+    if paths:
+        scanPaths(paths, pattern, flags, backend, options.jobs, output,
+                  errors, stats)
+
+    elapsed = time.time() - started
+    stats['seconds'] = round(elapsed, 3)
+    stats['bytesPerSecond'] = int(stats['bytes'] / elapsed) if elapsed else 0
+    errors.write(json.dumps({'stats': stats}) + '\n')
+
+    if stats['errors']:
+        return 2
+    return 0 if stats['matches'] else 1
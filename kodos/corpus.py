@@ -0,0 +1,172 @@
+"""A corpus of samples a pattern should, or should not, match.
+
+A corpus is loaded either from a text file, with one sample per line:
+
+    +a sample which should match
+    -a sample which should not match
+
+(lines without a mark should match), or from a directory holding a "match"
+and a "nomatch" subdirectory, where each file is a sample.
+
+The samples are evaluated by batches (see evaluateBatch()), which can be run
+in parallel by a pool of worker processes. Each sample only gets a verdict
+(matched or not) once per pattern: the verdicts of the last patterns are
+kept, so that going back to a pattern only evaluates the samples it has not
+been evaluated with yet, and changing what a sample should do doesn't need
+any evaluation.
+
+"""
+
+import os
+from array import array
+
+from kodos import backends, engine
+
+
+# Verdicts of the samples
+UNKNOWN = -1
+NO_MATCH = 0
+MATCH = 1
+
+# Subdirectories of a corpus directory, and what their samples should do
+DIRECTORIES = [('match', True), ('nomatch', False)]
+
+
+def evaluateBatch(pattern, flags, texts, backend=backends.DEFAULT):
+    """Return the verdicts (MATCH or NO_MATCH) of a pattern over `texts`, as
+    an array, or None if the pattern is invalid"""
+
+    try:
+        regex = engine.compile(pattern, flags, backend)
+    except backends.get(backend).errors:
+        return None
+
+    search = regex.search
+    return array('b', [MATCH if search(text) else NO_MATCH
+                       for text in texts])
+
+
+class Corpus(object):
+    """Samples, what they are expected to do, and their verdicts"""
+
+    # Number of patterns whose verdicts are kept
+    VERDICTS_CACHE_SIZE = 16
+
+    def __init__(self, samples=(), source=None):
+        self.source = source
+        self.texts = []
+        # True for the samples which should match
+        self.expected = array('b')
+        self.extend(samples)
+
+        # The verdicts of each sample, keyed by (backend, pattern, flags)
+        self._verdicts = engine.LRUCache(self.VERDICTS_CACHE_SIZE)
+
+    @classmethod
+    def fromFile(cls, path):
+        """Load a corpus from a text file, with one sample per line"""
+
+        samples = []
+        with open(path, 'rb') as lines:
+            for line in lines:
+                line = line.rstrip('\r\n')
+                if line.startswith('-'):
+                    samples.append((line[1:], False))
+                elif line.startswith('+'):
+                    samples.append((line[1:], True))
+                elif line:
+                    samples.append((line, True))
+        return cls(samples, path)
+
+    @classmethod
+    def fromDirectory(cls, path):
+        """Load a corpus from the "match" and "nomatch" subdirectories of a
+        directory"""
+
+        samples = []
+        for directory, expected in DIRECTORIES:
+            directory = os.path.join(path, directory)
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                sample = os.path.join(directory, name)
+                if os.path.isfile(sample):
+                    with open(sample, 'rb') as content:
+                        samples.append((content.read(), expected))
+
+        if not samples:
+            raise IOError("No sample in %s (expected %s subdirectories)"
+                          % (path, " and ".join(
+                              repr(name) for name, _ in DIRECTORIES)))
+        return cls(samples, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a corpus from a file or a directory"""
+
+        if os.path.isdir(path):
+            return cls.fromDirectory(path)
+        return cls.fromFile(path)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def extend(self, samples):
+        """Append (text, should match) samples to the corpus"""
+
+        for text, expected in samples:
+            self.texts.append(text)
+            self.expected.append(bool(expected))
+
+    def setExpected(self, index, expected):
+        """Tell whether a sample should match; it doesn't need to be evaluated
+        again"""
+
+        self.expected[index] = bool(expected)
+
+    def verdicts(self, key):
+        """Return the verdicts array of the (backend, pattern, flags) `key`,
+        where the samples not evaluated yet are UNKNOWN"""
+
+        verdicts = self._verdicts.get(key)
+        if verdicts is None:
+            verdicts = array('b')
+            self._verdicts.put(key, verdicts)
+        if len(verdicts) < len(self):
+            missing = len(self) - len(verdicts)
+            verdicts.extend(array('b', [UNKNOWN]) * missing)
+        return verdicts
+
+    def batches(self, key, size):
+        """Return the [(indexes, texts), ...] batches of at most `size` samples
+        which haven't been evaluated yet for `key`"""
+
+        pending = [index for index, verdict in enumerate(self.verdicts(key))
+                   if verdict == UNKNOWN]
+        return [(pending[start:start + size],
+                 [self.texts[index] for index in pending[start:start + size]])
+                for start in xrange(0, len(pending), size)]
+
+    def record(self, key, indexes, verdicts):
+        """Record the verdicts of a batch of samples"""
+
+        current = self.verdicts(key)
+        for index, verdict in zip(indexes, verdicts):
+            current[index] = verdict
+
+    def summary(self, key):
+        """Return the counts of (passed, false negatives, false positives,
+        unknown) samples: false negatives should match but don't, and false
+        positives match but shouldn't"""
+
+        passed = falseNegatives = falsePositives = unknown = 0
+        for expected, verdict in zip(self.expected, self.verdicts(key)):
+            if verdict == UNKNOWN:
+                unknown += 1
+            elif verdict == expected:
+                passed += 1
+            elif expected:
+                falseNegatives += 1
+            else:
+                falsePositives += 1
+        return passed, falseNegatives, falsePositives, unknown
@@ -0,0 +1,635 @@
+"""Regex evaluation logic, independent from any GUI toolkit.
+
+Everything here only deals with plain Python objects so it can be run in a
+worker process and its results sent back to the GUI.
+
+"""
+
+import sre_constants
+import sre_parse
+import time
+from array import array
+from collections import OrderedDict
+
+from kodos import backends
+
+
+# How many compiled patterns are kept around by compile()
+PATTERNS_CACHE_SIZE = 64
+
+# How many characters around an edit rematch() considers as possibly
+# influencing the matches
+REMATCH_CONTEXT = 1024
+
+# Size of the windows by which evaluate() scans the texts larger than this,
+# when it reports its progress
+SCAN_WINDOW = 256 * 1024
+
+# Nodes of the syntax tree which look at the text around a match
+_LOOKAROUND = (sre_constants.AT, sre_constants.ASSERT,
+               sre_constants.ASSERT_NOT)
+_BACKREFERENCES = (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS)
+
+
+class LRUCache(object):
+    """A mapping which only keeps its `size` most recently used items"""
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            return default
+        # Move the item at the most recently used end
+        self._items[key] = value
+        return value
+
+    def put(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+
+_patterns = LRUCache(PATTERNS_CACHE_SIZE)
+
+
+def compile(pattern, flags=0, backend=backends.DEFAULT):
+    """Compile a pattern with a backend (see kodos.backends), and keep the
+    compiled patterns in a LRU cache.
+
+    re has its own cache, but it is purged as a whole once it is full.
+    """
+
+    key = (backend, type(pattern), pattern, flags)
+    regex = _patterns.get(key)
+    if regex is None:
+        regex = backends.get(backend).compile(pattern, flags)
+        _patterns.put(key, regex)
+    return regex
+
+
+class EvaluationResult(object):
+    """The outcome of evaluating a regex against a text.
+
+    The matches are stored in `spans`, a flat array holding for each match the
+    spans of the whole match and of each of its groups:
+    (start, end, group1start, group1end, ...); a group which didn't
+    participate in the match has a (-1, -1) span. This keeps the result
+    compact and cheap to send from a worker process, whatever the number of
+    matches.
+
+    `expansions` holds, for each match, the `replace` template expanded for
+    this match (or is None if there was no replacement template).
+
+    `timings` holds the (stage, start, duration) of the steps of the
+    evaluation, as measured where it ran (see kodos.timing).
+
+    `backend` is the name of the regex engine which evaluated the pattern
+    (see kodos.backends); `flags` are the flags of this backend.
+
+    `capped` is set when only the beginning of the text the result refers
+    to has been evaluated: the result can't be updated by rematch().
+
+    """
+
+    def __init__(self, pattern, flags, groups=0, groupindex=None,
+                 spans=None, expansions=None, error=None, replaceError=None,
+                 replace=None, backend=backends.DEFAULT):
+        self.pattern = pattern
+        self.flags = flags
+        self.replace = replace
+        self.backend = backend
+        self.groups = groups
+        self.groupindex = groupindex or {}
+        self.spans = spans if spans is not None else array('l')
+        self.expansions = expansions
+        self.error = error
+        self.replaceError = replaceError
+        self.timings = []
+        self.capped = False
+
+        # Number of values stored per match in self.spans
+        self.stride = 2 * (groups + 1)
+
+    def __len__(self):
+        return len(self.spans) // self.stride
+
+    def span(self, index, group=0):
+        """Return the (start, end) span of a group in the index-th match"""
+
+        offset = index * self.stride + 2 * group
+        return self.spans[offset], self.spans[offset + 1]
+
+    def group(self, text, index, group=0):
+        """Return the value of a group in the index-th match, or None if the
+        group didn't participate in the match."""
+
+        start, end = self.span(index, group)
+        if start == -1:
+            return None
+        return text[start:end]
+
+    def sortedByGroup(self, text, group=0, reverse=False):
+        """Return the indexes of the matches, sorted by the value of a group
+        (those in which it didn't participate first).
+
+        The values are compared as buffers over the text, which can be a
+        string or a kodos.largefile.MappedFile: they are neither copied nor
+        decoded (UTF-8 bytes sort like the characters they encode).
+        """
+
+        data = getattr(text, 'mapped', text)
+        def key(index):
+            start, end = self.span(index, group)
+            if start == -1:
+                return None
+            return buffer(data, start, end - start)
+
+        return sorted(xrange(len(self)), key=key, reverse=reverse)
+
+    def groupNames(self):
+        """Return the names of the groups, "" for the unnamed ones"""
+
+        groupsIndexes = dict((v, k) for (k, v) in self.groupindex.iteritems())
+        return [groupsIndexes.get(i, "") for i in range(1, self.groups + 1)]
+
+    def duration(self):
+        """Return how long the evaluation took, in seconds"""
+
+        return sum(duration for stage, start, duration in self.timings)
+
+
+class ScanProgress(object):
+    """Statistics of a running scan.
+
+    When the progress is reported with the matches found so far, `spans`
+    holds the spans of the matches found since the previous report (in the
+    format of EvaluationResult.spans), for a pattern with `groups` groups.
+
+    """
+
+    def __init__(self, total=None):
+        # Size of the whole input, if it is known
+        self.total = total
+        self.scanned = 0
+        self.matches = 0
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.groups = 0
+        self.spans = None
+
+    def update(self):
+        self.elapsed = time.time() - self.started
+
+    def throughput(self):
+        """Return the number of bytes scanned per second"""
+
+        if not self.elapsed:
+            return 0.0
+        return self.scanned / self.elapsed
+
+
+def evaluate(pattern, flags, text, replace=None, backend=backends.DEFAULT,
+             progress=None, interval=0.1):
+    """Compile and run a regex over a text, and return an EvaluationResult.
+
+    `progress`, if specified, is called with a ScanProgress holding the
+    matches found so far, every `interval` seconds while the matches are
+    collected: nothing is reported by the evaluations taking less time.
+    The progress is reported as the scan advances when the matches can't
+    be wider than REMATCH_CONTEXT (see canRematch()), and only as the
+    matches are found otherwise.
+    """
+
+    started = time.time()
+    try:
+        regex = compile(pattern, flags, backend)
+    except backends.get(backend).errors, e:
+        return EvaluationResult(pattern, flags, error=e.args[0],
+                                backend=backend)
+
+    result = EvaluationResult(pattern, flags, regex.groups, regex.groupindex,
+                              replace=replace, backend=backend)
+    compiled = time.time()
+    result.timings.append(('compile', started, compiled - started))
+
+    result.expansions = [] if replace else None
+    stop = None
+    matches = None
+    if progress is not None:
+        report = _reporter(result, ScanProgress(len(text)), progress,
+                           interval)
+        stop = lambda match: report(match.start())
+        if len(text) > SCAN_WINDOW and canRematch(pattern, flags):
+            matches = _windowedFinditer(regex, text, REMATCH_CONTEXT, report)
+    if matches is None:
+        matches = finditer(regex, pattern, flags, text, backend)
+    _collect(result, matches, stop)
+    result.timings.append(('finditer', compiled, time.time() - compiled))
+    return result
+
+
+def finditer(regex, pattern, flags, text, backend=backends.DEFAULT):
+    """Iterate over the matches of a compiled regex, skipping the parts of
+    the text which can't hold one when possible (see kodos.prefilter)"""
+
+    if backend == 're':
+        from kodos import prefilter
+        literal = prefilter.requiredLiteral(pattern, flags)
+        if literal is not None:
+            return prefilter.finditer(regex, text, literal)
+    return regex.finditer(text)
+
+
+def _windowedFinditer(regex, text, width, scanned):
+    """Iterate over the matches of a compiled regex, like
+    regex.finditer(text), scanning the text by windows of SCAN_WINDOW
+    characters: `scanned` is called with the position reached after each
+    of them.
+
+    The matches must only depend on the text they match, and can't be wider
+    than `width`: the ones starting `width` characters before the end of a
+    window are the same as in the whole text.
+    """
+
+    position = 0
+    while position + SCAN_WINDOW < len(text):
+        end = position + SCAN_WINDOW
+        limit = end - width
+        last = None
+        for match in regex.finditer(text, position, end):
+            if match.start() > limit:
+                break
+            yield match
+            last = match
+        if last is not None:
+            start, position = last.span()
+            # re doesn't allow an empty match right where the previous one
+            # ended
+            position += start == position
+        # Every start up to the limit has been tried
+        position = max(position, limit + 1)
+        scanned(position)
+
+    for match in regex.finditer(text, position):
+        yield match
+
+
+def _reporter(result, scanProgress, progress, interval):
+    """Return a callback reporting the matches collected in `result` to
+    `progress`, every `interval` seconds, with the position the scan has
+    reached"""
+
+    scanProgress.groups = result.groups
+    # When the progress has been reported last, and how many spans had been
+    # collected then
+    lastReport = [scanProgress.started, 0]
+
+    def report(position):
+        now = time.time()
+        if now - lastReport[0] > interval:
+            scanProgress.scanned = position
+            scanProgress.matches = len(result)
+            scanProgress.spans = result.spans[lastReport[1]:]
+            scanProgress.update()
+            progress(scanProgress)
+            lastReport[:] = [now, len(result.spans)]
+        return False
+
+    return report
+
+
+def _collect(result, matches, stop=None):
+    """Append the spans (and the expansions) of `matches` to `result`.
+
+    `stop`, if specified, is called with each match before it is added, and
+    the collect is stopped if it returns True. Return True if the collect has
+    been stopped this way.
+    """
+
+    groups = range(result.groups + 1)
+    spans = result.spans
+    replace = result.replace
+
+    for match in matches:
+        if stop is not None and stop(match):
+            return True
+
+        for group in groups:
+            spans.extend(match.span(group))
+
+        if result.expansions is not None:
+            try:
+                result.expansions.append(match.expand(replace))
+            except backends.get(result.backend).errors, e:
+                result.replaceError = e.args[0]
+                result.expansions = None
+
+    return False
+
+
+class Edit(object):
+    """A range of a text which has been modified.
+
+    The characters in [start, oldEnd[ in the old text have been replaced by
+    the ones in [start, newEnd[ in the new text. Several edits can be merged
+    into one range.
+    """
+
+    def __init__(self, position, removed, added):
+        self.start = position
+        self.oldEnd = position + removed
+        self.newEnd = position + added
+
+    def delta(self):
+        """Return how much the text after the edit has been shifted"""
+
+        return self.newEnd - self.oldEnd
+
+    def merge(self, position, removed, added):
+        """Merge a new edit, made on the new text, into this one"""
+
+        end = max(self.newEnd, position + removed)
+        self.oldEnd += end - self.newEnd
+        self.newEnd = end + added - removed
+        self.start = min(self.start, position)
+
+
+def _firstEndingAfter(result, position):
+    """Return the index of the first match of `result` ending after
+    `position` (the matches don't overlap, so their ends are sorted)"""
+
+    low, high = 0, len(result)
+    while low < high:
+        middle = (low + high) // 2
+        if result.span(middle)[1] <= position:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _isLocal(items):
+    """Tell whether a parsed (sub)pattern only depends on the bounded text
+    it matches: it has no lookaround and its width is bounded"""
+
+    for op, av in items:
+        if op in _LOOKAROUND or op in _BACKREFERENCES:
+            return False
+        if (op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+                and av[1] >= sre_constants.MAXREPEAT):
+            return False
+        for value in (av if isinstance(av, (tuple, list)) else [av]):
+            if isinstance(value, sre_parse.SubPattern):
+                if not _isLocal(value):
+                    return False
+            elif (op == sre_constants.BRANCH
+                    and isinstance(value, list)
+                    and not all(_isLocal(branch) for branch in value)):
+                return False
+    return True
+
+
+_locals = LRUCache(PATTERNS_CACHE_SIZE)
+
+
+def canRematch(pattern, flags):
+    """Tell whether rematch() can update the results of a pattern: its
+    matches must not depend on the text beyond the edit context, so they
+    can't be longer than REMATCH_CONTEXT either. The patterns the stdlib
+    parser doesn't understand (like the variable-width lookbehinds of the
+    regex module) are always evaluated again."""
+
+    key = (type(pattern), pattern, flags)
+    if key not in _locals:
+        try:
+            parsed = sre_parse.parse(pattern, flags)
+            local = (_isLocal(parsed)
+                     and parsed.getwidth()[1] <= REMATCH_CONTEXT)
+        except (sre_constants.error, IndexError, OverflowError,
+                RuntimeError):
+            local = False
+        _locals.put(key, local)
+    return _locals.get(key)
+
+
+def rematch(previous, text, edit, context=REMATCH_CONTEXT):
+    """Update the result of a previous evaluation after its text has been
+    edited, and return a new EvaluationResult.
+
+    The matches ending well before the edit are kept as is, and the text is
+    rescanned from the end of the last of them. Once the rescan finds, after
+    the edit, a match identical to one of the previous matches (shifted by
+    the size of the edit), the scan would go on exactly as before: the
+    remaining previous matches are shifted instead of being searched again.
+    The cost is proportional to the size of the edit, rather than to the
+    size of the text. The patterns whose matches may depend on text further
+    away (see canRematch()) are evaluated again over the whole text.
+    """
+
+    pattern, flags = previous.pattern, previous.flags
+    replace, backend = previous.replace, previous.backend
+    if (previous.error is not None
+            or (replace and previous.expansions is None)
+            or previous.capped or not canRematch(pattern, flags)):
+        return evaluate(pattern, flags, text, replace, backend)
+
+    started = time.time()
+    regex = compile(pattern, flags, backend)
+    result = EvaluationResult(pattern, flags, regex.groups, regex.groupindex,
+                              replace=replace, backend=backend)
+    stride = result.stride
+
+    # Keep the matches which can't have been influenced by the edit
+    kept = _firstEndingAfter(previous, edit.start - context)
+    result.spans = previous.spans[:kept * stride]
+    if replace:
+        result.expansions = previous.expansions[:kept]
+
+    restart = 0
+    if kept:
+        start, end = previous.span(kept - 1)
+        # re doesn't allow an empty match right where the previous one ended
+        restart = end + (start == end)
+
+    delta = edit.delta()
+    safe = edit.newEnd + context
+    # Index of the first previous match which may be the same as the current
+    # match, once shifted.
+    candidate = [kept]
+
+    def converged(match):
+        start = match.start()
+        if start < safe:
+            return False
+
+        index = candidate[0]
+        while (index < len(previous)
+               and previous.span(index)[0] < start - delta):
+            index += 1
+        candidate[0] = index
+        if index == len(previous):
+            return False
+
+        offset = index * stride
+        for group in range(result.groups + 1):
+            matchStart, matchEnd = match.span(group)
+            if matchStart != -1:
+                matchStart -= delta
+                matchEnd -= delta
+            if (previous.spans[offset + 2 * group] != matchStart
+                    or previous.spans[offset + 2 * group + 1] != matchEnd):
+                return False
+        return True
+
+    if _collect(result, regex.finditer(text, restart), converged):
+        # Scanning further would only find the previous matches again
+        tail = previous.spans[candidate[0] * stride:]
+        if delta:
+            tail = array('l', (value if value == -1 else value + delta
+                               for value in tail))
+        result.spans.extend(tail)
+        if result.expansions is not None:
+            result.expansions.extend(previous.expansions[candidate[0]:])
+
+    result.timings.append(('rematch', started, time.time() - started))
+    return result
+
+
+def substitute(text, result, count=0):
+    """Rebuild what regex.sub(replace, text, count) would return, from the
+    spans and the expansions of an EvaluationResult.
+
+    A count of 0 means replacing every match.
+    """
+
+    pieces = []
+    last = 0
+    previousEnd = -1
+    done = 0
+    skipsAdjacentEmpty = backends.get(result.backend).subSkipsAdjacentEmpty
+
+    for index in range(len(result)):
+        if count and done == count:
+            break
+
+        start, end = result.span(index)
+        if (skipsAdjacentEmpty
+                and start == end and start == previousEnd):
+            continue
+
+        pieces.append(text[last:start])
+        pieces.append(result.expansions[index])
+        last = previousEnd = end
+        done += 1
+
+    pieces.append(text[last:])
+    return "".join(pieces)
+
+
+def compare(pattern, letters, text, replace=None, names=None):
+    """Evaluate a regex with several backends (every available one by
+    default), and return a list of (backend name, EvaluationResult).
+
+    The flags are given by their one-letter name (like "IM"), as each
+    backend has its own flag values.
+    """
+
+    results = []
+    for name in names or backends.available():
+        flags = backends.get(name).parseFlags(letters)
+        results.append((name, evaluate(pattern, flags, text, replace, name)))
+    return results
+
+
+def sameMatches(result, other):
+    """Tell if two evaluation results found the same matches, and expanded
+    the replacement template the same way"""
+
+    if result.error is not None or other.error is not None:
+        return result.error is not None and other.error is not None
+
+    return (result.spans == other.spans
+            and result.expansions == other.expansions)
+
+
+class ReplacePreview(object):
+    """Turn the result of substitute(text, result, count) into the one for
+    another count, by splicing only the replacements in between.
+
+    `measure` returns the length of a piece of text, and `position` maps an
+    offset in `text` to a position, in the unit of the editor the preview is
+    displayed in; both default to the byte offsets and lengths.
+    """
+
+    def __init__(self, text, result, measure=len, position=None):
+        self.text = text
+        self.result = result
+        self.measure = measure
+        self.position = position or (lambda offset: offset)
+
+        # Indexes of the matches substitute() replaces, in order
+        self.applied = array('l')
+        # How much the text is shifted once the first j matches of
+        # self.applied have been replaced
+        self.shifts = array('l', [0])
+
+        previousEnd = -1
+        skipsAdjacentEmpty = backends.get(
+            result.backend).subSkipsAdjacentEmpty
+        for index in xrange(len(result)):
+            start, end = result.span(index)
+            if (skipsAdjacentEmpty
+                    and start == end and start == previousEnd):
+                continue
+            self.applied.append(index)
+            previousEnd = end
+            self.shifts.append(self.shifts[-1]
+                               + measure(result.expansions[index])
+                               - measure(text[start:end]))
+
+    def _count(self, count):
+        if count == 0 or count > len(self.applied):
+            return len(self.applied)
+        return count
+
+    def edits(self, old, new):
+        """Return the edits turning the text with `old` replacements into the
+        text with `new` replacements, as a list of (position, removed,
+        added) tuples to apply in order: `removed` is the length of the
+        text to replace by `added` at `position`."""
+
+        old, new = self._count(old), self._count(new)
+        text, result = self.text, self.result
+        edits = []
+
+        # Replace the next matches...
+        for replaced in xrange(old, new):
+            index = self.applied[replaced]
+            start, end = result.span(index)
+            edits.append((self.position(start) + self.shifts[replaced],
+                          self.measure(text[start:end]),
+                          result.expansions[index]))
+
+        # ... or restore the last replaced ones
+        for replaced in xrange(old - 1, new - 1, -1):
+            index = self.applied[replaced]
+            start, end = result.span(index)
+            edits.append((self.position(start) + self.shifts[replaced],
+                          self.measure(result.expansions[index]),
+                          text[start:end]))
+
+        return edits
@@ -0,0 +1,93 @@
+"""Search regexes in files too large to be loaded in a text editor.
+
+The files are memory-mapped, and the regexes run directly over the mapped
+buffer: only the pages the regex is reading are loaded in memory, whatever
+the size of the file. The GUI only displays a page of the file around the
+selected match.
+
+"""
+
+import mmap
+
+from kodos import backends, engine
+
+
+def _map(fileobj):
+    return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def scanFile(pattern, flags, path, backend=backends.DEFAULT):
+    """Evaluate a regex against the content of a file.
+
+    This is meant to be run in a worker process: the result only holds the
+    spans of the matches, not the matched texts.
+    """
+
+    fileobj = open(path, 'rb')
+    try:
+        mapped = _map(fileobj)
+        try:
+            return engine.evaluate(pattern, flags, mapped, backend=backend)
+        finally:
+            mapped.close()
+    finally:
+        fileobj.close()
+
+
+class MappedFile(object):
+    """A read-only, memory-mapped file.
+
+    It can be sliced like a string, so it can be used as the text an
+    evaluation result refers to. The regexes can run over its `mapped`
+    buffer.
+    """
+
+    # Approximative size of the page displayed around a match, in bytes
+    PAGE_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self.mapped = _map(self._file)
+        except (ValueError, EnvironmentError):
+            # mmap refuses to map empty files
+            self._file.close()
+            raise IOError("Unable to map %s (is it empty?)" % path)
+
+    def __len__(self):
+        return len(self.mapped)
+
+    def __getitem__(self, index):
+        return self.mapped[index]
+
+    def close(self):
+        self.mapped.close()
+        self._file.close()
+
+    def page(self, start, end):
+        """Return a (pageStart, pageText) tuple for the page holding the
+        [start, end[ range of the file.
+
+        The page is extended by about PAGE_SIZE / 2 bytes on each side of the
+        range, up to a line boundary if there is one close enough.
+        """
+
+        margin = self.PAGE_SIZE // 2
+        mapped = self.mapped
+        # Don't load a huge match as a whole
+        end = min(end, start + self.PAGE_SIZE)
+
+        pageStart = max(0, start - margin)
+        if pageStart > 0:
+            newline = mapped.rfind('\n', max(0, pageStart - margin), pageStart)
+            if newline != -1:
+                pageStart = newline + 1
+
+        pageEnd = min(len(mapped), end + margin)
+        if pageEnd < len(mapped):
+            newline = mapped.find('\n', pageEnd, pageEnd + margin)
+            if newline != -1:
+                pageEnd = newline
+
+        return pageStart, mapped[pageStart:pageEnd]
@@ -0,0 +1,173 @@
+"""A persistent library of regexes.
+
+The library is stored as a JSON file with one entry per line, in
+~/.kodos/library.jsonl by default. Nothing is read before the library is
+actually used, and the entries are searched through a trigram index, built
+on the first search: a query only looks at the entries containing all of its
+trigrams.
+
+"""
+
+import json
+import os
+from array import array
+
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".kodos", "library.jsonl")
+
+
+class Entry(object):
+    """A regex of the library, with its flags (by their one-letter names),
+    a sample text to run it against and some notes"""
+
+    FIELDS = ['name', 'pattern', 'flags', 'sample', 'notes']
+
+    def __init__(self, name=u"", pattern=u"", flags="", sample=u"", notes=u""):
+        self.name = name
+        self.pattern = pattern
+        self.flags = flags
+        self.sample = sample
+        self.notes = notes
+
+    def __repr__(self):
+        return "<Entry %r: %r>" % (self.name, self.pattern)
+
+    @classmethod
+    def fromJSON(cls, line):
+        values = json.loads(line)
+        return cls(**dict((field, values.get(field, u""))
+                          for field in cls.FIELDS))
+
+    def toJSON(self):
+        return json.dumps(dict((field, getattr(self, field))
+                               for field in self.FIELDS))
+
+    def haystack(self):
+        """Return the text the searches look into"""
+
+        return u"\n".join([self.name, self.pattern, self.notes]).lower()
+
+
+def trigrams(text):
+    """Return the set of the 3-character substrings of a text"""
+
+    return set(text[i:i + 3] for i in xrange(len(text) - 2))
+
+
+class Library(object):
+    """The entries of a library file, and their search index"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._entries = None
+
+        # The lowercased text searched in each entry, and the indexes of the
+        # entries containing each trigram (in increasing order)
+        self._haystacks = None
+        self._index = None
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def _load(self):
+        try:
+            lines = open(self.path, 'rb')
+        except IOError:
+            # No library yet
+            return []
+
+        with lines:
+            return [Entry.fromJSON(line) for line in lines if line.strip()]
+
+    def save(self):
+        """Write the whole library back to its file"""
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        temporary = self.path + ".tmp"
+        with open(temporary, 'wb') as output:
+            for entry in self.entries:
+                output.write(entry.toJSON() + "\n")
+        os.rename(temporary, self.path)
+
+    def add(self, entry):
+        """Add an entry at the end of the library, and return its index"""
+
+        # Loaded before the file is appended to, or the new entry would be
+        # loaded along with the previous ones, and then added again
+        entries = self.entries
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.path, 'ab') as output:
+            output.write(entry.toJSON() + "\n")
+
+        entries.append(entry)
+        index = len(entries) - 1
+        if self._index is not None:
+            self._indexEntry(index, entry)
+        return index
+
+    def remove(self, index):
+        """Remove the index-th entry of the library"""
+
+        del self.entries[index]
+        self.save()
+        # The indexes of the next entries changed
+        self._index = self._haystacks = None
+
+    def _indexEntry(self, index, entry):
+        haystack = entry.haystack()
+        self._haystacks.append(haystack)
+        for trigram in trigrams(haystack):
+            self._index.setdefault(trigram, array('l')).append(index)
+
+    def _buildIndex(self):
+        self._haystacks = []
+        self._index = {}
+        for index, entry in enumerate(self.entries):
+            self._indexEntry(index, entry)
+
+    def search(self, query):
+        """Return the indexes of the entries whose name, pattern or notes
+        contain every word of `query`, case insensitively"""
+
+        if self._index is None:
+            self._buildIndex()
+
+        candidates = None
+        words = query.lower().split()
+        for word in words:
+            postings = [self._index.get(trigram, ())
+                        for trigram in trigrams(word)]
+            # Start from the rarest trigram, and stop as soon as nothing is
+            # left
+            for entries in sorted(postings, key=len):
+                if candidates is None:
+                    candidates = set(entries)
+                else:
+                    candidates.intersection_update(entries)
+                if not candidates:
+                    return []
+
+        if candidates is None:
+            candidates = xrange(len(self._haystacks))
+        else:
+            candidates = sorted(candidates)
+
+        # The trigrams may not be adjacent, and the words shorter than 3
+        # characters have none
+        return [index for index in candidates
+                if all(word in self._haystacks[index] for word in words)]
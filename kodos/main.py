@@ -1,117 +1,741 @@
-import re
+import multiprocessing
+import optparse
 import sys
+import time
 
 from PyQt4 import QtCore
-from PyQt4.QtGui import QApplication, QMainWindow
-from PyQt4.QtGui import QTextCursor, QTextCharFormat, QColor
+from PyQt4.QtGui import QApplication, QMainWindow, QFileDialog, QMessageBox
+from PyQt4.QtGui import QInputDialog, QPlainTextDocumentLayout, QTextDocument
+from PyQt4.QtGui import QTextCharFormat, QTextCursor, QTextEdit, QColor
 
-from kodos import widgets, model
+from kodos import analyzer, backends, corpus, engine, model, profiling
+from kodos import scheduler, snapshot, timing, widgets, worker
 from kodos.ui.ui_main import Ui_MainWindow
 
 
 
 class KodosMainWindow(QMainWindow, Ui_MainWindow):
 
+    # How many evaluation results are kept around, so that going back to a
+    # previous pattern or set of flags doesn't need a new evaluation.
+    RESULTS_CACHE_SIZE = 16
+
+    # Search texts larger than this (in bytes) are evaluated without time
+    # limit, with the progress of the scan displayed in the status bar (see
+    # kodos.engine.evaluate() for when it is reported).
+    STREAM_THRESHOLD = 8 * 1024 * 1024
+
+    # Patterns prone to exponential backtracking (see kodos.analyzer) are
+    # only run against this many bytes of the search text.
+    RISKY_INPUT_LIMIT = 64 * 1024
+
+    # Moving the replace count by more than this many replacements rebuilds
+    # the whole replace preview, instead of splicing the replacements in.
+    REPLACE_SPLICE_LIMIT = 256
+
+    # Number of samples of a corpus evaluated by a worker at once
+    CORPUS_BATCH_SIZE = 256
+
+    # Number of subexpressions listed with their steps count
+    STEPS_REPORTED = 5
+
+    # Time allowed to each run of the scaling profiler (in seconds): the
+    # larger inputs of a series which takes longer are not tried.
+    SCALING_TIMEOUT = 2.0
+
     validRegex = QtCore.pyqtSignal()
     invalidRegex = QtCore.pyqtSignal(str, str)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None,
+                 delay=scheduler.EvaluationScheduler.DEFAULT_DELAY,
+                 timeout=worker.EvaluationPool.DEFAULT_TIMEOUT, trace=None,
+                 profile=None):
         super(KodosMainWindow, self).__init__(parent)
         self.setupUi(self)
 
-        # This is the current regex object
-        self.regex = None
+        # Time the stages of the updates; the recorded timings are written to
+        # the `trace` file (if any) when the window is closed.
+        self.tracer = timing.Tracer(enabled=trace is not None)
+        self.traceFile = trace
+        self.actionRecord_Timings.setChecked(self.tracer.enabled)
+
+        # Profile the event handlers; the profiles are written to the
+        # `profile` file (if any) when the window is closed. The handlers are
+        # wrapped before being connected to their signals.
+        self.profiler = profiling.HandlerProfiler(enabled=profile is not None)
+        self.profileFile = profile
+        self.actionProfile_Handlers.setChecked(self.profiler.enabled)
+        for name in profiling.HANDLERS:
+            setattr(self, name, self.profiler.wrap(name, getattr(self, name)))
+
+        # Coalesce the bursts of changes (typing, toggling flags) into a
+        # single regex evaluation.
+        self.scheduler = scheduler.EvaluationScheduler(delay, self)
+
+        # The regexes are evaluated in worker processes, so that a runaway
+        # pattern can't freeze the GUI.
+        self.pool = worker.EvaluationPool(timeout=timeout, parent=self)
+        # When the last evaluation has been submitted to the pool
+        self._submitted = None
+        # Job id of the running engines comparison, if any, and whether it
+        # interrupted an evaluation, which is run again once it is done
+        self._compareJob = None
+        self._compareInterrupted = False
+
+        # This is the result of the last evaluation, and the text it has been
+        # computed against.
+        self.result = None
+        self.search = ""
+        # The matches reported so far by the running evaluation (an
+        # incomplete kodos.engine.EvaluationResult), which are displayed as
+        # self.result until it completes.
+        self.partialResult = None
+
+        # Revision of each input, bumped each time its text changes, and the
+        # last kodos.snapshot.TextSnapshot taken of each (see inputSnapshot())
+        self.revisions = dict.fromkeys(
+            [self.regexText, self.searchText, self.replaceText], 0)
+        self.snapshots = {}
+        # Snapshots of self.search (of the page displayed in large file
+        # mode), and of the text self.result refers to
+        self.searchSnapshot = None
+        self.resultSnapshot = None
+
+        # Results of the previous evaluations, shared by all the panels, keyed
+        # by (engine, pattern, flags, search text revision, replace text,
+        # whether the evaluation has been capped)
+        self.results = engine.LRUCache(self.RESULTS_CACHE_SIZE)
+        self._pendingKey = None
+        # The search text of the latest evaluation, and its snapshot, which
+        # replace self.search and self.searchSnapshot along with self.result
+        self._pendingSearch = None
+        # What has been edited in the search text since self.result has been
+        # computed, as a kodos.engine.Edit
+        self.searchEdit = None
+
+        # Parts of the regex prone to catastrophic backtracking (a list of
+        # kodos.analyzer.Finding), and whether the search text has been
+        # truncated because of them.
+        self.analysis = []
+        self.capped = False
+
+        # Builds the replace preview of self.result, and the replace count
+        # currently displayed by the preview (None if it has been reset)
+        self.replacePreview = None
+        self.replaceShown = None
+
+        # The corpus of samples the regex is checked against, if any. Its
+        # samples are evaluated by their own pool, on all the processors,
+        # for the (engine, pattern, flags) of self.corpusKey.
+        self.corpus = None
+        self.corpusPool = worker.EvaluationPool(
+            size=multiprocessing.cpu_count(), timeout=timeout, parent=self)
+        self.corpusKey = None
+        # Job id of the running corpus evaluation, and the samples of each of
+        # its batches
+        self._corpusJob = None
+        self._corpusBatches = None
+
+        # Steps taken by a backtracking matcher to run the regex (a
+        # kodos.backtrack.StepCount), counted by their own worker when
+        # enabled, for the (regex, flags, search text revision) of
+        # self._stepsKey; they are shown as a heatmap over the regex.
+        self.stepsPool = worker.EvaluationPool(
+            size=1, timeout=timeout, parent=self)
+        self.stepCount = None
+        self._stepsKey = None
+        self._stepsJob = None
+        # The highlighting of the regex editor: the steps heatmap, and the
+        # parts prone to catastrophic backtracking
+        self.heatSelections = []
+        self.riskSelections = []
+
+        # How the time taken by the regex grows with the size of its input
+        # (a list of kodos.scaling.Series), measured one run at a time by
+        # their own worker. The runs still to do are (size, series) pairs, in
+        # reverse order, made with the inputs of self._scalingArgs.
+        self.scalingPool = worker.EvaluationPool(
+            size=1, timeout=self.SCALING_TIMEOUT, parent=self)
+        self.scaling = []
+        self._scalingArgs = None
+        self._scalingRuns = []
+        self._scalingRun = None
+        self._scalingJob = None
+
+        # The regex library, and its dialog, are only loaded when they are
+        # first used. The patterns of the library entries recently warmed up
+        # are kept as (engine, pattern, flags), and the workers renewed once
+        # new ones have been compiled.
+        self.library = None
+        self.libraryDialog = None
+        self._warmedPatterns = engine.LRUCache(engine.PATTERNS_CACHE_SIZE)
+        self._warmedSinceRespawn = False
+
+        # In "large file" mode, the search text is a memory-mapped file, of
+        # which only a page (starting at self.pageStart) is displayed.
+        self.mappedFile = None
+        self.pageStart = 0
+        self.pageEnd = 0
+
         self.matchFormat = QTextCharFormat()
         self.matchFormat.setForeground(QColor('blue'))
+        self.riskFormat = QTextCharFormat()
+        self.riskFormat.setBackground(QColor('#ffe0e0'))
+        self.riskFormat.setUnderlineStyle(QTextCharFormat.WaveUnderline)
+        self.riskFormat.setUnderlineColor(QColor('red'))
+        self.matchHighlighter = widgets.MatchHighlighter(
+            self.matchText, self.matchFormat, self.tracer)
+        self.matchAllHighlighter = widgets.MatchHighlighter(
+            self.matchAllText, self.matchFormat, self.tracer)
         self.groupsView.setModel(
             model.SimpleTableModel(["Group Name", "Match"]))
+        self.matchesView.setModel(model.MatchTableModel())
+        self.matchesView.sortByColumn(0, QtCore.Qt.AscendingOrder)
 
-        # Read-only mapping to explain what each flags do
+        # Read-only mapping to explain what each flags do, by their
+        # one-letter name: the values depend on the regex engine.
         self.flagsRelationships = {
-            self.dotAllFlag     : re.DOTALL,
-            self.ignoreCaseFlag : re.IGNORECASE,
-            self.localeFlag     : re.LOCALE,
-            self.multiLineFlag  : re.MULTILINE,
-            self.unicodeFlag    : re.UNICODE,
-            self.verboseFlag    : re.VERBOSE,
+            self.dotAllFlag     : 'S',
+            self.ignoreCaseFlag : 'I',
+            self.localeFlag     : 'L',
+            self.multiLineFlag  : 'M',
+            self.unicodeFlag    : 'U',
+            self.verboseFlag    : 'X',
         }
 
+        # The stdlib re engine always comes first
+        for name in backends.available():
+            self.backendBox.addItem(name)
+            self.backendBox.setItemData(
+                self.backendBox.count() - 1,
+                backends.get(name).description, QtCore.Qt.ToolTipRole)
+
         self.connectActions()
 
+        # The inputs are empty: there is nothing to evaluate yet
+        self.statusbar.setIndicator('warning')
+        self.statusbar.showMessage(
+            "Enter a regular expression and a string to match against")
+
     def setupUi(self, *args, **kwargs):
         super(KodosMainWindow, self).setupUi(*args, **kwargs)
 
-        # Trigger the textChanged signal
-        for widget in [self.regexText, self.searchText, self.replaceText]:
-            widget.setPlainText('')
-
         self.statusbar = widgets.StatusBar(self._statusbar)
+        # The match panes, pages of the same tab widget, are views over a
+        # single document, each with its own highlighting. It holds the text
+        # the result has been computed against: it is only updated when a
+        # new result arrives, not as the search text is edited.
+        self.resultDocument = QTextDocument(self)
+        self.resultDocument.setDocumentLayout(
+            QPlainTextDocumentLayout(self.resultDocument))
+        self.resultDocument.setUndoRedoEnabled(False)
+        self.matchText.setDocument(self.resultDocument)
+        self.matchAllText.setDocument(self.resultDocument)
+        self.resultTextSnapshot = None
+        # The corpus and scaling tabs are rarely used: their model and plot
+        # are only built when they are first shown (see onTabChanged())
+        self.scalingPlot = None
         self.labelReplace.hide()
         self.replaceNumberBox.hide()
         self.replaceNumberBox.setRange(0 ,0)
+        # The replace preview is edited in place, keeping an undo history of
+        # it would only waste memory.
+        self.replaceResultText.setUndoRedoEnabled(False)
+
+    def setupCorpusTab(self):
+        if self.corpusView.model() is not None:
+            return
+        self.corpusView.setModel(model.CorpusTableModel())
+        self.corpusView.model().dataChanged.connect(self.updateCorpusSummary)
+
+    def setupScalingTab(self):
+        if self.scalingPlot is not None:
+            return
+        self.scalingPlot = widgets.ScalingPlot(self.tab_10)
+        self.verticalLayout_15.addWidget(self.scalingPlot, 1)
+        self.scalingPlot.setSeries(self.scaling)
 
     def connectActions(self):
 
         self.validRegex.connect(self.onValidRegex)
         self.invalidRegex.connect(self.onInvalidRegex)
+        self.scheduler.triggered.connect(self.onComputeRegex)
+        # Whatever is being evaluated is stale as soon as the inputs change
+        self.scheduler.requested.connect(self.pool.cancel)
+        self.pool.finished.connect(self.onEvaluationFinished)
+        self.pool.timedOut.connect(self.onEvaluationTimedOut)
+        self.pool.failed.connect(self.onEvaluationFailed)
+        self.pool.progress.connect(self.onEvaluationProgress)
+        self.corpusPool.finished.connect(self.onCorpusFinished)
+        self.corpusPool.timedOut.connect(self.onCorpusTimedOut)
+        self.corpusPool.failed.connect(self.onCorpusFailed)
+        self.corpusPool.progress.connect(self.onCorpusProgress)
+        self.stepsPool.finished.connect(self.onStepsCounted)
+        self.stepsPool.timedOut.connect(self.onStepsTimedOut)
+        self.stepsPool.failed.connect(self.onStepsFailed)
+        self.scalingPool.finished.connect(self.onScalingRun)
+        self.scalingPool.timedOut.connect(self.onScalingTimedOut)
+        self.scalingPool.failed.connect(self.onScalingFailed)
+        self.scalingButton.clicked.connect(self.onScalingClicked)
+        self.tabWidget.currentChanged.connect(self.onTabChanged)
 
         # Connect input widgets to update the GUI when their text change
         for widget in [self.regexText, self.searchText, self.replaceText]:
-            widget.textChanged.connect(self.onComputeRegex)
+            widget.textChanged.connect(self.onInputChange)
+            widget.textChanged.connect(self.scheduler.schedule)
 
         for widget in self.flagsRelationships:
-            widget.stateChanged.connect(self.onComputeRegex)
+            widget.stateChanged.connect(self.scheduler.schedule)
+        self.backendBox.currentIndexChanged.connect(self.scheduler.schedule)
 
         self.replaceText.textChanged.connect(self.onReplaceChange)
+        self.searchText.document().contentsChange.connect(self.onSearchEdit)
 
         self.matchNumberBox.valueChanged.connect(self.onMatchNumberChange)
         self.replaceNumberBox.valueChanged.connect(self.onReplaceNumberChange)
 
+        self.actionSearch_Large_File.triggered.connect(self.onOpenLargeFile)
+        self.actionClose_Large_File.triggered.connect(self.onCloseLargeFile)
+        self.actionOpen_Corpus.triggered.connect(self.onOpenCorpus)
+        self.actionOpen_Corpus_Directory.triggered.connect(
+            self.onOpenCorpusDirectory)
+        self.actionClose_Corpus.triggered.connect(self.onCloseCorpus)
+        self.actionRegex_Library.triggered.connect(self.onRegexLibrary)
+        self.actionRecord_Timings.toggled.connect(self.tracer.setEnabled)
+        self.actionExport_Timings.triggered.connect(self.onExportTimings)
+        self.actionProfile_Handlers.toggled.connect(self.profiler.setEnabled)
+        self.actionExport_Profile.triggered.connect(self.onExportProfile)
+        self.actionCompare_Engines.triggered.connect(self.onCompareEngines)
+        self.actionCount_Steps.toggled.connect(self.onCountStepsToggled)
+
+    def inputSnapshot(self, widget):
+        """Return a kodos.snapshot.TextSnapshot of an input widget, taken
+        once per revision of its text"""
+
+        revision = self.revisions[widget]
+        current = self.snapshots.get(widget)
+        if current is None or current.revision != revision:
+            current = snapshot.TextSnapshot(
+                unicode(widget.toPlainText()), revision)
+            self.snapshots[widget] = current
+        return current
+
+    def getRegexText(self):
+        """Shortcut to retrieve the regex, encoded in UTF-8"""
+
+        return self.inputSnapshot(self.regexText).data
+
     def getSearchText(self):
-        """Shortcut to retrieve the search text"""
+        """Shortcut to retrieve the search text, encoded in UTF-8"""
 
-        return str(self.searchText.toPlainText().toUtf8())
+        return self.inputSnapshot(self.searchText).data
 
     def getReplaceText(self):
-        """Shortcut to retrieve the replace text"""
+        """Shortcut to retrieve the replace text, encoded in UTF-8"""
+
+        return self.inputSnapshot(self.replaceText).data
+
+    def closeEvent(self, event):
+        self.pool.shutdown()
+        self.corpusPool.shutdown()
+        self.stepsPool.shutdown()
+        self.scalingPool.shutdown()
+        if self.mappedFile is not None:
+            self.mappedFile.close()
+        if self.traceFile is not None:
+            try:
+                self.tracer.export(self.traceFile)
+            except EnvironmentError, e:
+                sys.stderr.write("kodos: unable to write the trace: %s\n" % e)
+        if self.profileFile is not None:
+            try:
+                self.profiler.export(self.profileFile)
+            except EnvironmentError, e:
+                sys.stderr.write(
+                    "kodos: unable to write the profile: %s\n" % e)
+        super(KodosMainWindow, self).closeEvent(event)
+
+    def setPageText(self, text):
+        """Display a text in the search and result panes, without triggering
+        a new evaluation"""
+
+        self.searchSnapshot = snapshot.TextSnapshot.fromBytes(text)
+        text = self.searchSnapshot.text
+
+        self.searchText.blockSignals(True)
+        self.searchText.setPlainText(text)
+        self.searchText.blockSignals(False)
+        self.showResultText(self.searchSnapshot)
+
+    def showPage(self, index):
+        """In large file mode, display the page around the index-th match"""
+
+        start, end = self.result.span(index)
+        if self.pageStart <= start and end <= self.pageEnd:
+            return
+
+        self.pageStart, text = self.mappedFile.page(start, end)
+        self.pageEnd = self.pageStart + len(text)
+        self.setPageText(text)
+        self.matchAllHighlighter.setMatches(
+            self.result, offset=self.pageStart, snapshot=self.searchSnapshot)
+
+    def onTabChanged(self, index):
+        page = self.tabWidget.widget(index)
+        if page is self.tab_9:
+            self.setupCorpusTab()
+        elif page is self.tab_10:
+            self.setupScalingTab()
+
+    def onOpenLargeFile(self):
+        path = QFileDialog.getOpenFileName(self, "Search in Large File")
+        if not path:
+            return
+
+        try:
+            from kodos import largefile
+            mappedFile = largefile.MappedFile(unicode(path))
+        except EnvironmentError, e:
+            self.statusbar.setIndicator('error')
+            return self.statusbar.showMessage(str(e))
+
+        self.onCloseLargeFile()
+        self.mappedFile = mappedFile
+        self.result = None
+        self.searchText.setReadOnly(True)
+        self.replaceText.setEnabled(False)
+        self.actionClose_Large_File.setEnabled(True)
+        self.setPageText("")
+        self.revisions[self.searchText] += 1
+        self.scheduler.schedule()
+
+    def onCloseLargeFile(self):
+        if self.mappedFile is None:
+            return
+
+        self.pool.cancel()
+        self.mappedFile.close()
+        self.mappedFile = None
+        self.pageStart = self.pageEnd = 0
+        self.searchText.setReadOnly(False)
+        self.replaceText.setEnabled(True)
+        self.actionClose_Large_File.setEnabled(False)
+        self.searchText.setPlainText("")
+        # The last result refers to the file, it can't be updated
+        self.result = None
+
+    def onOpenCorpus(self):
+        path = QFileDialog.getOpenFileName(
+            self, "Open Corpus", "",
+            "Corpus files, one sample per line (*.txt);;All files (*)")
+        if path:
+            self.openCorpus(unicode(path))
+
+    def onOpenCorpusDirectory(self):
+        path = QFileDialog.getExistingDirectory(self, "Open Corpus Directory")
+        if path:
+            self.openCorpus(unicode(path))
+
+    def openCorpus(self, path):
+        """Load a corpus (see kodos.corpus) and check the regex against it"""
+
+        try:
+            samples = corpus.Corpus.load(path)
+        except EnvironmentError, e:
+            self.statusbar.setIndicator('error')
+            return self.statusbar.showMessage(str(e))
+
+        self.onCloseCorpus()
+        self.setupCorpusTab()
+        self.corpus = samples
+        self.corpusView.model().setCorpus(samples)
+        self.actionClose_Corpus.setEnabled(True)
+        self.tabWidget.setCurrentWidget(self.tab_9)
+        self.computeCorpus(self.getRegexText())
+
+    def onCloseCorpus(self):
+        if self.corpus is None:
+            return
+
+        self.corpusPool.cancel()
+        self.corpus = self.corpusKey = None
+        self._corpusJob = self._corpusBatches = None
+        self.corpusView.model().clear()
+        self.actionClose_Corpus.setEnabled(False)
+        self.updateCorpusSummary()
 
-        return str(self.replaceText.toPlainText().toUtf8())
+    def computeCorpus(self, regex):
+        """Evaluate the regex over the samples of the corpus which have no
+        verdict for it yet"""
 
-    def formatMatchedText(self, document, match):
-        """Format the matched text in a document"""
+        if self.corpus is None:
+            return
 
-        cursor = QTextCursor(document)
-        cursor.setPosition(match.start())
-        cursor.movePosition(
-            QTextCursor.NextCharacter,
-            QTextCursor.KeepAnchor,
-            match.end() - match.start())
-        cursor.setCharFormat(self.matchFormat)
+        key = (self.getBackend(), regex, self.getRegexFlags())
+        if key == self.corpusKey:
+            # The verdicts are already displayed, or being computed
+            return
+
+        self.corpusPool.cancel()
+        self.corpusKey = key
+        self._corpusJob = self._corpusBatches = None
+        if regex == "":
+            return self.corpusView.model().setVerdicts(None)
+        self.corpusView.model().setVerdicts(self.corpus.verdicts(key))
+
+        batches = self.corpus.batches(key, self.CORPUS_BATCH_SIZE)
+        if not batches:
+            return
+
+        backend, regex, flags = key
+        self._corpusBatches = [indexes for indexes, texts in batches]
+        self._corpusJob = self.corpusPool.map(
+            corpus.evaluateBatch,
+            [(regex, flags, texts, backend) for indexes, texts in batches])
+        self.updateCorpusSummary()
+
+    def updateCorpusSummary(self, *args):
+        if self.corpus is None:
+            return self.corpusSummary.setText(
+                "Open a corpus of samples to check the pattern against")
+        if self.corpusKey is None or self.corpusKey[1] == "":
+            return self.corpusSummary.setText(
+                "%d samples, enter a regular expression to check them"
+                % len(self.corpus))
+
+        passed, falseNegatives, falsePositives, unknown = (
+            self.corpus.summary(self.corpusKey))
+        summary = ("%d/%d passed: %d should match but don't, "
+                   "%d match but shouldn't" % (
+                       passed, len(self.corpus), falseNegatives,
+                       falsePositives))
+        if unknown:
+            if self._corpusJob is not None:
+                summary += " (%d samples being evaluated)" % unknown
+            else:
+                summary += " (%d samples not evaluated)" % unknown
+        self.corpusSummary.setText(summary)
+
+    def onCorpusProgress(self, jobId, progress):
+        if jobId != self._corpusJob:
+            return
+
+        batch, verdicts = progress
+        if verdicts is None:
+            # The regex is invalid, the other batches will fail the same way
+            self.corpusPool.cancel()
+            self._corpusJob = None
+            return self.updateCorpusSummary()
+
+        indexes = self._corpusBatches[batch]
+        self.corpus.record(self.corpusKey, indexes, verdicts)
+        self.corpusView.model().verdictsChanged(indexes)
+
+    def onCorpusFinished(self, jobId, results):
+        if jobId != self._corpusJob:
+            return
+
+        self._corpusJob = self._corpusBatches = None
+        self.updateCorpusSummary()
+
+    def onCorpusTimedOut(self, jobId):
+        if jobId != self._corpusJob:
+            return
+
+        self._corpusJob = self._corpusBatches = None
+        self.updateCorpusSummary()
+        self.corpusSummary.setText(
+            "%s - a batch of samples timed out after %gs"
+            % (self.corpusSummary.text(), self.corpusPool.timeout))
+
+    def onCorpusFailed(self, jobId, message):
+        if jobId != self._corpusJob:
+            return
+
+        self._corpusJob = self._corpusBatches = None
+        self.updateCorpusSummary()
+        self.corpusSummary.setText(
+            "%s - the evaluation failed: %s"
+            % (self.corpusSummary.text(), message))
+
+    def onRegexLibrary(self):
+        if self.libraryDialog is None:
+            from kodos import library
+            self.library = library.Library()
+            try:
+                self.libraryDialog = widgets.LibraryDialog(
+                    self.library, self.warmLibraryEntry, self)
+            except (EnvironmentError, ValueError), e:
+                self.library = None
+                self.statusbar.setIndicator('error')
+                return self.statusbar.showMessage(
+                    "Unable to load the regex library: %s" % e)
+            self.libraryDialog.chosen.connect(self.loadLibraryEntry)
+            self.libraryDialog.addRequested.connect(self.onAddToLibrary)
+            self.libraryDialog.warmed.connect(self.onLibraryWarmed)
+
+        self.libraryDialog.show()
+        self.libraryDialog.raise_()
+        self.libraryDialog.activateWindow()
+
+    def loadLibraryEntry(self, index):
+        entry = self.library[index]
+        for widget, letter in self.flagsRelationships.iteritems():
+            widget.setChecked(letter in entry.flags)
+        self.regexText.setPlainText(entry.pattern)
+        if self.mappedFile is None and entry.sample:
+            self.searchText.setPlainText(entry.sample)
+
+    def onAddToLibrary(self):
+        regex = unicode(self.regexText.toPlainText())
+        if not regex:
+            return QMessageBox.information(
+                self.libraryDialog, "Add to Library",
+                "Enter a regular expression to add it to the library")
+
+        name, ok = QInputDialog.getText(
+            self.libraryDialog, "Add to Library", "Name:")
+        if not ok:
+            return
+        notes, ok = QInputDialog.getText(
+            self.libraryDialog, "Add to Library", "Notes (optional):")
+        if not ok:
+            return
+
+        sample = u""
+        if self.mappedFile is None:
+            sample = unicode(self.searchText.toPlainText())
+        from kodos import library
+        entry = library.Entry(unicode(name) or regex, regex,
+                              self.getRegexFlagLetters(), sample,
+                              unicode(notes))
+        try:
+            self.library.add(entry)
+        except EnvironmentError, e:
+            return QMessageBox.warning(
+                self.libraryDialog, "Add to Library", str(e))
+        self.libraryDialog.search()
+
+    def warmLibraryEntry(self, entry):
+        """Compile and analyze the pattern of a library entry ahead of time,
+        for the selected engine"""
+
+        name = self.getBackend()
+        backend = backends.get(name)
+        pattern = entry.pattern.encode('utf-8')
+        try:
+            flags = backend.parseFlags(entry.flags)
+        except ValueError:
+            return
+
+        key = (name, pattern, flags)
+        if key in self._warmedPatterns:
+            return
+        self._warmedPatterns.put(key, True)
+
+        try:
+            engine.compile(pattern, flags, name)
+        except backend.errors:
+            return
+        analyzer.analyze(pattern, flags)
+        self._warmedSinceRespawn = True
+
+    def onLibraryWarmed(self):
+        # The workers are forked from this process: the new ones start with
+        # the patterns compiled here.
+        if self._warmedSinceRespawn:
+            self._warmedSinceRespawn = False
+            self.pool.respawn()
+
+    def onExportTimings(self):
+        path = QFileDialog.getSaveFileName(
+            self, "Export Timings Trace", "kodos-trace.json",
+            "Trace files (*.json)")
+        if not path:
+            return
+
+        try:
+            self.tracer.export(unicode(path))
+        except EnvironmentError, e:
+            self.statusbar.setIndicator('error')
+            return self.statusbar.showMessage(str(e))
+        self.statusbar.showMessage(
+            "%d timings exported to %s" % (len(self.tracer.events), path))
+
+    def onExportProfile(self):
+        path = QFileDialog.getSaveFileName(
+            self, "Export Profile", "kodos.pstats",
+            "Profiles (*.pstats)")
+        if not path:
+            return
+
+        try:
+            exported = self.profiler.export(unicode(path))
+        except EnvironmentError, e:
+            self.statusbar.setIndicator('error')
+            return self.statusbar.showMessage(str(e))
+        if not exported:
+            return self.statusbar.showMessage(
+                "Nothing profiled yet: enable Profile Handlers first")
+        self.statusbar.showMessage(
+            "Profile exported to %s, summary in %s.txt" % (path, path))
+
+    def updateDetails(self):
+        """Display the evaluation statistics and the timings of the last
+        update in the status bar details"""
+
+        details = "Evaluations: %s" % self.scheduler.stats
+        breakdown = self.tracer.formatBreakdown()
+        if breakdown:
+            details += "\n\nLast update:\n" + breakdown
+        self.statusbar.setDetails(details)
+
+    def finishUpdate(self):
+        if not self.tracer.enabled:
+            return self.updateDetails()
+
+        # The highlighting is refreshed once the event loop gets back control:
+        # let it be part of the update.
+        QtCore.QTimer.singleShot(0, self.endTimedUpdate)
+
+    def endTimedUpdate(self):
+        self.tracer.end()
+        self.updateDetails()
 
     def onInvalidRegex(self, message, indicator):
-        self.groupsView.model().clear()
-        self.matchText.setPlainText("")
-        self.matchAllText.setPlainText("")
-        self.replaceResultText.setPlainText("")
+        with self.tracer.stage("clear"):
+            self.groupsView.model().clear()
+            self.matchesView.model().clear()
+            self.matchHighlighter.clear()
+            self.matchAllHighlighter.clear()
+            self.showResultText(None)
+            self.replaceResultText.setPlainText("")
+            self.replaceShown = None
         self.matchNumberBox.setEnabled(False)
         self.replaceNumberBox.setEnabled(False)
 
         self.statusbar.showMessage(message)
         self.statusbar.setIndicator(indicator)
+        self.finishUpdate()
 
     def onValidRegex(self):
-        search  = self.getSearchText()
+        search  = self.search
 
-        self.matchText.setPlainText(search)
-        self.matchAllText.setPlainText(search)
         self.matchNumberBox.setEnabled(True)
         self.replaceNumberBox.setEnabled(True)
 
         # Compute results in the various result panels
-        for i, match in enumerate(self.regex.finditer(search)):
-            self.formatMatchedText(self.matchAllText.document(), match)
+        self.showResultText(self.searchSnapshot)
+        if self.mappedFile is None:
+            self.matchAllHighlighter.setMatches(
+                self.result, snapshot=self.searchSnapshot)
+        else:
+            # The page will be displayed along with the selected match
+            self.pageStart = self.pageEnd = 0
+        with self.tracer.stage("match table"):
+            self.matchesView.model().setResult(self.result, search)
 
-        nbMatches = i + 1
+        nbMatches = len(self.result)
         self.matchNumberBox.setRange(1, nbMatches)
         self.matchNumberBox.valueChanged.emit(self.matchNumberBox.value())
 
@@ -119,77 +743,602 @@ class KodosMainWindow(QMainWindow, Ui_MainWindow):
         self.replaceNumberBox.setRange(0, nbMatches)
         self.replaceNumberBox.valueChanged.emit(self.replaceNumberBox.value())
 
-        self.statusbar.setIndicator('ok')
-        self.statusbar.showMessage(
-            "Pattern matches (found %d match)" % nbMatches)
+        message = "Pattern matches (found %d match)" % nbMatches
+        warning = self.riskWarning()
+        if warning:
+            self.statusbar.setIndicator('warning')
+            self.statusbar.showMessage("%s - %s" % (message, warning))
+        else:
+            self.statusbar.setIndicator('ok')
+            self.statusbar.showMessage(message)
+        self.finishUpdate()
+
+    def showResultText(self, textSnapshot):
+        """Display the text of a kodos.snapshot.TextSnapshot in the match
+        panes, or nothing if it is None"""
+
+        if textSnapshot is self.resultTextSnapshot:
+            return
+        self.resultTextSnapshot = textSnapshot
+        with self.tracer.stage("display text"):
+            self.resultDocument.setPlainText(
+                textSnapshot.text if textSnapshot is not None else "")
+
+    def getBackend(self):
+        """Return the name of the selected regex engine"""
+
+        return str(self.backendBox.currentText()) or backends.DEFAULT
+
+    def getRegexFlagLetters(self):
+        """Return the one-letter names of the flags set for the regex"""
+
+        return "".join(sorted(letter for flag, letter
+                              in self.flagsRelationships.iteritems()
+                              if flag.isChecked()))
 
     def getRegexFlags(self):
-        """Return the flags set for the regex"""
+        """Return the flags set for the regex, for the selected engine"""
+
+        backend = backends.get(self.getBackend())
+        return backend.parseFlags(self.getRegexFlagLetters())
+
+    def checkRegex(self, regex, flags):
+        """Look for the parts of the regex prone to catastrophic backtracking,
+        and highlight them in the regex editor"""
+
+        self.analysis = analyzer.analyze(regex, flags)
+        self.riskSelections = [
+            self.regexSelection(finding.start, finding.end, self.riskFormat)
+            for finding in self.analysis]
+        self.updateRegexHighlighting()
 
-        flags = 0
-        for flag, value in self.flagsRelationships.iteritems():
-            if flag.isChecked():
-                flags |= value
+    def regexSelection(self, start, end, format):
+        """Return an extra selection of the regex editor, from byte offsets
+        in the regex"""
 
-        return flags
+        regex = self.inputSnapshot(self.regexText)
+        cursor = QTextCursor(self.regexText.document())
+        cursor.setPosition(regex.toChars(start))
+        cursor.setPosition(regex.toChars(end), QTextCursor.KeepAnchor)
+
+        selection = QTextEdit.ExtraSelection()
+        selection.cursor = cursor
+        selection.format = format
+        return selection
+
+    def updateRegexHighlighting(self):
+        # The risks are drawn over the heatmap
+        self.regexText.setExtraSelections(
+            self.heatSelections + self.riskSelections)
+
+        lines = [str(finding) for finding in self.analysis]
+        if self.stepCount is not None:
+            if lines:
+                lines.append("")
+            lines.extend(self.stepsReport())
+        self.regexText.setToolTip("\n".join(lines))
+
+    def riskWarning(self):
+        """Return the warning about the riskiest part of the regex, if any"""
+
+        if not self.analysis:
+            return ""
+
+        warning = "warning: %s" % self.analysis[0]
+        if self.capped:
+            warning += ", only the first %s searched" % widgets.formatSize(
+                self.RISKY_INPUT_LIMIT)
+        return warning
 
     def onComputeRegex(self):
-        regex   = str(self.regexText.toPlainText().toUtf8())
-        search  = self.getSearchText()
+        self.tracer.begin()
+        self.discardPartialResult()
+        regex   = self.getRegexText()
+
+        with self.tracer.stage("analyze"):
+            self.checkRegex(regex, self.getRegexFlags())
+        self.capped = False
+        self.computeCorpus(regex)
+
+        if self.mappedFile is not None:
+            return self.computeLargeFile(regex)
+
+        with self.tracer.stage("read inputs"):
+            current = self.inputSnapshot(self.searchText)
+        search  = current.data
+        self.countSteps(regex, current)
 
         if regex == "" or search == "":
             return self.invalidRegex.emit(
                 "Enter a regular expression and a string to match against",
                 'warning')
 
+        backend = self.getBackend()
         flags = self.getRegexFlags()
+        replace = self.getReplaceText()
+        self._pendingSearch = (search, current)
 
-        try:
-            self.regex = re.compile(regex, flags)
-        except (re.error, IndexError), e:
-            # IndexError occured if the regex is "(?P<>)"
-            return self.invalidRegex.emit(e.args[0], 'error')
+        if (analyzer.risk(self.analysis) == analyzer.EXPONENTIAL
+                and len(search) > self.RISKY_INPUT_LIMIT):
+            # Don't let such a pattern run against the whole text
+            self.capped = True
 
-        match = self.regex.search(search)
-        if match is None:
-            return self.invalidRegex.emit("Pattern does not match", 'error')
+        # The results of the capped evaluations only cover the beginning of
+        # the text
+        key = (backend, regex, flags, current.revision, replace, self.capped)
+        result = self.results.get(key)
+        if result is not None:
+            return self.showResult(result)
 
-        # The regex matches the input!
-        self.validRegex.emit()
+        self._pendingKey = key
+        self._submitted = time.time()
+        if self.capped:
+            head = search[:self.RISKY_INPUT_LIMIT]
+            self.pool.submit(engine.evaluate,
+                             (regex, flags, head, replace, backend),
+                             withProgress=True)
+        elif self.canRematch(backend, regex, flags, replace):
+            # Only rescan around what has been edited
+            edit = snapshot.byteEdit(
+                self.searchEdit, self.resultSnapshot, current)
+            self.pool.submit(engine.rematch, (self.result, search, edit))
+        elif len(search) > self.STREAM_THRESHOLD:
+            # This may take a while, but its progress is reported, and it is
+            # stopped as soon as the inputs change. The text is scanned as a
+            # whole: the chunks of kodos.stream could cut the long matches.
+            self.pool.submit(engine.evaluate,
+                             (regex, flags, search, replace, backend),
+                             timeout=0, withProgress=True)
+        else:
+            # The matches found are reported while they are collected, if
+            # that takes a while
+            self.pool.submit(engine.evaluate,
+                             (regex, flags, search, replace, backend),
+                             withProgress=True)
+
+    def computeLargeFile(self, regex):
+        if regex == "":
+            return self.invalidRegex.emit(
+                "Enter a regular expression to search in %s"
+                % self.mappedFile.path, 'warning')
+
+        backend = self.getBackend()
+        flags = self.getRegexFlags()
+        self._pendingSearch = (self.mappedFile, self.searchSnapshot)
 
+        key = (backend, regex, flags, self.revisions[self.searchText], None,
+               False)
+        result = self.results.get(key)
+        if result is not None:
+            return self.showResult(result)
 
-    def onMatchNumberChange(self, matchNumber):
-        # Set default format on the whole text before highlighting the selected
-        # match.
-        document = self.matchText.document()
-        cursor = QTextCursor(document)
-        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
-        cursor.setCharFormat(QTextCharFormat())
-
-        search = self.getSearchText()
-        for i, match in enumerate(self.regex.finditer(search)):
-            if i + 1 == matchNumber:
+        self._pendingKey = key
+        self._submitted = time.time()
+        self.statusbar.setIndicator('warning')
+        self.statusbar.showMessage("Searching in %s..." % self.mappedFile.path)
+        # Scanning a large file takes time, it is only stopped if the inputs
+        # change; unless the pattern is prone to catastrophic backtracking.
+        if analyzer.risk(self.analysis) == analyzer.EXPONENTIAL:
+            timeout = self.pool.timeout
+        else:
+            timeout = 0
+        from kodos import largefile
+        self.pool.submit(largefile.scanFile,
+                         (regex, flags, self.mappedFile.path, backend),
+                         timeout=timeout)
+
+    def canRematch(self, backend, regex, flags, replace):
+        """Tell if the last result can be updated from the edits made to the
+        search text, instead of evaluating the regex from scratch"""
+
+        previous = self.result
+        if (self.searchEdit is None or previous is None
+                or previous.error is not None or previous.capped
+                or self.resultSnapshot is None):
+            return False
+
+        return (previous.backend, previous.pattern, previous.flags,
+                previous.replace) == (backend, regex, flags, replace)
+
+    def countSteps(self, regex, search):
+        """Count the steps taken to run the regex over the `search` text
+        snapshot, if enabled"""
+
+        if not self.actionCount_Steps.isChecked():
+            return
+
+        # The steps are counted by a matcher following the re semantics
+        flags = backends.get('re').parseFlags(self.getRegexFlagLetters())
+        key = (regex, flags, search.revision)
+        if key == self._stepsKey:
+            return
+
+        self.stepsPool.cancel()
+        self._stepsKey = key
+        self._stepsJob = None
+        self.stepCount = None
+        self.heatSelections = []
+        self.updateRegexHighlighting()
+
+        if regex and search.data:
+            from kodos import backtrack
+            self._stepsJob = self.stepsPool.submit(
+                backtrack.countSteps, (regex, flags, search.data))
+
+    def onCountStepsToggled(self, enabled):
+        self.stepsPool.cancel()
+        self._stepsKey = self._stepsJob = self.stepCount = None
+        self.heatSelections = []
+        self.updateRegexHighlighting()
+
+        if enabled and self.mappedFile is None:
+            self.countSteps(self.getRegexText(),
+                            self.inputSnapshot(self.searchText))
+        self.showStepsInGroups()
+
+    def onStepsCounted(self, jobId, count):
+        if jobId != self._stepsJob:
+            return
+
+        self._stepsJob = None
+        self.stepCount = count
+        self.heatSelections = self.stepsHeatmap(count)
+        self.updateRegexHighlighting()
+        self.showStepsInGroups()
+
+    def onStepsTimedOut(self, jobId):
+        if jobId != self._stepsJob:
+            return
+
+        from kodos import backtrack
+        self._stepsJob = None
+        self.stepCount = backtrack.StepCount(
+            self._stepsKey[0], [], "timed out after %gs"
+            % self.stepsPool.timeout)
+        self.updateRegexHighlighting()
+
+    def onStepsFailed(self, jobId, message):
+        if jobId != self._stepsJob:
+            return
+
+        from kodos import backtrack
+        self._stepsJob = None
+        self.stepCount = backtrack.StepCount(
+            self._stepsKey[0], [], "failed: %s" % message)
+        self.updateRegexHighlighting()
+
+    def stepsHeatmap(self, count):
+        """Return the extra selections coloring each subexpression of the
+        regex by the number of steps it took, from yellow to red"""
+
+        if (count.error is not None or not any(count.steps)
+                or count.pattern != self.getRegexText()):
+            return []
+
+        highest = float(max(count.steps))
+        selections = []
+        # The enclosing subexpressions first, so that the ones they hold are
+        # drawn over them
+        located = sorted(zip(count.spans, count.steps),
+                         key=lambda item: (item[0][0], -item[0][1]))
+        for (start, end), steps in located:
+            if not steps:
+                continue
+            ratio = steps / highest
+            format = QTextCharFormat()
+            format.setBackground(
+                QColor.fromHsvF((1 - ratio) / 6, 0.15 + 0.6 * ratio, 1.0))
+            selections.append(self.regexSelection(start, end, format))
+        return selections
+
+    def stepsReport(self):
+        """Return the lines describing the steps counted for the regex: their
+        total, and the most expensive subexpressions"""
+
+        count = self.stepCount
+        lines = [count.summary()]
+        if count.error is not None:
+            return lines
+
+        costs = sorted(zip(count.steps, count.backtracks, count.spans),
+                       reverse=True)
+        for steps, backtracks, (start, end) in costs[:self.STEPS_REPORTED]:
+            if not steps:
+                break
+            lines.append("  %s: %d steps, %d backtracks"
+                         % (snapshot.decode(count.pattern[start:end]),
+                            steps, backtracks))
+        return lines
+
+    def showStepsInGroups(self):
+        if self.result is not None and len(self.result):
+            self.onMatchNumberChange(self.matchNumberBox.value())
+
+    def onScalingClicked(self, *args):
+        if self._scalingJob is not None:
+            return self.stopScaling("Stopped")
+
+        regex = self.getRegexText()
+        sample = self.getSearchText()
+        if regex == "" or sample == "":
+            return self.scalingSummary.setText(
+                "Enter a regular expression and a search string to time it "
+                "against")
+
+        from kodos import scaling
+        self.scaling = [scaling.Series(variant, operation)
+                        for variant in scaling.VARIANTS
+                        for operation in scaling.OPERATIONS]
+        self._scalingArgs = (regex, self.getRegexFlags(),
+                             self.getReplaceText(), sample,
+                             self.getBackend())
+        self._scalingRuns = [(size, series)
+                             for size in reversed(scaling.SIZES)
+                             for series in reversed(self.scaling)]
+        self.scalingButton.setText("Stop")
+        self.nextScalingRun()
+
+    def nextScalingRun(self):
+        """Submit the next run of a series which hasn't timed out yet"""
+
+        while self._scalingRuns:
+            size, series = self._scalingRuns.pop()
+            if series.timedOut is None:
                 break
         else:
-            assert False, ("We didn't find a match?! (RE=%r, text=%r" %
-                           (self.regex.pattern, search))
+            return self.stopScaling("Done")
+
+        from kodos import scaling
+        regex, flags, replace, sample, backend = self._scalingArgs
+        self._scalingRun = (size, series)
+        self._scalingJob = self.scalingPool.submit(
+            scaling.timeRun, (regex, flags, replace, sample, size,
+                              series.variant, series.operation, backend))
+        self.showScaling("Timing %s over %s..."
+                         % (series, widgets.formatSize(size)))
+
+    def stopScaling(self, status):
+        self.scalingPool.cancel()
+        self._scalingRuns = []
+        self._scalingRun = self._scalingJob = None
+        self.scalingButton.setText("Run")
+        self.showScaling(status)
+
+    def onScalingRun(self, jobId, seconds):
+        if jobId != self._scalingJob:
+            return
+
+        if seconds is None:
+            return self.stopScaling("The regular expression is invalid")
+        size, series = self._scalingRun
+        series.points.append((size, seconds))
+        self.nextScalingRun()
+
+    def onScalingTimedOut(self, jobId):
+        if jobId != self._scalingJob:
+            return
+
+        size, series = self._scalingRun
+        series.timedOut = size
+        self.nextScalingRun()
+
+    def onScalingFailed(self, jobId, message):
+        if jobId == self._scalingJob:
+            self.stopScaling("Failed: %s" % message)
 
-        self.formatMatchedText(document, match)
+    def showScaling(self, status):
+        """Display the growth of each series, and flag the regex if any of
+        them is superlinear"""
 
+        lines = [status]
+        lines.extend(series.describe() for series in self.scaling)
+        if any(series.isSuperlinear() for series in self.scaling):
+            lines.append("")
+            lines.append("Warning: the time taken by %r grows faster than "
+                         "the size of its input"
+                         % snapshot.decode(self._scalingArgs[0]))
+        self.scalingSummary.setText("\n".join(lines))
+        self.scalingPlot.setSeries(self.scaling)
+
+    def onCompareEngines(self):
+        if self.mappedFile is not None:
+            return self.statusbar.showMessage(
+                "The engines can't be compared on a large file")
+
+        regex = self.getRegexText()
+        if regex == "":
+            return self.statusbar.showMessage(
+                "Enter a regular expression to compare the engines")
+
+        names = backends.available()
+        self._compareInterrupted = (self._pendingKey is not None
+                                    and self._pendingKey not in self.results)
+        self.discardPartialResult()
+        self.statusbar.setIndicator('warning')
+        self.statusbar.showMessage(
+            "Comparing %s..." % ", ".join(names))
+        self._compareJob = self.pool.submit(
+            engine.compare, (regex, self.getRegexFlagLetters(),
+                             self.getSearchText(), self.getReplaceText(),
+                             names),
+            timeout=self.pool.timeout * len(names))
+
+    def showComparison(self, results):
+        """Report how fast each engine evaluated the regex, and whether they
+        found the same matches as the first one (re)"""
+
+        reference = results[0][1]
+        lines = []
+        for name, result in results:
+            if result.error is not None:
+                outcome = "error: %s" % result.error
+            else:
+                outcome = "%d matches" % len(result)
+            if result is reference:
+                verdict = "reference"
+            elif engine.sameMatches(reference, result):
+                verdict = "same results"
+            else:
+                verdict = "DIFFERENT results"
+            lines.append("%s: %.2f ms, %s (%s)"
+                         % (name, result.duration() * 1000, outcome, verdict))
+
+        fastest = min(results, key=lambda item: item[1].duration())[0]
+        lines.append("")
+        lines.append("Fastest: %s" % fastest)
+
+        self.statusbar.setIndicator('ok')
+        self.statusbar.showMessage("Engines compared")
+        QMessageBox.information(self, "Compare Engines", "\n".join(lines))
+
+    def resumeEvaluation(self):
+        """Run again the evaluation interrupted by the engines comparison"""
+
+        if self._compareInterrupted:
+            self._compareInterrupted = False
+            self.scheduler.schedule()
+
+    def onEvaluationFinished(self, jobId, result):
+        if jobId == self._compareJob:
+            self._compareJob = None
+            self.resumeEvaluation()
+            return self.showComparison(result)
+
+        if self.tracer.enabled:
+            self.tracer.add("evaluation", self._submitted,
+                            time.time() - self._submitted)
+            for stage, start, duration in result.timings:
+                self.tracer.add(stage, start, duration, timing.WORKER)
+
+        result.capped = self.capped
+        self.results.put(self._pendingKey, result)
+        self.showResult(result)
+
+    def showResult(self, result):
+        """Update all the panels from an evaluation result"""
+
+        self.result = result
+        self.partialResult = None
+        self.search, self.searchSnapshot = self._pendingSearch
+        self.resultSnapshot = self.searchSnapshot
+        self.searchEdit = None
+
+        if result.error is not None:
+            return self.invalidRegex.emit(result.error, 'error')
+
+        if len(result) == 0:
+            message = "Pattern does not match"
+            if self.riskWarning():
+                message = "%s - %s" % (message, self.riskWarning())
+            return self.invalidRegex.emit(message, 'error')
+
+        # The regex matches the input!
+        self.validRegex.emit()
+
+    def onEvaluationProgress(self, jobId, progress):
+        self.statusbar.showProgress(progress)
+        if progress.spans:
+            self.showPartialResult(progress)
+
+    def showPartialResult(self, progress):
+        """Display the matches reported so far by the running evaluation,
+        so that the first ones can be browsed before it completes"""
+
+        partial = self.partialResult
+        if partial is None:
+            backend, regex, flags = self._pendingKey[:3]
+            partial = self.partialResult = engine.EvaluationResult(
+                regex, flags, progress.groups, backend=backend)
+            # The replacements and the match table wait for the whole result
+            self.result = partial
+            self.search, self.searchSnapshot = self._pendingSearch
+            self.resultSnapshot = self.searchSnapshot
+            self.searchEdit = None
+            self.matchesView.model().clear()
+            self.replaceNumberBox.setEnabled(False)
+            self.matchNumberBox.setEnabled(True)
+            self.showResultText(self.searchSnapshot)
+
+        first = len(partial) == 0
+        partial.spans.extend(progress.spans)
+        self.matchAllHighlighter.setMatches(
+            partial, snapshot=self.searchSnapshot)
+        self.matchNumberBox.setRange(1, len(partial))
+        if first:
+            self.onMatchNumberChange(self.matchNumberBox.value())
+
+    def discardPartialResult(self):
+        """Forget the matches of an evaluation which won't complete"""
+
+        if self.partialResult is not None:
+            # Nothing else can be derived from them, like a rematch
+            self.result = self.partialResult = None
+
+    def onEvaluationTimedOut(self, jobId):
+        if jobId == self._compareJob:
+            self._compareJob = None
+            self.statusbar.setIndicator('timeout')
+            self.statusbar.showMessage("The engines comparison timed out")
+            return self.resumeEvaluation()
+
+        self.result = self.partialResult = None
+        self.invalidRegex.emit(
+            "Evaluation timed out after %gs" % self.pool.timeout, 'timeout')
+
+    def onEvaluationFailed(self, jobId, message):
+        if jobId == self._compareJob:
+            self._compareJob = None
+            self.statusbar.setIndicator('error')
+            self.statusbar.showMessage(
+                "The engines comparison failed: %s" % message)
+            return self.resumeEvaluation()
+
+        self.result = self.partialResult = None
+        self.invalidRegex.emit("Evaluation failed: %s" % message, 'error')
+
+    def onMatchNumberChange(self, matchNumber):
         model = self.groupsView.model()
-        model.clear()
 
-        # Create a reversed self.regex.groupindex dictionnary
-        groupsIndexes = dict((v, k)
-                             for (k, v) in self.regex.groupindex.iteritems())
+        if self.result is None or len(self.result) == 0:
+            # This is triggered by the spin box range being reset
+            model.clear()
+            self.matchHighlighter.clear()
+            return
+
+        index = matchNumber - 1
+        if self.mappedFile is not None:
+            with self.tracer.stage("show page"):
+                self.showPage(index)
+        self.matchHighlighter.setMatches(
+            self.result, index, index + 1, self.pageStart, self.searchSnapshot)
+
+        with self.tracer.stage("groups table"):
+            model.setRows(
+                (groupName, snapshot.decode(
+                    self.result.group(self.search, index, i + 1)))
+                for i, groupName in enumerate(self.result.groupNames()))
 
-        for i in range(1, self.regex.groups + 1):
-            groupName = groupsIndexes.get(i, "")
-            groupValue = match.group(i)
-            model.append((groupName, groupValue))
+        # The steps taken to find this match, if they have been counted for
+        # the same text
+        count = self.stepCount
+        if (count is not None and self.mappedFile is None
+                and index < len(count.matches)
+                and count.matches[index][:2] == self.result.span(index)):
+            start, end, steps, backtracks = count.matches[index]
+            model.extend([("Steps to match", steps),
+                          ("Backtracks", backtracks)])
+
+    def onInputChange(self):
+        self.revisions[self.sender()] += 1
+
+    def onSearchEdit(self, position, removed, added):
+        if self.searchEdit is None:
+            self.searchEdit = engine.Edit(position, removed, added)
+        else:
+            self.searchEdit.merge(position, removed, added)
 
     def onReplaceChange(self):
-        replace = str(self.replaceText.toPlainText().toUtf8())
+        replace = self.getReplaceText()
 
         if replace:
             self.labelReplace.show()
@@ -199,20 +1348,117 @@ class KodosMainWindow(QMainWindow, Ui_MainWindow):
             self.labelReplace.hide()
             self.replaceNumberBox.hide()
             self.replaceResultText.setPlainText("")
+            self.replaceShown = None
             self.replaceResultText.setEnabled(False)
 
     def onReplaceNumberChange(self, replaceNumber):
-        text = self.regex.sub(
-            self.getReplaceText(),
-            self.getSearchText(),
-            replaceNumber)
-        self.replaceResultText.setPlainText(text)
+        if self.result is None or self.result.expansions is None:
+            if self.result is not None and self.result.replaceError:
+                text = self.result.replaceError
+            else:
+                text = ""
+            self.replacePreview = self.replaceShown = None
+            return self.replaceResultText.setPlainText(text)
+
+        preview = self.replacePreview
+        if (preview is None or preview.result is not self.result
+                or preview.text is not self.search):
+            preview = self.replacePreview = engine.ReplacePreview(
+                self.search, self.result, snapshot.utf16Length,
+                self.searchSnapshot.toChars)
+            self.replaceShown = None
+
+        edits = None
+        if self.replaceShown is not None:
+            edits = preview.edits(self.replaceShown, replaceNumber)
+
+        if edits is not None and len(edits) <= self.REPLACE_SPLICE_LIMIT:
+            # Only the replacements in between change
+            with self.tracer.stage("splice replace"):
+                self.spliceReplacePreview(edits)
+        else:
+            with self.tracer.stage("substitute"):
+                text = engine.substitute(
+                    self.search, self.result, replaceNumber)
+            with self.tracer.stage("display replace"):
+                self.replaceResultText.setPlainText(snapshot.decode(text))
+        self.replaceShown = replaceNumber
+
+    def spliceReplacePreview(self, edits):
+        """Apply the (position, removed, added) edits computed by a
+        kodos.engine.ReplacePreview to the replace preview"""
+
+        cursor = QTextCursor(self.replaceResultText.document())
+        cursor.beginEditBlock()
+        for position, removed, added in edits:
+            cursor.setPosition(position)
+            cursor.setPosition(position + removed, QTextCursor.KeepAnchor)
+            cursor.insertText(snapshot.decode(added))
+        cursor.endEditBlock()
+
+
+def parseArgs(args=None):
+    """Parse the command line arguments"""
+
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option(
+        "--delay", type="int", metavar="MS",
+        default=scheduler.EvaluationScheduler.DEFAULT_DELAY,
+        help="quiet period, in milliseconds, before the regex is evaluated "
+             "after a change (default: %default)")
+    parser.add_option(
+        "--timeout", type="float", metavar="SECONDS",
+        default=worker.EvaluationPool.DEFAULT_TIMEOUT,
+        help="time budget of an evaluation, after which it is killed "
+             "(default: %default)")
+    parser.add_option(
+        "--trace", metavar="FILE",
+        help="record the timings of the updates, and write them to FILE "
+             "(in the Trace Event Format) on exit")
+    parser.add_option(
+        "--profile-startup", action="store_true", default=False,
+        help="print how long the imports and the construction of the main "
+             "window take")
+    parser.add_option(
+        "--profile", metavar="FILE",
+        help="profile the event handlers, and write the profile to FILE (in "
+             "the pstats format, with a summary in FILE.txt) on exit")
+
+    return parser.parse_args(args)
+
+
+def run(args=None, startup=None):
+    """Main entry point of the application.
+
+    `startup` is the kodos.timing.Tracer timing the startup, if it has been
+    started before this module was imported.
+    """
+
+    if args is None:
+        args = sys.argv[1:]
+    options, args = parseArgs(args)
+
+    if startup is None:
+        startup = timing.Tracer(enabled=options.profile_startup)
+        startup.begin()
+
+    with startup.stage("application"):
+        app = QApplication(sys.argv)
+    with startup.stage("main window"):
+        kodos = KodosMainWindow(delay=options.delay, timeout=options.timeout,
+                                trace=options.trace, profile=options.profile)
+    with startup.stage("show"):
+        kodos.show()
+
+    if startup.enabled:
+        shown = time.time()
 
+        def report():
+            # The window is painted by the first iteration of the event loop
+            startup.add("first paint", shown, time.time() - shown)
+            startup.end()
+            sys.stderr.write("Startup:\n%s\n" % startup.formatBreakdown())
 
-def run(args=None):
-    """Main entry point of the application."""
+        QtCore.QTimer.singleShot(0, report)
 
-    app = QApplication(sys.argv)
-    kodos = KodosMainWindow()
-    kodos.show()
     app.exec_()
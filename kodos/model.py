@@ -1,5 +1,10 @@
+from array import array
+
 from PyQt4.QtCore import QAbstractTableModel, QModelIndex, QVariant
 from PyQt4.QtCore import Qt
+from PyQt4.QtGui import QColor
+
+from kodos import corpus, snapshot
 
 
 class SimpleTableModel(QAbstractTableModel):
@@ -7,8 +12,14 @@ class SimpleTableModel(QAbstractTableModel):
 
     AFAIK, PyQt4 doesn't provide an easy way to have a table model, so here it
     is.
-    It's a very basic, non-performant, really limited version of a table model,
-    but really sufficient for the needs of Kodos.
+    It's a basic, really limited version of a table model, but really
+    sufficient for the needs of Kodos.
+
+    The values are stored by column, and are only exposed to the views by
+    batches of FETCH_SIZE rows (see canFetchMore() and fetchMore()): loading a
+    large table only costs the rows which are actually displayed. Rows can be
+    loaded in bulk with setRows() and extend(), which notify the views once
+    instead of once per row or per cell.
 
     The first part of the class implements the QAbstractTableModel API that
     needs to be implemented, whereas the second part implements a sane API.
@@ -20,19 +31,24 @@ class SimpleTableModel(QAbstractTableModel):
 
     """
 
+    # How many rows are exposed to the views at once
+    FETCH_SIZE = 256
+
     def __init__(self, headers, *args, **kwargs):
         """Create a table model with the specified columns names"""
 
         super(self.__class__, self).__init__(*args, **kwargs)
 
         self._headers = headers
-        self._data = []
+        self._columns = [[] for header in headers]
+        # Number of rows exposed to the views
+        self._fetched = 0
 
     def rowCount(self, parent=QModelIndex()):
         if parent.isValid():
             # Per Qt4 doc.
             return 0
-        return len(self._data)
+        return self._fetched
 
     def columnCount(self, parent=QModelIndex()):
         if parent.isValid():
@@ -49,8 +65,7 @@ class SimpleTableModel(QAbstractTableModel):
     def data(self, index, role):
         if role == Qt.DisplayRole:
             # Return the data at the specified (x,y) location
-            row = self._data[index.row()]
-            return row[index.column()]
+            return self._columns[index.column()][index.row()]
 
         return QVariant()
 
@@ -60,7 +75,7 @@ class SimpleTableModel(QAbstractTableModel):
             column = index.column()
             # value is a QVariant
             value = value.toString()
-            self._data[row][column] = value
+            self._columns[column][row] = value
             self.dataChanged.emit(index, index)
             return True
         else:
@@ -69,26 +84,97 @@ class SimpleTableModel(QAbstractTableModel):
     def insertRows(self, position, rows, index):
         self.beginInsertRows(QModelIndex(), position, position + rows - 1)
 
-        for row in range(0, rows):
-            self._data.insert(position, [None] * len(self._headers))
+        for column in self._columns:
+            column[position:position] = [None] * rows
+        self._fetched += rows
 
         self.endInsertRows()
+        return True
 
     def removeRows(self, position, rows, index):
         self.beginRemoveRows(QModelIndex(), position, position + rows - 1)
 
-        for row in range(0, rows):
-            self._data.pop(position)
+        for column in self._columns:
+            del column[position:position + rows]
+        self._fetched -= rows
 
         self.endRemoveRows()
+        return True
+
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+        return self._fetched < len(self)
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+
+        count = min(self.FETCH_SIZE, len(self) - self._fetched)
+        if count <= 0:
+            return
+
+        self.beginInsertRows(
+            QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
 
     # OK, this is a much simpler API, with only the functionalities I need right
     # now.
+    def __len__(self):
+        """Return the number of rows stored, including the ones which have not
+        been fetched by the views yet."""
+
+        return len(self._columns[0]) if self._columns else 0
+
+    def _checkRows(self, rows):
+        for row in rows:
+            if len(row) != len(self._headers):
+                msg = "Not enough values in a row (expected %d, got %d)" % (
+                    len(self._headers), len(row))
+                raise ValueError(msg)
+
     def clear(self):
         """Clear the whole model, and remove everything it contained before"""
 
-        self.removeRows(0, self.rowCount(), QModelIndex())
-        self.dataChanged.emit(QModelIndex(), QModelIndex())
+        self.beginResetModel()
+        self._columns = [[] for header in self._headers]
+        self._fetched = 0
+        self.endResetModel()
+
+    def setRows(self, rows):
+        """Replace the whole content of the model by `rows`, in one reset"""
+
+        rows = list(rows)
+        self._checkRows(rows)
+
+        self.beginResetModel()
+        if rows:
+            self._columns = [list(column) for column in zip(*rows)]
+        else:
+            self._columns = [[] for header in self._headers]
+        self._fetched = min(self.FETCH_SIZE, len(self))
+        self.endResetModel()
+
+    def extend(self, rows):
+        """Append several rows at the end of the model.
+
+        If the views already fetched every row, the first batch of the new
+        rows is exposed to them at once; the remaining ones are fetched on
+        demand.
+        """
+
+        rows = list(rows)
+        self._checkRows(rows)
+        if not rows:
+            return
+
+        caughtUp = self._fetched == len(self)
+        for column, values in zip(self._columns, zip(*rows)):
+            column.extend(values)
+
+        if caughtUp:
+            self.fetchMore(QModelIndex())
 
     def append(self, row):
         """Append a a row in the model.
@@ -97,17 +183,236 @@ class SimpleTableModel(QAbstractTableModel):
         defined at the model creation.
         """
 
-        if len(row) != len(self._headers):
-            msg = "Not enough values in a row (expected %d, got %d" % (
-                len(self._headers), len(row))
-            raise ValueError(msg)
+        self.extend([row])
 
-        position = self.rowCount()
-        self.insertRows(position, 1, QModelIndex())
 
-        # FIXME: not very optimal but adapted from the addEntry() code at
-        # http://doc.qt.nokia.com/4.6/itemviews-addressbook.html
-        for i, value in enumerate(row):
-            index = self.index(position, i, QModelIndex())
-            self.setData(index, QVariant(value), Qt.EditRole)
-            self.dataChanged.emit(index, index)
+class MatchTableModel(QAbstractTableModel):
+    """Expose every match of an evaluation result as a row of a table.
+
+    Nothing is stored per row: the model reads the spans straight from the
+    kodos.engine.EvaluationResult, and the matched texts are sliced from the
+    source text only when a view asks for them. Sorting only computes an
+    array of match indexes.
+
+    """
+
+    HEADERS = ["#", "Start", "End", "Match"]
+
+    def __init__(self, *args, **kwargs):
+        super(MatchTableModel, self).__init__(*args, **kwargs)
+
+        self._result = None
+        self._text = ""
+        self._headers = list(self.HEADERS)
+        # Match indexes in display order, or None for the natural order
+        self._order = None
+        self._sortColumn = 0
+        self._sortOrder = Qt.AscendingOrder
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self._result is None:
+            return 0
+        return len(self._result)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._headers)
+
+    def headerData(self, section, orientation, role):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self._headers[section]
+        return QVariant()
+
+    def _value(self, match, column):
+        """Return the value displayed for the match-th match in a column"""
+
+        if column == 0:
+            return match + 1
+        elif column == 1:
+            return self._result.span(match)[0]
+        elif column == 2:
+            return self._result.span(match)[1]
+        return snapshot.decode(
+            self._result.group(self._text, match, column - 3))
+
+    def data(self, index, role):
+        if role == Qt.DisplayRole:
+            match = index.row()
+            if self._order is not None:
+                match = self._order[match]
+            value = self._value(match, index.column())
+            if value is None:
+                return QVariant()
+            return value
+
+        return QVariant()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self._sortColumn = column
+        self._sortOrder = order
+
+        if self._result is None:
+            return
+
+        self.layoutAboutToBeChanged.emit()
+        self._sort()
+        self.layoutChanged.emit()
+
+    def _sort(self):
+        count = len(self._result)
+        descending = self._sortOrder == Qt.DescendingOrder
+
+        if self._sortColumn < 3:
+            # The matches don't overlap: they are already sorted by number,
+            # start and end
+            if descending:
+                self._order = array('l', xrange(count - 1, -1, -1))
+            else:
+                self._order = None
+            return
+
+        self._order = array('l', self._result.sortedByGroup(
+            self._text, self._sortColumn - 3, descending))
+
+    # Kodos API
+    def setResult(self, result, text):
+        """Display the matches of `result`, computed against `text`"""
+
+        self.beginResetModel()
+        self._result = result
+        self._text = text
+        self._headers = list(self.HEADERS)
+        for name in result.groupNames():
+            self._headers.append(name or "Group %d" % (len(self._headers) - 3))
+        self._sort()
+        self.endResetModel()
+
+    def clear(self):
+        """Remove all the matches from the model"""
+
+        self.beginResetModel()
+        self._result = None
+        self._text = ""
+        self._headers = list(self.HEADERS)
+        self._order = None
+        self.endResetModel()
+
+
+class CorpusTableModel(QAbstractTableModel):
+    """Expose the samples of a kodos.corpus.Corpus, and the verdicts of a
+    pattern over them, as the rows of a pass/fail table.
+
+    Like MatchTableModel, the values are read from the corpus when a view
+    asks for them, so only the visible rows cost something. Whether a sample
+    should match can be toggled from the "Expected" column.
+
+    """
+
+    HEADERS = ["#", "Expected", "Verdict", "Sample"]
+    EXPECTED = {True: "match", False: "no match"}
+    VERDICTS = {
+        corpus.UNKNOWN  : "...",
+        corpus.MATCH    : "match",
+        corpus.NO_MATCH : "no match",
+    }
+    # Colors of the verdicts, depending on whether they are the expected ones
+    PASSED = QColor(200, 255, 200)
+    FAILED = QColor(255, 200, 200)
+    # Number of characters of the samples displayed
+    SAMPLE_WIDTH = 200
+
+    def __init__(self, *args, **kwargs):
+        super(CorpusTableModel, self).__init__(*args, **kwargs)
+
+        self._corpus = None
+        self._verdicts = None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self._corpus is None:
+            return 0
+        return len(self._corpus)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return QVariant()
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == 1:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role):
+        row, column = index.row(), index.column()
+        expected = bool(self._corpus.expected[row])
+        verdict = corpus.UNKNOWN
+        if self._verdicts is not None:
+            verdict = self._verdicts[row]
+
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return row + 1
+            elif column == 1:
+                return self.EXPECTED[expected]
+            elif column == 2:
+                return self.VERDICTS[verdict]
+            text = snapshot.decode(self._corpus.texts[row][:self.SAMPLE_WIDTH])
+            return text.replace("\n", u"\u21b5")
+
+        elif role == Qt.CheckStateRole and column == 1:
+            return Qt.Checked if expected else Qt.Unchecked
+
+        elif (role == Qt.BackgroundRole and column == 2
+              and verdict != corpus.UNKNOWN):
+            return self.PASSED if verdict == expected else self.FAILED
+
+        return QVariant()
+
+    def setData(self, index, value, role):
+        if index.column() != 1 or role != Qt.CheckStateRole:
+            return False
+
+        # value is a QVariant
+        self._corpus.setExpected(
+            index.row(), value.toInt()[0] == Qt.Checked)
+        self.dataChanged.emit(index, self.index(index.row(), 2))
+        return True
+
+    # Kodos API
+    def setCorpus(self, samples, verdicts=None):
+        """Display the samples of a corpus, and their `verdicts` array (see
+        kodos.corpus.Corpus.verdicts())"""
+
+        self.beginResetModel()
+        self._corpus = samples
+        self._verdicts = verdicts
+        self.endResetModel()
+
+    def setVerdicts(self, verdicts):
+        """Display another verdicts array"""
+
+        self._verdicts = verdicts
+        self.verdictsChanged()
+
+    def verdictsChanged(self, rows=None):
+        """Tell the views the verdicts of `rows` (all of them by default)
+        changed"""
+
+        if self._corpus is None or not len(self._corpus):
+            return
+        if rows is None:
+            rows = [0, len(self._corpus) - 1]
+        self.dataChanged.emit(
+            self.index(min(rows), 2), self.index(max(rows), 2))
+
+    def clear(self):
+        """Remove the corpus from the model"""
+
+        self.setCorpus(None)
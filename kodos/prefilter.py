@@ -0,0 +1,218 @@
+r"""Skip the parts of a text which can't hold a match of a regex.
+
+Most patterns contain a literal which every match holds, at a bounded
+distance from its start: "user_id=" in "\w{1,8} user_id=(\d+)". The
+occurrences of this literal are found with a plain substring search, which
+is much faster than running the regex, and the regex is only tried at the
+positions from which a match could reach one of them. The matches are the
+same as the ones of a plain scan: only the positions where no match can
+start are skipped.
+
+The literals are extracted from the syntax tree of the stdlib parser
+(sre_parse), so this only applies to the re engine. There is no safe
+literal when the pattern ignores the case, when the parts before the
+literal can match texts of any length, or when the literal starts the
+pattern (re already looks for such prefixes by itself).
+
+"""
+
+import sre_constants
+import sre_parse
+
+from kodos import engine
+
+
+# Literals shorter than this are too frequent to be worth the detour
+MIN_LENGTH = 3
+
+# Literals whose distance to the start of the matches varies by more than
+# this need too many attempts around each of their occurrences
+MAX_WINDOW = 256
+
+# When the regex is tried more than this many times per KB of text, the
+# literal is too common: the text is scanned by the regex alone instead.
+# This is checked every CHECK_INTERVAL attempts.
+MAX_ATTEMPTS_PER_KB = 16
+CHECK_INTERVAL = 256
+
+# How many literals are kept around by requiredLiteral()
+LITERALS_CACHE_SIZE = 64
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_CHARACTERS = (sre_constants.LITERAL, sre_constants.NOT_LITERAL,
+               sre_constants.ANY, sre_constants.IN, sre_constants.CATEGORY)
+_ASSERTIONS = (sre_constants.AT, sre_constants.ASSERT,
+               sre_constants.ASSERT_NOT)
+
+
+class Literal(object):
+    """A text every match of a pattern holds, between `minOffset` and
+    `maxOffset` characters after the start of the match"""
+
+    def __init__(self, text, minOffset, maxOffset):
+        self.text = text
+        self.minOffset = minOffset
+        self.maxOffset = maxOffset
+
+    def __repr__(self):
+        return "<Literal %r at %d-%d>" % (self.text, self.minOffset,
+                                          self.maxOffset)
+
+
+_literals = engine.LRUCache(LITERALS_CACHE_SIZE)
+
+
+def requiredLiteral(pattern, flags=0):
+    """Return the Literal used to prefilter a pattern, or None if there is no
+    safe one"""
+
+    key = (type(pattern), pattern, flags)
+    if key not in _literals:
+        _literals.put(key, _requiredLiteral(pattern, flags))
+    return _literals.get(key)
+
+
+def _requiredLiteral(pattern, flags):
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (sre_constants.error, IndexError, OverflowError, RuntimeError):
+        return None
+    if parsed.pattern.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return None
+
+    character = unichr if isinstance(pattern, unicode) else chr
+    candidates = []
+    _walk(parsed.data, 0, 0, candidates)
+
+    best = None
+    for codes, minOffset, maxOffset in candidates:
+        if (len(codes) < MIN_LENGTH or maxOffset is None or maxOffset == 0
+                or maxOffset - minOffset > MAX_WINDOW):
+            continue
+        literal = Literal(u"".join(map(character, codes)), minOffset,
+                          maxOffset)
+        if best is None or len(literal.text) > len(best.text):
+            best = literal
+
+    if best is not None and not isinstance(pattern, unicode):
+        best.text = str(best.text)
+    return best
+
+
+def _walk(items, minOffset, maxOffset, candidates):
+    """Append the (codes, min offset, max offset) of the runs of literal
+    characters a sequence of nodes requires to `candidates`, where the
+    sequence starts between minOffset and maxOffset (None if unbounded).
+    Return the offsets of the end of the sequence."""
+
+    run = []
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            if not run:
+                start = (minOffset, maxOffset)
+            run.append(av)
+            minOffset, maxOffset = _add((minOffset, maxOffset), (1, 1))
+            continue
+
+        if run:
+            candidates.append((run, start[0], start[1]))
+            run = []
+
+        if op == sre_constants.SUBPATTERN:
+            minOffset, maxOffset = _walk(
+                av[-1], minOffset, maxOffset, candidates)
+            continue
+        if op in _REPEATS and av[0] >= 1:
+            # The first repetition is required
+            _walk(av[2], minOffset, maxOffset, candidates)
+        minOffset, maxOffset = _add((minOffset, maxOffset),
+                                    _width([(op, av)]))
+
+    if run:
+        candidates.append((run, start[0], start[1]))
+    return minOffset, maxOffset
+
+
+def _add(first, second):
+    if first[1] is None or second[1] is None:
+        return first[0] + second[0], None
+    return first[0] + second[0], first[1] + second[1]
+
+
+def _width(items):
+    """Return the (min, max) number of characters a sequence of nodes
+    matches, where max is None if it is unbounded"""
+
+    width = (0, 0)
+    for op, av in getattr(items, 'data', items):
+        if op in _CHARACTERS:
+            width = _add(width, (1, 1))
+        elif op in _ASSERTIONS:
+            pass
+        elif op == sre_constants.SUBPATTERN:
+            width = _add(width, _width(av[-1]))
+        elif op == sre_constants.BRANCH:
+            widths = [_width(branch) for branch in av[1]]
+            highest = [high for low, high in widths]
+            width = _add(width, (min(low for low, high in widths),
+                                 None if None in highest else max(highest)))
+        elif op in _REPEATS:
+            low, high = _width(av[2])
+            if high is None or (high and av[1] >= sre_constants.MAXREPEAT):
+                width = _add(width, (low * av[0], None))
+            else:
+                width = _add(width, (low * av[0], high * av[1]))
+        else:
+            # Backreferences, and whatever else may match anything
+            width = _add(width, (0, None))
+    return width
+
+
+def finditer(regex, text, literal):
+    """Iterate over the matches of a compiled regex in a text, like
+    regex.finditer(text), only trying the regex around the occurrences of
+    its required literal; unless they are so frequent that a plain scan
+    would be faster"""
+
+    find = text.find
+    match = regex.match
+    needle = literal.text
+    minOffset = literal.minOffset
+    maxOffset = literal.maxOffset
+
+    # Where the next match can start, where to look for the next occurrence
+    # of the literal, and the position before which every start has been
+    # tried already
+    position = 0
+    searchFrom = minOffset
+    tried = 0
+    # Number of times the regex has been tried, and when to check whether
+    # that's too often
+    attempts = 0
+    check = CHECK_INTERVAL
+
+    while True:
+        if attempts >= check:
+            if attempts * 1024 > MAX_ATTEMPTS_PER_KB * searchFrom:
+                for found in regex.finditer(text, position):
+                    yield found
+                return
+            check += CHECK_INTERVAL
+
+        hit = find(needle, searchFrom)
+        if hit == -1:
+            return
+
+        last = hit - minOffset
+        for start in xrange(max(tried, position, hit - maxOffset), last + 1):
+            attempts += 1
+            found = match(text, start)
+            if found is not None:
+                yield found
+                # The matches always hold the literal: they can't be empty
+                position = tried = found.end()
+                searchFrom = position + minOffset
+                break
+        else:
+            tried = max(tried, last + 1)
+            searchFrom = hit + 1
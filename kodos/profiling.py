@@ -0,0 +1,103 @@
+"""Profile the GUI event handlers with cProfile.
+
+The handlers are wrapped once, when the main window is built, and only run
+under the profiler while the profiling is enabled. Each handler has its own
+profile, so that the hot functions can be told apart per handler; the
+profiles are merged when they are written in the pstats format.
+
+cProfile can't run two profilers at once: a handler called by another
+profiled handler (like onValidRegex, called when onComputeRegex finds the
+result in the cache) is accounted in the profile of the outer one.
+
+"""
+
+import cProfile
+import functools
+import pstats
+from StringIO import StringIO
+
+
+# The handlers of kodos.main.KodosMainWindow which are profiled
+HANDLERS = [
+    'onComputeRegex',
+    'onValidRegex',
+    'onMatchNumberChange',
+    'onReplaceNumberChange',
+    'onReplaceChange',
+]
+
+
+class HandlerProfiler(object):
+    """Profile the calls of some handlers, while enabled"""
+
+    # Number of functions listed per handler in the summary
+    TOP_FUNCTIONS = 15
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        # The cProfile.Profile of each handler, and how many times it has
+        # been called while profiled
+        self.profiles = {}
+        self.calls = {}
+        self._running = False
+
+    def setEnabled(self, enabled):
+        self.enabled = enabled
+
+    def wrap(self, name, handler):
+        """Return a version of `handler` which is profiled as `name`"""
+
+        @functools.wraps(handler)
+        def profiled(*args):
+            if not self.enabled or self._running:
+                return handler(*args)
+
+            profile = self.profiles.get(name)
+            if profile is None:
+                profile = self.profiles[name] = cProfile.Profile()
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+            self._running = True
+            try:
+                return profile.runcall(handler, *args)
+            finally:
+                self._running = False
+
+        return profiled
+
+    def stats(self):
+        """Return the pstats.Stats of all the handlers, or None if nothing
+        has been profiled yet"""
+
+        stats = None
+        for profile in self.profiles.itervalues():
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        return stats
+
+    def summary(self):
+        """Return the hottest functions of each handler, as a text"""
+
+        sections = []
+        for name in sorted(self.profiles):
+            output = StringIO()
+            stats = pstats.Stats(self.profiles[name], stream=output)
+            stats.sort_stats('time').print_stats(self.TOP_FUNCTIONS)
+            sections.append("%s (%d calls)\n%s"
+                            % (name, self.calls[name], output.getvalue()))
+        return "\n".join(sections)
+
+    def export(self, path):
+        """Write the profiles in `path` (in the pstats format), and their
+        summary in `path`.txt. Return False if nothing was profiled."""
+
+        stats = self.stats()
+        if stats is None:
+            return False
+
+        stats.dump_stats(path)
+        with open(path + ".txt", 'w') as output:
+            output.write(self.summary())
+        return True
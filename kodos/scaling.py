@@ -0,0 +1,138 @@
+r"""Measure how the time taken by a pattern grows with the size of its input.
+
+The inputs are built from a sample text, at increasing sizes, in two
+variants: the sample replicated, and a "near miss" where the replicated
+sample ends with a character it doesn't contain (what makes patterns like
+"^(\w+\s?)*$" backtrack the most). Each run times one operation (search,
+finditer or sub) over one input; the runs are meant to be evaluated one at a
+time in a worker process, so that they can be stopped when they take too
+long.
+
+The growth of each series of runs is summarized by its empirical complexity
+exponent: the slope of log(time) over log(size), which is about 1 for a
+linear pattern and 2 for a quadratic one.
+
+"""
+
+import math
+import time
+
+from kodos import backends, engine
+
+
+# Sizes of the inputs, in bytes
+SIZES = [1024 * 2 ** power for power in xrange(8)]
+
+REPLICATED = "replicated"
+NEAR_MISS = "near miss"
+VARIANTS = [REPLICATED, NEAR_MISS]
+
+OPERATIONS = ["search", "finditer", "sub"]
+
+# Runs faster than this (in seconds) are too noisy to be used by the fit
+MIN_TIME = 0.0005
+
+# Exponents from which a series is considered superlinear
+SUPERLINEAR = 1.4
+QUADRATIC = 1.8
+
+# Characters appended to the near misses, the first one which isn't in the
+# sample is used
+_BREAKERS = "!#%\x00"
+
+
+def makeInput(sample, size, variant=REPLICATED):
+    """Return an input of `size` bytes built from a sample"""
+
+    text = (sample * (size // len(sample) + 1))[:size]
+    if variant == NEAR_MISS:
+        breaker = [char for char in _BREAKERS if char not in sample]
+        text = text[:-1] + (breaker[0] if breaker else "")
+    return text
+
+
+def timeRun(pattern, flags, replace, sample, size, variant, operation,
+            backend=backends.DEFAULT):
+    """Return how long, in seconds, an operation takes over an input built
+    from the sample, or None if the pattern is invalid"""
+
+    try:
+        regex = engine.compile(pattern, flags, backend)
+    except backends.get(backend).errors:
+        return None
+    text = makeInput(sample, size, variant)
+
+    started = time.time()
+    if operation == "search":
+        regex.search(text)
+    elif operation == "finditer":
+        for match in regex.finditer(text):
+            pass
+    else:
+        try:
+            regex.sub(replace or "", text)
+        except backends.get(backend).errors:
+            # The replacement is invalid: time the matches only
+            regex.sub("", text)
+    return time.time() - started
+
+
+def fitExponent(points):
+    """Return the slope of log(time) over log(size) for the (size, time)
+    points, or None if there aren't enough significant points"""
+
+    points = [(math.log(size), math.log(seconds)) for size, seconds in points
+              if seconds >= MIN_TIME]
+    if len(points) < 2:
+        return None
+
+    meanX = sum(x for x, y in points) / len(points)
+    meanY = sum(y for x, y in points) / len(points)
+    variance = sum((x - meanX) ** 2 for x, y in points)
+    if not variance:
+        return None
+    return sum((x - meanX) * (y - meanY) for x, y in points) / variance
+
+
+class Series(object):
+    """The timings of an operation over the inputs of a variant"""
+
+    def __init__(self, variant, operation):
+        self.variant = variant
+        self.operation = operation
+        # The (size, seconds) of each run
+        self.points = []
+        # Size of the run which took too long, if any
+        self.timedOut = None
+
+    def __str__(self):
+        return "%s, %s" % (self.operation, self.variant)
+
+    def exponent(self):
+        return fitExponent(self.points)
+
+    def isSuperlinear(self):
+        if self.timedOut is not None:
+            return True
+        exponent = self.exponent()
+        return exponent is not None and exponent >= SUPERLINEAR
+
+    def describe(self):
+        """Return the complexity of the series, as a text"""
+
+        exponent = self.exponent()
+        growth = []
+        if exponent is not None:
+            if exponent >= QUADRATIC:
+                complexity = "quadratic or worse"
+            elif exponent >= SUPERLINEAR:
+                complexity = "superlinear"
+            else:
+                complexity = "linear"
+            growth.append("~n^%.1f, %s" % (exponent, complexity))
+        elif self.points and self.timedOut is None:
+            growth.append("too fast to measure")
+
+        if self.timedOut is not None:
+            growth.append("timed out at %d KB" % (self.timedOut // 1024))
+        return "%s: %s" % (self, ", ".join(growth) or "not measured yet")
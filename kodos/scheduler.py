@@ -0,0 +1,100 @@
+from PyQt4 import QtCore
+
+
+class SchedulerStats(object):
+    """Counters describing how the evaluation scheduler behaved so far"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Set all the counters back to zero"""
+
+        # Number of times an evaluation has been asked for
+        self.requested = 0
+        # Requests which have been merged into an already pending evaluation
+        self.coalesced = 0
+        # Evaluations which have really been run
+        self.executed = 0
+        # Evaluations whose inputs changed while they ran
+        self.superseded = 0
+
+    def asDict(self):
+        return {
+            'requested'  : self.requested,
+            'coalesced'  : self.coalesced,
+            'executed'   : self.executed,
+            'superseded' : self.superseded,
+        }
+
+    def __str__(self):
+        return ("%(requested)d requested, %(coalesced)d coalesced, "
+                "%(executed)d executed, %(superseded)d superseded"
+                % self.asDict())
+
+
+class EvaluationScheduler(QtCore.QObject):
+    """Collapse bursts of change notifications into a single evaluation.
+
+    Each call to schedule() (re)starts a quiet period of `delay` milliseconds;
+    the `triggered` signal is only emitted once no other request has been made
+    during this period. The evaluations already running when new ones are
+    requested are dropped by the consumers of the `requested` signal.
+
+    """
+
+    DEFAULT_DELAY = 150
+
+    # Emitted as soon as an evaluation is asked for
+    requested = QtCore.pyqtSignal()
+    # Emitted once the quiet period is over
+    triggered = QtCore.pyqtSignal()
+
+    def __init__(self, delay=DEFAULT_DELAY, parent=None):
+        super(EvaluationScheduler, self).__init__(parent)
+
+        self.stats = SchedulerStats()
+        self._pending = False
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._onTimeout)
+        self.setDelay(delay)
+
+    def delay(self):
+        """Return the quiet period, in milliseconds"""
+
+        return self._timer.interval()
+
+    def setDelay(self, delay):
+        """Set the quiet period, in milliseconds, before an evaluation runs"""
+
+        if delay < 0:
+            raise ValueError("The scheduler delay must be positive (got %r)"
+                             % delay)
+        self._timer.setInterval(int(delay))
+
+    def schedule(self, *args):
+        """Ask for an evaluation.
+
+        Extra arguments are accepted and ignored, so this can be connected
+        directly to any signal (textChanged, stateChanged, ...)
+        """
+
+        self.stats.requested += 1
+        if self._pending:
+            self.stats.coalesced += 1
+        self._pending = True
+        self._timer.start()
+        self.requested.emit()
+
+    def _onTimeout(self):
+        self._pending = False
+        self.stats.executed += 1
+        self.triggered.emit()
+
+        if self._pending:
+            # The inputs changed while the evaluation was running (a slot
+            # modified one of the watched widgets): its results are already
+            # stale, and a new evaluation has been scheduled.
+            self.stats.superseded += 1
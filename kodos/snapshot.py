@@ -0,0 +1,138 @@
+"""Immutable copies of the text inputs, and their offset maps.
+
+The regexes run over the UTF-8 encoding of the texts, so the matches
+positions are byte offsets, whereas the Qt editors count their positions in
+UTF-16 code units. A TextSnapshot holds both versions of a text, taken once
+per revision of the input, and converts the positions from one to the
+other.
+
+"""
+
+from array import array
+from bisect import bisect_right
+
+from kodos import engine
+
+
+_CONTINUATION_BYTES = "".join(chr(byte) for byte in xrange(0x80, 0xc0))
+# Characters encoded on four bytes take two UTF-16 code units
+_FOUR_BYTES_LEADS = "".join(chr(byte) for byte in xrange(0xf0, 0xf8))
+
+
+def _units(data):
+    """Return the number of UTF-16 code units of a piece of UTF-8 text"""
+
+    return (len(data.translate(None, _CONTINUATION_BYTES))
+            + len(data) - len(data.translate(None, _FOUR_BYTES_LEADS)))
+
+
+def utf16Length(data):
+    """Return the length of a UTF-8 string once displayed in a Qt editor"""
+
+    return len(data.decode('utf-8', 'replace').encode('utf-16-le')) // 2
+
+
+class TextSnapshot(object):
+    """A text, as displayed (`text`) and as searched (`data`, its UTF-8
+    encoding), taken at a given revision of an input.
+
+    Byte offsets in `data` are converted to editor positions (UTF-16 code
+    units in `text`) and back with toChars() and toBytes(). The conversions
+    cost nothing for ASCII texts; otherwise they use the number of code
+    units before each block of BLOCK_SIZE bytes, and only scan one block.
+    """
+
+    BLOCK_SIZE = 1024
+
+    def __init__(self, text, revision=0, data=None):
+        self.text = text
+        self.revision = revision
+        self.data = data if data is not None else text.encode('utf-8')
+
+        # Code units before each block of data, or None if each byte is a
+        # character
+        self._blocks = None
+        if len(self.data) != len(self.text):
+            self._blocks = array('l', [0])
+            for start in xrange(0, len(self.data), self.BLOCK_SIZE):
+                block = self.data[start:start + self.BLOCK_SIZE]
+                self._blocks.append(self._blocks[-1] + _units(block))
+
+    @classmethod
+    def fromBytes(cls, data, revision=0):
+        """Take a snapshot of a text read as bytes.
+
+        Texts which aren't valid UTF-8 are displayed as Latin-1, so that
+        each byte is displayed as one character.
+        """
+
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            text = data.decode('latin-1')
+        return cls(text, revision, data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def toChars(self, offset):
+        """Return the editor position of a byte offset"""
+
+        if self._blocks is None:
+            return offset
+
+        offset = min(offset, len(self.data))
+        block = offset // self.BLOCK_SIZE
+        start = block * self.BLOCK_SIZE
+        return self._blocks[block] + _units(self.data[start:offset])
+
+    def toBytes(self, position):
+        """Return the byte offset of an editor position"""
+
+        if self._blocks is None:
+            return position
+
+        data = self.data
+        block = max(0, bisect_right(self._blocks, position) - 1)
+        offset = min(block * self.BLOCK_SIZE, len(data))
+        units = self._blocks[block]
+
+        # Skip the end of a character starting in the previous block
+        while offset < len(data) and "\x80" <= data[offset] < "\xc0":
+            offset += 1
+
+        while units < position and offset < len(data):
+            byte = data[offset]
+            if byte < "\x80":
+                offset += 1
+                units += 1
+            elif byte < "\xe0":
+                offset += 2
+                units += 1
+            elif byte < "\xf0":
+                offset += 3
+                units += 1
+            else:
+                offset += 4
+                units += 2
+
+        return min(offset, len(data))
+
+
+def decode(data):
+    """Return a piece of UTF-8 text (or None) as it is displayed"""
+
+    if data is None:
+        return None
+    return data.decode('utf-8', 'replace')
+
+
+def byteEdit(edit, old, new):
+    """Convert a kodos.engine.Edit expressed in editor positions into byte
+    offsets, from the snapshots of the text before (`old`) and after (`new`)
+    the edit"""
+
+    converted = engine.Edit(new.toBytes(edit.start), 0, 0)
+    converted.oldEnd = old.toBytes(edit.oldEnd)
+    converted.newEnd = new.toBytes(edit.newEnd)
+    return converted
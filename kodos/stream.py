@@ -0,0 +1,192 @@
+"""Scan inputs with a regex, chunk by chunk.
+
+This is meant for inputs which are too large to be scanned at once, or which
+can't be, like pipes: the input is read by fixed-size chunks, and the
+matches are yielded as soon as they are found. Only a chunk and an overlap
+window are kept in memory at a time.
+
+A match can't be longer than the overlap window: a longer match may be cut
+or missed at a chunk boundary.
+
+"""
+
+import time
+
+from kodos import backends, engine
+
+
+ScanProgress = engine.ScanProgress
+
+
+class StreamScanner(object):
+    """Scan a file-like object with a compiled regex, by chunks.
+
+    Iterating over the scanner yields, for each match, a flat tuple of the
+    spans of the whole match and of each of its groups (see
+    kodos.engine.EvaluationResult), relative to the beginning of the input.
+
+    Matches found in the last `overlap` characters of the buffer are held
+    back until the next chunk has been read, so that a match crossing a chunk
+    boundary is seen whole; the scan resumes where the last yielded match
+    ended, so that no match is yielded twice. The `overlap` characters before
+    the resume position are kept as context for the lookbehind assertions.
+
+    `report`, if specified, is called with the kodos.engine.ScanProgress of
+    the scan after each chunk.
+
+    """
+
+    DEFAULT_CHUNK_SIZE = 1024 * 1024
+    DEFAULT_OVERLAP = 4096
+
+    def __init__(self, regex, stream, chunkSize=DEFAULT_CHUNK_SIZE,
+                 overlap=DEFAULT_OVERLAP, total=None, report=None):
+        if overlap < 1:
+            # Without context, "^" and "\b" would match at each chunk start
+            raise ValueError("The overlap must be at least 1 (got %d)"
+                             % overlap)
+        if overlap >= chunkSize:
+            raise ValueError("The overlap (%d) must be smaller than the chunk "
+                             "size (%d)" % (overlap, chunkSize))
+
+        self.regex = regex
+        self.stream = stream
+        self.chunkSize = chunkSize
+        self.overlap = overlap
+        self.progress = ScanProgress(total)
+        self.report = report
+        # The match whose spans have been yielded last
+        self.match = None
+
+        self._buffer = None
+        self._base = 0
+
+    def text(self, start, end):
+        """Return the [start, end[ part of the input.
+
+        Only the part of the input around the last yielded match is
+        available.
+        """
+
+        return self._buffer[start - self._base:end - self._base]
+
+    def __iter__(self):
+        groups = range(self.regex.groups + 1)
+        buffer = self._buffer = self.stream.read(0)
+        # Position of the beginning of the buffer in the input
+        base = self._base = 0
+        # Where the next match can start, in the input
+        resume = 0
+
+        while True:
+            chunk = self.stream.read(self.chunkSize)
+            eof = not chunk
+            buffer = self._buffer = buffer + chunk
+            self.progress.scanned += len(chunk)
+
+            limit = len(buffer) if eof else len(buffer) - self.overlap
+            for match in self.regex.finditer(buffer, resume - base):
+                start, end = match.span()
+                if not eof and end > limit:
+                    # Wait for the next chunk before deciding about it
+                    resume = base + start
+                    break
+
+                self.progress.matches += 1
+                spans = []
+                for group in groups:
+                    groupStart, groupEnd = match.span(group)
+                    if groupStart != -1:
+                        groupStart += base
+                        groupEnd += base
+                    spans.append(groupStart)
+                    spans.append(groupEnd)
+                self.match = match
+                yield tuple(spans)
+
+                # re doesn't allow an empty match right where the previous
+                # one ended
+                resume = base + end + (start == end)
+            else:
+                resume = max(resume, base + limit)
+
+            self.progress.update()
+            if self.report is not None:
+                self.report(self.progress)
+            if eof:
+                return
+
+            cut = max(0, resume - base - self.overlap)
+            buffer = self._buffer = buffer[cut:]
+            base = self._base = base + cut
+
+
+class _TextStream(object):
+    """Minimal file-like object reading a string by slices"""
+
+    def __init__(self, text):
+        self.text = text
+        self.position = 0
+
+    def read(self, size):
+        data = self.text[self.position:self.position + size]
+        self.position += len(data)
+        return data
+
+
+def scanText(pattern, flags, text, replace=None, backend=backends.DEFAULT,
+             chunkSize=StreamScanner.DEFAULT_CHUNK_SIZE,
+             overlap=StreamScanner.DEFAULT_OVERLAP, progress=None,
+             interval=0.1):
+    """Evaluate a regex against a text by chunks, and return an
+    EvaluationResult, like kodos.engine.evaluate() does.
+
+    `progress`, if specified, is called with the ScanProgress of the scan
+    at most every `interval` seconds, along with the matches found since
+    the previous call.
+
+    The results are only the ones of engine.evaluate() for matches which
+    fit in the overlap window, and for lookarounds which don't look further.
+    """
+
+    errors = backends.get(backend).errors
+    started = time.time()
+    try:
+        regex = engine.compile(pattern, flags, backend)
+    except errors, e:
+        return engine.EvaluationResult(pattern, flags, error=e.args[0],
+                                       backend=backend)
+
+    result = engine.EvaluationResult(
+        pattern, flags, regex.groups, regex.groupindex, replace=replace,
+        backend=backend)
+    compiled = time.time()
+    result.timings.append(('compile', started, compiled - started))
+
+    # When the progress has been reported last, and how many spans had been
+    # found then
+    lastReport = [time.time(), 0]
+    def report(scanProgress):
+        if progress is not None and time.time() - lastReport[0] > interval:
+            scanProgress.groups = regex.groups
+            scanProgress.spans = result.spans[lastReport[1]:]
+            progress(scanProgress)
+            lastReport[:] = [time.time(), len(result.spans)]
+
+    scanner = StreamScanner(regex, _TextStream(text), chunkSize, overlap,
+                            total=len(text), report=report)
+    expansions = [] if replace else None
+    for spans in scanner:
+        result.spans.extend(spans)
+
+        if expansions is not None:
+            # The groups of the scanned match are the same, only shifted
+            try:
+                expansions.append(scanner.match.expand(replace))
+            except errors, e:
+                result.replaceError = e.args[0]
+                expansions = None
+
+    result.expansions = expansions
+    result.timings.append(('scan', compiled, time.time() - compiled))
+    return result
@@ -0,0 +1,160 @@
+"""Time the stages of the update pipeline.
+
+The durations are kept in a rolling history, which can be exported as a
+JSON trace in the Trace Event Format (as read by chrome://tracing or
+Perfetto). Recording is disabled by default, and then only costs a method
+call per stage.
+
+"""
+
+import json
+import time
+from collections import deque
+
+
+# Timelines of the trace
+GUI = 0
+WORKER = 1
+TIMELINES = {GUI: "GUI", WORKER: "Worker process"}
+
+
+class _NullStage(object):
+    """Stage returned when the recording is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.tracer.add(self.name, self.start, time.time() - self.start)
+        return False
+
+
+class Tracer(object):
+    """Record how long each stage of the updates takes.
+
+    Stages are timed with:
+
+        with tracer.stage("highlight"):
+            ...
+
+    or recorded after the fact with add(), for the ones timed in another
+    process. The stages recorded between begin() and end() form an update,
+    whose breakdown is available with lastBreakdown().
+
+    """
+
+    DEFAULT_HISTORY = 10000
+
+    def __init__(self, enabled=False, history=DEFAULT_HISTORY):
+        self.enabled = enabled
+        self.events = deque(maxlen=history)
+
+        self._update = None
+        self._updateStart = None
+        self._lastBreakdown = []
+        self._lastTotal = None
+
+    def setEnabled(self, enabled):
+        self.enabled = enabled
+
+    def stage(self, name):
+        """Return a context manager timing the stage `name`"""
+
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def add(self, name, start, duration, timeline=GUI):
+        """Record a stage which started at `start` (a time.time() value) and
+        lasted `duration` seconds"""
+
+        if not self.enabled:
+            return
+
+        self.events.append((name, start, duration, timeline))
+        if self._update is not None:
+            self._update.append((name, duration))
+
+    def begin(self):
+        """Start a new update"""
+
+        if not self.enabled:
+            return
+
+        self._update = []
+        self._updateStart = time.time()
+
+    def end(self):
+        """Finish the current update"""
+
+        if not self.enabled or self._update is None:
+            return
+
+        total = time.time() - self._updateStart
+        self.events.append(("update", self._updateStart, total, GUI))
+        self._lastBreakdown = self._update
+        self._lastTotal = total
+        self._update = None
+
+    def lastBreakdown(self):
+        """Return the [(stage, duration), ...] of the last update"""
+
+        return list(self._lastBreakdown)
+
+    def formatBreakdown(self):
+        """Return the breakdown of the last update, as a text"""
+
+        if self._lastTotal is None:
+            return ""
+
+        lines = ["%-16s %8.1f ms" % (name, duration * 1000)
+                 for name, duration in self._lastBreakdown]
+        lines.append("%-16s %8.1f ms" % ("total", self._lastTotal * 1000))
+        return "\n".join(lines)
+
+    def trace(self):
+        """Return the recorded history in the Trace Event Format"""
+
+        events = [{
+            'name' : 'thread_name',
+            'ph'   : 'M',
+            'pid'  : 0,
+            'tid'  : timeline,
+            'args' : {'name': name},
+        } for timeline, name in sorted(TIMELINES.items())]
+
+        for name, start, duration, timeline in self.events:
+            events.append({
+                'name' : name,
+                'cat'  : 'kodos',
+                'ph'   : 'X',
+                'ts'   : int(start * 1e6),
+                'dur'  : int(duration * 1e6),
+                'pid'  : 0,
+                'tid'  : timeline,
+            })
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path):
+        """Write the recorded history as a JSON trace in `path`"""
+
+        with open(path, 'w') as output:
+            json.dump(self.trace(), output)
@@ -51,6 +51,12 @@ class Ui_MainWindow(object):
         self.unicodeFlag = QtGui.QCheckBox(self.groupBox_2)
         self.unicodeFlag.setObjectName("unicodeFlag")
         self.horizontalLayout_2.addWidget(self.unicodeFlag)
+        self.labelBackend = QtGui.QLabel(self.groupBox_2)
+        self.labelBackend.setObjectName("labelBackend")
+        self.horizontalLayout_2.addWidget(self.labelBackend)
+        self.backendBox = QtGui.QComboBox(self.groupBox_2)
+        self.backendBox.setObjectName("backendBox")
+        self.horizontalLayout_2.addWidget(self.backendBox)
         self.verticalLayout_4.addWidget(self.groupBox_2)
         self.verticalLayout.addLayout(self.verticalLayout_4)
         self.tabWidget_2 = QtGui.QTabWidget(self.centralwidget)
@@ -123,6 +129,42 @@ class Ui_MainWindow(object):
         self.matchAllText.setObjectName("matchAllText")
         self.verticalLayout_8.addWidget(self.matchAllText)
         self.tabWidget.addTab(self.tab_3, "")
+        self.tab_8 = QtGui.QWidget()
+        self.tab_8.setObjectName("tab_8")
+        self.verticalLayout_13 = QtGui.QVBoxLayout(self.tab_8)
+        self.verticalLayout_13.setObjectName("verticalLayout_13")
+        self.matchesView = QtGui.QTableView(self.tab_8)
+        self.matchesView.setSortingEnabled(True)
+        self.matchesView.setObjectName("matchesView")
+        self.verticalLayout_13.addWidget(self.matchesView)
+        self.tabWidget.addTab(self.tab_8, "")
+        self.tab_9 = QtGui.QWidget()
+        self.tab_9.setObjectName("tab_9")
+        self.verticalLayout_14 = QtGui.QVBoxLayout(self.tab_9)
+        self.verticalLayout_14.setObjectName("verticalLayout_14")
+        self.corpusSummary = QtGui.QLabel(self.tab_9)
+        self.corpusSummary.setObjectName("corpusSummary")
+        self.verticalLayout_14.addWidget(self.corpusSummary)
+        self.corpusView = QtGui.QTableView(self.tab_9)
+        self.corpusView.setObjectName("corpusView")
+        self.verticalLayout_14.addWidget(self.corpusView)
+        self.tabWidget.addTab(self.tab_9, "")
+        self.tab_10 = QtGui.QWidget()
+        self.tab_10.setObjectName("tab_10")
+        self.verticalLayout_15 = QtGui.QVBoxLayout(self.tab_10)
+        self.verticalLayout_15.setObjectName("verticalLayout_15")
+        self.horizontalLayout_3 = QtGui.QHBoxLayout()
+        self.horizontalLayout_3.setObjectName("horizontalLayout_3")
+        self.scalingButton = QtGui.QPushButton(self.tab_10)
+        self.scalingButton.setObjectName("scalingButton")
+        self.horizontalLayout_3.addWidget(self.scalingButton)
+        spacerItem3 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_3.addItem(spacerItem3)
+        self.verticalLayout_15.addLayout(self.horizontalLayout_3)
+        self.scalingSummary = QtGui.QLabel(self.tab_10)
+        self.scalingSummary.setObjectName("scalingSummary")
+        self.verticalLayout_15.addWidget(self.scalingSummary)
+        self.tabWidget.addTab(self.tab_10, "")
         self.tab_4 = QtGui.QWidget()
         self.tab_4.setObjectName("tab_4")
         self.verticalLayout_9 = QtGui.QVBoxLayout(self.tab_4)
@@ -175,6 +217,18 @@ class Ui_MainWindow(object):
         self.actionImport_File.setObjectName("actionImport_File")
         self.actionIport_URL = QtGui.QAction(MainWindow)
         self.actionIport_URL.setObjectName("actionIport_URL")
+        self.actionSearch_Large_File = QtGui.QAction(MainWindow)
+        self.actionSearch_Large_File.setObjectName("actionSearch_Large_File")
+        self.actionClose_Large_File = QtGui.QAction(MainWindow)
+        self.actionClose_Large_File.setEnabled(False)
+        self.actionClose_Large_File.setObjectName("actionClose_Large_File")
+        self.actionOpen_Corpus = QtGui.QAction(MainWindow)
+        self.actionOpen_Corpus.setObjectName("actionOpen_Corpus")
+        self.actionOpen_Corpus_Directory = QtGui.QAction(MainWindow)
+        self.actionOpen_Corpus_Directory.setObjectName("actionOpen_Corpus_Directory")
+        self.actionClose_Corpus = QtGui.QAction(MainWindow)
+        self.actionClose_Corpus.setEnabled(False)
+        self.actionClose_Corpus.setObjectName("actionClose_Corpus")
         self.action_Exit = QtGui.QAction(MainWindow)
         self.action_Exit.setObjectName("action_Exit")
         self.action_Undo = QtGui.QAction(MainWindow)
@@ -203,6 +257,21 @@ class Ui_MainWindow(object):
         self.actionRegex_Library.setObjectName("actionRegex_Library")
         self.actionAbout = QtGui.QAction(MainWindow)
         self.actionAbout.setObjectName("actionAbout")
+        self.actionRecord_Timings = QtGui.QAction(MainWindow)
+        self.actionRecord_Timings.setCheckable(True)
+        self.actionRecord_Timings.setObjectName("actionRecord_Timings")
+        self.actionExport_Timings = QtGui.QAction(MainWindow)
+        self.actionExport_Timings.setObjectName("actionExport_Timings")
+        self.actionProfile_Handlers = QtGui.QAction(MainWindow)
+        self.actionProfile_Handlers.setCheckable(True)
+        self.actionProfile_Handlers.setObjectName("actionProfile_Handlers")
+        self.actionExport_Profile = QtGui.QAction(MainWindow)
+        self.actionExport_Profile.setObjectName("actionExport_Profile")
+        self.actionCompare_Engines = QtGui.QAction(MainWindow)
+        self.actionCompare_Engines.setObjectName("actionCompare_Engines")
+        self.actionCount_Steps = QtGui.QAction(MainWindow)
+        self.actionCount_Steps.setCheckable(True)
+        self.actionCount_Steps.setObjectName("actionCount_Steps")
         self.menu_File.addAction(self.action_New)
         self.menu_File.addAction(self.action_Open)
         self.menu_File.addAction(self.action_Save)
@@ -213,6 +282,13 @@ class Ui_MainWindow(object):
         self.menu_File.addAction(self.actionImport_File)
         self.menu_File.addAction(self.actionIport_URL)
         self.menu_File.addSeparator()
+        self.menu_File.addAction(self.actionSearch_Large_File)
+        self.menu_File.addAction(self.actionClose_Large_File)
+        self.menu_File.addSeparator()
+        self.menu_File.addAction(self.actionOpen_Corpus)
+        self.menu_File.addAction(self.actionOpen_Corpus_Directory)
+        self.menu_File.addAction(self.actionClose_Corpus)
+        self.menu_File.addSeparator()
         self.menu_File.addAction(self.action_Exit)
         self.menu_Edit.addAction(self.action_Undo)
         self.menu_Edit.addAction(self.action_Redo)
@@ -223,6 +299,13 @@ class Ui_MainWindow(object):
         self.menu_Edit.addSeparator()
         self.menu_Edit.addAction(self.action_Examine_Regex)
         self.menu_Edit.addAction(self.action_Pause_Processing)
+        self.menu_Edit.addAction(self.actionCompare_Engines)
+        self.menu_Edit.addAction(self.actionCount_Steps)
+        self.menu_Edit.addSeparator()
+        self.menu_Edit.addAction(self.actionRecord_Timings)
+        self.menu_Edit.addAction(self.actionExport_Timings)
+        self.menu_Edit.addAction(self.actionProfile_Handlers)
+        self.menu_Edit.addAction(self.actionExport_Profile)
         self.menu_Edit.addSeparator()
         self.menu_Edit.addAction(self.actionPreferences)
         self.menu_Help.addAction(self.actionHelp)
@@ -263,6 +346,7 @@ class Ui_MainWindow(object):
         self.verboseFlag.setText(QtGui.QApplication.translate("MainWindow", "Verbose", None, QtGui.QApplication.UnicodeUTF8))
         self.localeFlag.setText(QtGui.QApplication.translate("MainWindow", "Locale", None, QtGui.QApplication.UnicodeUTF8))
         self.unicodeFlag.setText(QtGui.QApplication.translate("MainWindow", "Unicode", None, QtGui.QApplication.UnicodeUTF8))
+        self.labelBackend.setText(QtGui.QApplication.translate("MainWindow", "Engine", None, QtGui.QApplication.UnicodeUTF8))
         self.tabWidget_2.setTabText(self.tabWidget_2.indexOf(self.tab_6), QtGui.QApplication.translate("MainWindow", "Search String", None, QtGui.QApplication.UnicodeUTF8))
         self.tabWidget_2.setTabText(self.tabWidget_2.indexOf(self.tab_7), QtGui.QApplication.translate("MainWindow", "Replace String", None, QtGui.QApplication.UnicodeUTF8))
         self.label.setText(QtGui.QApplication.translate("MainWindow", "Match Number", None, QtGui.QApplication.UnicodeUTF8))
@@ -270,6 +354,12 @@ class Ui_MainWindow(object):
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab), QtGui.QApplication.translate("MainWindow", "Group", None, QtGui.QApplication.UnicodeUTF8))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_2), QtGui.QApplication.translate("MainWindow", "Match", None, QtGui.QApplication.UnicodeUTF8))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_3), QtGui.QApplication.translate("MainWindow", "Match All", None, QtGui.QApplication.UnicodeUTF8))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_8), QtGui.QApplication.translate("MainWindow", "Match Table", None, QtGui.QApplication.UnicodeUTF8))
+        self.corpusSummary.setText(QtGui.QApplication.translate("MainWindow", "Open a corpus of samples to check the pattern against", None, QtGui.QApplication.UnicodeUTF8))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_9), QtGui.QApplication.translate("MainWindow", "Corpus", None, QtGui.QApplication.UnicodeUTF8))
+        self.scalingButton.setText(QtGui.QApplication.translate("MainWindow", "Run", None, QtGui.QApplication.UnicodeUTF8))
+        self.scalingSummary.setText(QtGui.QApplication.translate("MainWindow", "Time the pattern over growing copies of the search string", None, QtGui.QApplication.UnicodeUTF8))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_10), QtGui.QApplication.translate("MainWindow", "Scaling", None, QtGui.QApplication.UnicodeUTF8))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_4), QtGui.QApplication.translate("MainWindow", "Replace", None, QtGui.QApplication.UnicodeUTF8))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_5), QtGui.QApplication.translate("MainWindow", "Sample Code", None, QtGui.QApplication.UnicodeUTF8))
         self.menu_File.setTitle(QtGui.QApplication.translate("MainWindow", "&File", None, QtGui.QApplication.UnicodeUTF8))
@@ -284,6 +374,11 @@ class Ui_MainWindow(object):
         self.actionRevert_Kodos_File.setText(QtGui.QApplication.translate("MainWindow", "&Revert Kodos File", None, QtGui.QApplication.UnicodeUTF8))
         self.actionImport_File.setText(QtGui.QApplication.translate("MainWindow", "Import &File", None, QtGui.QApplication.UnicodeUTF8))
         self.actionIport_URL.setText(QtGui.QApplication.translate("MainWindow", "Import &URL", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionSearch_Large_File.setText(QtGui.QApplication.translate("MainWindow", "Search in &Large File...", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionClose_Large_File.setText(QtGui.QApplication.translate("MainWindow", "&Close Large File", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionOpen_Corpus.setText(QtGui.QApplication.translate("MainWindow", "O&pen Corpus...", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionOpen_Corpus_Directory.setText(QtGui.QApplication.translate("MainWindow", "Open Corpus &Directory...", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionClose_Corpus.setText(QtGui.QApplication.translate("MainWindow", "Close Corpus", None, QtGui.QApplication.UnicodeUTF8))
         self.action_Exit.setText(QtGui.QApplication.translate("MainWindow", "&Exit", None, QtGui.QApplication.UnicodeUTF8))
         self.action_Undo.setText(QtGui.QApplication.translate("MainWindow", "&Undo", None, QtGui.QApplication.UnicodeUTF8))
         self.action_Redo.setText(QtGui.QApplication.translate("MainWindow", "&Redo", None, QtGui.QApplication.UnicodeUTF8))
@@ -298,4 +393,10 @@ class Ui_MainWindow(object):
         self.actionRegex_Reference_Guide.setText(QtGui.QApplication.translate("MainWindow", "&Regex Reference Guide", None, QtGui.QApplication.UnicodeUTF8))
         self.actionRegex_Library.setText(QtGui.QApplication.translate("MainWindow", "Regex &Library", None, QtGui.QApplication.UnicodeUTF8))
         self.actionAbout.setText(QtGui.QApplication.translate("MainWindow", "&About", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionRecord_Timings.setText(QtGui.QApplication.translate("MainWindow", "Record &Timings", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionExport_Timings.setText(QtGui.QApplication.translate("MainWindow", "E&xport Timings Trace...", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionProfile_Handlers.setText(QtGui.QApplication.translate("MainWindow", "Pro&file Handlers", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionExport_Profile.setText(QtGui.QApplication.translate("MainWindow", "Export Profi&le...", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionCompare_Engines.setText(QtGui.QApplication.translate("MainWindow", "Co&mpare Engines", None, QtGui.QApplication.UnicodeUTF8))
+        self.actionCount_Steps.setText(QtGui.QApplication.translate("MainWindow", "Count Backtracking &Steps", None, QtGui.QApplication.UnicodeUTF8))
 
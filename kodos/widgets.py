@@ -1,21 +1,50 @@
+import math
 import os.path
 
-from PyQt4.QtGui import QPixmap, QLabel
+from PyQt4.QtCore import QObject, QEvent, QPoint, QPointF, QTimer, Qt
+from PyQt4.QtCore import pyqtSignal
+from PyQt4.QtGui import QPixmap, QLabel, QTextCursor, QTextEdit
+from PyQt4.QtGui import QFont, QFrame, QToolButton
+from PyQt4.QtGui import QAbstractItemView, QDialog, QDialogButtonBox
+from PyQt4.QtGui import QLineEdit, QMessageBox, QPlainTextEdit, QTableView
+from PyQt4.QtGui import QVBoxLayout, QWidget, QPainter, QPen, QColor
+
+from kodos import model
 
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 
 
+def formatSize(size):
+    """Return a human readable version of a size in bytes"""
+
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = 'TB'
+
+    if unit == 'B':
+        return "%d %s" % (size, unit)
+    return "%.1f %s" % (size, unit)
+
+
 class StatusBar(object):
     """Simple wrapper around the Status bar to ease Kodos messages handling"""
 
+    # The image of each indicator, in the images directory
+    INDICATORS = {
+        'ok'      : 'green.png',
+        'warning' : 'yellow.png',
+        'error'   : 'red.png',
+        'timeout' : 'red.png',
+    }
+
     def __init__(self, statusbar):
-        images = os.path.join(HERE, 'images')
-        self.indicators = {
-            'ok'      : QPixmap(os.path.join(images, 'green.png')),
-            'warning' : QPixmap(os.path.join(images, 'yellow.png')),
-            'error'   : QPixmap(os.path.join(images, 'red.png')),
-        }
+        self.statusbar = statusbar
+        # The indicators pixmaps are loaded when they are first displayed
+        self.indicators = {}
 
         self.image_indicator = QLabel()
         self.msg_indicator   = QLabel()
@@ -23,19 +52,435 @@ class StatusBar(object):
         statusbar.addWidget(self.image_indicator)
         statusbar.addWidget(self.msg_indicator)
 
+        # The details are shown in a popup, closed by clicking anywhere else
+        self.details_button = QToolButton()
+        self.details_button.setText("Details")
+        self.details_button.setAutoRaise(True)
+        self.details_button.setEnabled(False)
+        self.details_button.clicked.connect(self.showDetails)
+        statusbar.addPermanentWidget(self.details_button)
+        # Created when it is first opened
+        self.details_popup = None
+        self.details = ""
+
     def showMessage(self, msg):
         """Display a message in the status bar"""
 
         self.msg_indicator.setText(msg)
 
+    def showProgress(self, progress):
+        """Display the progress of a running scan (a
+        kodos.engine.ScanProgress instance)"""
+
+        scanned = formatSize(progress.scanned)
+        if progress.total:
+            scanned = "%s of %s" % (scanned, formatSize(progress.total))
+
+        self.setIndicator('warning')
+        self.showMessage(
+            "Scanning: %s, %d matches so far (%s/s)"
+            % (scanned, progress.matches, formatSize(progress.throughput())))
+
+    def setDetails(self, details):
+        """Set the text displayed when hovering the status bar message, and
+        in the details popup"""
+
+        self.details = details
+        self.msg_indicator.setToolTip(details)
+        if self.details_popup is not None:
+            self.details_popup.setText(details)
+        self.details_button.setEnabled(bool(details))
+
+    def showDetails(self):
+        """Open the details popup above the details button"""
+
+        popup = self.details_popup
+        if popup is None:
+            font = QFont("Monospace")
+            font.setStyleHint(QFont.TypeWriter)
+            popup = self.details_popup = QLabel(self.statusbar, Qt.Popup)
+            popup.setFont(font)
+            popup.setFrameShape(QFrame.StyledPanel)
+            popup.setMargin(6)
+            popup.setTextFormat(Qt.PlainText)
+            popup.setText(self.details)
+
+        popup.adjustSize()
+        button = self.details_button
+        position = button.mapToGlobal(QPoint(
+            button.width() - popup.width(), -popup.height()))
+        popup.move(position)
+        popup.show()
+
     def setIndicator(self, tag):
         """Set the status icon in the status bar.
 
-        The indicator can be one of: ok, warning or error
+        The indicator can be one of: ok, warning, error or timeout
+        """
+
+        tag = str(tag)
+        pixmap = self.indicators.get(tag)
+        if pixmap is None:
+            try:
+                image = self.INDICATORS[tag]
+            except KeyError:
+                raise ValueError("Unknow status bar tag: %r" % tag)
+            pixmap = self.indicators[tag] = QPixmap(
+                os.path.join(HERE, 'images', image))
+        self.image_indicator.setPixmap(pixmap)
+
+
+
+class MatchHighlighter(QObject):
+    """Highlight the matches of an evaluation result in a QPlainTextEdit.
+
+    The matches are drawn as extra selections, which don't modify the
+    document (no undo stack, no relayout), and only the matches in the visible
+    part of the editor are styled: the cost of highlighting depends on the
+    size of the viewport, not on the number of matches. The highlighting is
+    refreshed lazily when the editor is scrolled or resized.
+
+    `tracer`, if specified, is a kodos.timing.Tracer timing the refreshes.
+
+    """
+
+    def __init__(self, edit, format, tracer=None):
+        super(MatchHighlighter, self).__init__(edit)
+
+        self.edit = edit
+        self.format = format
+        self.tracer = tracer
+
+        self.result = None
+        self.first = 0
+        self.last = 0
+        self.offset = 0
+        self.snapshot = None
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self.refresh)
+
+        edit.verticalScrollBar().valueChanged.connect(self.scheduleRefresh)
+        edit.viewport().installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Resize:
+            self.scheduleRefresh()
+        return False
+
+    def setMatches(self, result, first=0, last=None, offset=0, snapshot=None):
+        """Highlight the matches of `result`, from the first-th match up to
+        (but excluding) the last-th one; all of them by default.
+
+        `offset` is the position, in the text the result refers to, of the
+        beginning of the document (when the editor only displays a part of
+        that text). `snapshot` is the kodos.snapshot.TextSnapshot of the
+        document, which maps the matches byte offsets to the editor
+        positions; they are taken as equal without it.
         """
 
+        if last is None:
+            last = len(result)
+
+        self.result = result
+        self.first = first
+        self.last = last
+        self.offset = offset
+        self.snapshot = snapshot
+        self.scheduleRefresh()
+
+    def clear(self):
+        """Remove all the highlighting"""
+
+        self.result = None
+        self._timer.stop()
+        self.edit.setExtraSelections([])
+
+    def scheduleRefresh(self, *args):
+        if self.result is not None:
+            self._timer.start()
+
+    def visibleRange(self):
+        """Return the (start, end) positions of the text currently visible"""
+
+        viewport = self.edit.viewport()
+        start = self.edit.firstVisibleBlock().position()
+
+        cursor = self.edit.cursorForPosition(
+            QPoint(viewport.width() - 1, viewport.height() - 1))
+        block = cursor.block()
+        end = block.position() + block.length()
+
+        return start, end
+
+    def _firstVisibleMatch(self, start):
+        """Return the index of the first match ending after `start`.
+
+        The matches don't overlap, so their ends are sorted as well as their
+        starts.
+        """
+
+        low, high = self.first, self.last
+        while low < high:
+            middle = (low + high) // 2
+            if self.result.span(middle)[1] <= start:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def refresh(self):
+        """Style the matches of the visible part of the editor"""
+
+        if self.result is None:
+            return
+
+        if self.tracer is None:
+            return self._refresh()
+        with self.tracer.stage("highlight"):
+            self._refresh()
+
+    def _refresh(self):
+        document = self.edit.document()
+        length = document.characterCount() - 1
+        start, end = self.visibleRange()
+        toBytes = toChars = lambda position: position
+        if self.snapshot is not None:
+            toBytes = self.snapshot.toBytes
+            toChars = self.snapshot.toChars
+        start = toBytes(start) + self.offset
+        end = toBytes(end) + self.offset
+
+        selections = []
+        for index in xrange(self._firstVisibleMatch(start), self.last):
+            matchStart, matchEnd = self.result.span(index)
+            if matchStart >= end:
+                break
+            matchStart = toChars(max(0, matchStart - self.offset))
+            matchEnd = toChars(max(0, matchEnd - self.offset))
+
+            cursor = QTextCursor(document)
+            cursor.setPosition(min(matchStart, length))
+            cursor.setPosition(min(matchEnd, length), QTextCursor.KeepAnchor)
+
+            selection = QTextEdit.ExtraSelection()
+            selection.cursor = cursor
+            selection.format = self.format
+            selections.append(selection)
+
+        self.edit.setExtraSelections(selections)
+
+
+class LibraryDialog(QDialog):
+    """Search the entries of a kodos.library.Library as the query is typed.
+
+    `chosen(index)` is emitted with the index of the entry picked, and
+    `addRequested()` when the current regex should be added to the library.
+
+    The first entries found are given to `warm` (if specified) one at a time
+    while the event loop is idle, so that picking one of them doesn't wait
+    for its pattern to be compiled; `warmed()` is emitted once they all are.
+
+    """
+
+    # Number of entries displayed for a query, and how many of them are
+    # warmed up
+    MAX_RESULTS = 500
+    WARM_COUNT = 32
+
+    chosen = pyqtSignal(int)
+    addRequested = pyqtSignal()
+    warmed = pyqtSignal()
+
+    def __init__(self, library, warm=None, parent=None):
+        super(LibraryDialog, self).__init__(parent)
+        self.setWindowTitle("Regex Library")
+
+        self.library = library
+        self.warm = warm
+        # Indexes of the entries found by the last search, and of the ones
+        # still to warm up (in reverse order)
+        self.found = []
+        self._warmQueue = []
+
+        self.queryEdit = QLineEdit()
+        self.queryEdit.setPlaceholderText("Search by name, pattern or notes")
+        self.entriesView = QTableView()
+        self.entriesView.setModel(model.SimpleTableModel(["Name", "Pattern"]))
+        self.entriesView.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.entriesView.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.entriesView.horizontalHeader().setStretchLastSection(True)
+        self.detailsText = QPlainTextEdit()
+        self.detailsText.setReadOnly(True)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Close)
+        useButton = buttons.addButton("&Use", QDialogButtonBox.AcceptRole)
+        addButton = buttons.addButton(
+            "&Add Current...", QDialogButtonBox.ActionRole)
+        removeButton = buttons.addButton(
+            "&Remove", QDialogButtonBox.ActionRole)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.queryEdit)
+        layout.addWidget(self.entriesView, 2)
+        layout.addWidget(self.detailsText, 1)
+        layout.addWidget(buttons)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._warmNext)
+
+        self.queryEdit.textChanged.connect(self.search)
+        self.entriesView.selectionModel().currentRowChanged.connect(
+            self.showDetails)
+        self.entriesView.doubleClicked.connect(self.useEntry)
+        useButton.clicked.connect(self.useEntry)
+        addButton.clicked.connect(self.addRequested)
+        removeButton.clicked.connect(self.removeEntry)
+        buttons.rejected.connect(self.reject)
+
+        self.search()
+
+    def search(self, *args):
+        """Display the entries matching the query"""
+
+        query = unicode(self.queryEdit.text())
+        self.found = self.library.search(query)[:self.MAX_RESULTS]
+        self.entriesView.model().setRows(
+            (self.library[index].name, self.library[index].pattern)
+            for index in self.found)
+        self.detailsText.clear()
+
+        self._warmQueue = self.found[self.WARM_COUNT - 1::-1]
+        if self.warm is not None and self._warmQueue:
+            self._timer.start()
+
+    def currentEntry(self):
+        """Return the index of the selected entry, or None"""
+
+        current = self.entriesView.currentIndex()
+        if not current.isValid():
+            return None
+        return self.found[current.row()]
+
+    def showDetails(self, current, previous):
+        if not current.isValid():
+            return self.detailsText.clear()
+
+        entry = self.library[self.found[current.row()]]
+        self.detailsText.setPlainText(
+            u"Flags: %s\n\n%s\n\nSample:\n%s"
+            % (entry.flags or "none", entry.notes, entry.sample))
+
+    def useEntry(self, *args):
+        index = self.currentEntry()
+        if index is None:
+            return
+        self.chosen.emit(index)
+        self.accept()
+
+    def removeEntry(self):
+        index = self.currentEntry()
+        if index is None:
+            return
+
+        answer = QMessageBox.question(
+            self, "Remove from Library",
+            u"Remove %r from the library?" % self.library[index].name,
+            QMessageBox.Yes | QMessageBox.No)
+        if answer != QMessageBox.Yes:
+            return
+
         try:
-            self.image_indicator.setPixmap(self.indicators[str(tag)])
-        except KeyError:
-            raise ValueError("Unknow status bar tag: %r" % tag)
+            self.library.remove(index)
+        except EnvironmentError, e:
+            return QMessageBox.warning(self, "Remove from Library", str(e))
+        self.search()
+
+    def _warmNext(self):
+        if not self._warmQueue:
+            self._timer.stop()
+            return self.warmed.emit()
+        self.warm(self.library[self._warmQueue.pop()])
+
+
+class ScalingPlot(QWidget):
+    """Plot the time taken by some kodos.scaling.Series over the size of
+    their inputs, on logarithmic scales.
+
+    A series which timed out ends with a cross at the top of the plot.
+
+    """
+
+    # Space around the plotted area, for the labels and the legend
+    MARGIN = 40
+
+    COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+              '#8c564b']
+
+    def __init__(self, parent=None):
+        super(ScalingPlot, self).__init__(parent)
+        self.series = []
+        self.setMinimumHeight(160)
+
+    def setSeries(self, series):
+        self.series = series
+        self.update()
+
+    def paintEvent(self, event):
+        points = [point for series in self.series
+                  for point in series.points if point[1] > 0]
+        if not points:
+            return
+
+        sizes = [size for size, seconds in points]
+        sizes.extend(series.timedOut for series in self.series
+                     if series.timedOut is not None)
+        times = [seconds for size, seconds in points]
+        left, right = math.log(min(sizes)), math.log(max(sizes))
+        bottom, top = math.log(min(times)), math.log(max(times))
+        if right <= left:
+            right = left + 1
+        if top <= bottom:
+            top = bottom + 1
+
+        area = self.rect().adjusted(
+            self.MARGIN, self.MARGIN // 2, -self.MARGIN * 4, -self.MARGIN)
+
+        def position(size, seconds):
+            return QPointF(
+                area.left() + area.width() * (math.log(size) - left)
+                / (right - left),
+                area.bottom() - area.height() * (math.log(seconds) - bottom)
+                / (top - bottom))
+
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.drawLine(area.bottomLeft(), area.bottomRight())
+        painter.drawLine(area.bottomLeft(), area.topLeft())
+        painter.drawText(area.left(), area.bottom() + 15,
+                         formatSize(min(sizes)))
+        painter.drawText(area.right() - 50, area.bottom() + 15,
+                         formatSize(max(sizes)))
+        painter.drawText(area.left() - 35, area.bottom(),
+                         "%.1fms" % (min(times) * 1000))
+        painter.drawText(area.left() - 35, area.top() + 10,
+                         "%.1fms" % (max(times) * 1000))
 
+        for number, series in enumerate(self.series):
+            color = QColor(self.COLORS[number % len(self.COLORS)])
+            painter.setPen(QPen(color, 2))
+            plotted = [position(size, seconds)
+                       for size, seconds in series.points if seconds > 0]
+            for start, end in zip(plotted, plotted[1:]):
+                painter.drawLine(start, end)
+            if series.timedOut is not None:
+                cross = position(series.timedOut, math.exp(top))
+                painter.drawLine(cross + QPointF(-4, -4),
+                                 cross + QPointF(4, 4))
+                painter.drawLine(cross + QPointF(-4, 4),
+                                 cross + QPointF(4, -4))
+            painter.drawText(area.right() + 10, area.top() + 15 * number + 10,
+                             str(series))
@@ -0,0 +1,317 @@
+"""Run the regex evaluations out of the GUI process.
+
+The re module holds the GIL while matching, so a pathological pattern would
+freeze the whole event loop if it was run in the GUI process (or in one of
+its threads). The evaluations are instead sent to worker processes, which can
+be killed as soon as their result isn't wanted anymore or when they run for
+too long.
+
+"""
+
+import multiprocessing
+import time
+
+from PyQt4 import QtCore
+
+from kodos import engine
+
+
+# Kinds of messages sent back by the workers
+RESULT = 'result'
+PROGRESS = 'progress'
+FAILURE = 'failure'
+
+def _serve(connection):
+    """Main loop of a worker process: evaluate the jobs it receives"""
+
+    while True:
+        try:
+            job = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if job is None:
+            break
+
+        jobId, function, args, withProgress = job
+
+        kwargs = {}
+        if withProgress:
+            kwargs['progress'] = lambda info: connection.send(
+                (jobId, PROGRESS, info))
+
+        try:
+            result = function(*args, **kwargs)
+        except EnvironmentError, e:
+            result = engine.EvaluationResult(None, 0, error=str(e))
+        except Exception, e:
+            # A failing job mustn't take the worker down with it
+            connection.send((jobId, FAILURE, _describe(e)))
+            continue
+
+        try:
+            connection.send((jobId, RESULT, result))
+        except Exception, e:
+            # The result can't be pickled
+            connection.send((jobId, FAILURE, _describe(e)))
+
+
+def _describe(exception):
+    return "%s: %s" % (type(exception).__name__, exception)
+
+
+class _Worker(object):
+    """A worker process, and the job it is currently running"""
+
+    def __init__(self):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child,))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+        self.jobId = None
+        self.deadline = None
+        # Index of the batch being evaluated, for the jobs run by map()
+        self.batch = None
+
+    def isBusy(self):
+        return self.jobId is not None
+
+    def submit(self, jobId, function, args, timeout, withProgress,
+               batch=None):
+        self.jobId = jobId
+        self.batch = batch
+        if timeout:
+            self.deadline = time.time() + timeout
+        self.connection.send((jobId, function, args, withProgress))
+
+    def done(self):
+        self.jobId = None
+        self.deadline = None
+        self.batch = None
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except IOError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+
+
+class EvaluationPool(QtCore.QObject):
+    """A pool of worker processes evaluating regexes asynchronously.
+
+    Only the latest submitted job matters: submitting a new job kills the
+    workers still busy with the previous ones, and replaces them with fresh
+    processes. Spare workers are kept alive so that a new job doesn't have to
+    wait for a process to start.
+
+    `finished(jobId, result)` is emitted when the latest job completes, and
+    `timedOut(jobId)` if it didn't complete within `timeout` seconds. Jobs
+    reporting their progress emit `progress(jobId, info)` while they run.
+    `failed(jobId, message)` is emitted if the job raised an exception, or
+    if its worker died.
+
+    A job can also be split in batches with map(), which are run by all the
+    workers in parallel.
+
+    """
+
+    DEFAULT_SIZE = 2
+    DEFAULT_TIMEOUT = 5.0
+    # How often, in milliseconds, the workers are checked for results
+    POLL_INTERVAL = 10
+
+    finished = QtCore.pyqtSignal(int, object)
+    timedOut = QtCore.pyqtSignal(int)
+    failed = QtCore.pyqtSignal(int, str)
+    progress = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, size=DEFAULT_SIZE, timeout=DEFAULT_TIMEOUT,
+                 parent=None):
+        super(EvaluationPool, self).__init__(parent)
+
+        if size < 1:
+            raise ValueError("The pool needs at least one worker (got %r)"
+                             % size)
+
+        self.timeout = timeout
+        self.size = size
+        self._workers = []
+        self._lastJobId = 0
+
+        # The batches of the current map() job: the function they are
+        # evaluated with, the (index, args) not submitted yet, and the results
+        self._function = None
+        self._batches = []
+        self._results = None
+        self._remaining = 0
+        self._mapTimeout = None
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(self.POLL_INTERVAL)
+        self._timer.timeout.connect(self._poll)
+
+    def _spawn(self):
+        while len(self._workers) < self.size:
+            self._workers.append(_Worker())
+
+    def submit(self, function, args, timeout=None, withProgress=False):
+        """Submit a new evaluation, and return its job id.
+
+        `function` is a module level function (usually
+        kodos.engine.evaluate()) called with `args` in a worker process. If
+        `timeout` isn't specified, the default time budget of the pool is
+        used; a timeout of 0 means no time limit.
+
+        If `withProgress` is set, the function is also given a `progress`
+        keyword argument: a callable sending its argument back to the pool.
+        """
+
+        if timeout is None:
+            timeout = self.timeout
+
+        self.cancel()
+        self._spawn()
+
+        self._lastJobId += 1
+        self._workers[0].submit(
+            self._lastJobId, function, args, timeout, withProgress)
+        self._timer.start()
+
+        return self._lastJobId
+
+    def map(self, function, batches, timeout=None):
+        """Submit a job evaluating `function` with each of the `batches`
+        arguments, spread over all the workers, and return its job id.
+
+        `progress(jobId, (index, result))` is emitted as soon as the index-th
+        batch is evaluated, and `finished(jobId, results)` once they all are,
+        with the results in the order of the batches. The `timeout` applies to
+        each batch.
+        """
+
+        if timeout is None:
+            timeout = self.timeout
+
+        self.cancel()
+        self._spawn()
+
+        self._lastJobId += 1
+        self._function = function
+        self._batches = list(enumerate(batches))
+        self._batches.reverse()
+        self._results = [None] * len(self._batches)
+        self._remaining = len(self._batches)
+        self._mapTimeout = timeout
+
+        for worker in self._workers:
+            self._submitBatch(worker)
+        self._timer.start()
+
+        return self._lastJobId
+
+    def _submitBatch(self, worker):
+        if not self._batches:
+            return
+        index, args = self._batches.pop()
+        worker.submit(self._lastJobId, self._function, args,
+                      self._mapTimeout, False, index)
+
+    def cancel(self):
+        """Kill the evaluations currently running, if any"""
+
+        for worker in [w for w in self._workers if w.isBusy()]:
+            worker.kill()
+            self._workers.remove(worker)
+
+        self._function = None
+        self._batches = []
+        self._results = None
+        self._remaining = 0
+        self._timer.stop()
+
+    def respawn(self):
+        """Replace the idle workers by new processes.
+
+        The workers are forked from the GUI process: the new ones start with
+        whatever it has cached since (like compiled patterns).
+        """
+
+        for worker in [w for w in self._workers if not w.isBusy()]:
+            worker.stop()
+            self._workers.remove(worker)
+        self._spawn()
+
+    def shutdown(self):
+        """Stop all the worker processes"""
+
+        self.cancel()
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+    def _poll(self):
+        for worker in [w for w in self._workers if w.isBusy()]:
+            finished = False
+            while not finished and worker.connection.poll():
+                try:
+                    jobId, kind, payload = worker.connection.recv()
+                except (EOFError, IOError):
+                    return self._fail(worker.jobId, "The worker process died")
+                if kind == FAILURE:
+                    return self._fail(jobId, payload)
+                if kind == PROGRESS:
+                    if jobId == self._lastJobId:
+                        self.progress.emit(jobId, payload)
+                    continue
+
+                finished = True
+                batch = worker.batch
+                worker.done()
+                if jobId == self._lastJobId and batch is not None:
+                    self._results[batch] = payload
+                    self._remaining -= 1
+                    self._submitBatch(worker)
+                    self.progress.emit(jobId, (batch, payload))
+                    if jobId != self._lastJobId:
+                        # The slots submitted a new job already
+                        return
+                    if not self._remaining:
+                        self._timer.stop()
+                        results, self._results = self._results, None
+                        self.finished.emit(jobId, results)
+                        return
+                elif jobId == self._lastJobId:
+                    self._timer.stop()
+                    self.finished.emit(jobId, payload)
+                    # The slots may have submitted a new job already
+                    return
+
+            if (not finished and worker.deadline is not None
+                    and time.time() > worker.deadline):
+                jobId = worker.jobId
+                # The other batches of the job aren't wanted anymore either
+                self.cancel()
+                self._spawn()
+                self.timedOut.emit(jobId)
+                return
+
+    def _fail(self, jobId, message):
+        """Give up the job whose worker failed, and replace the workers"""
+
+        # The failing worker is still busy: it is replaced along with the
+        # ones running the other batches of the job
+        self.cancel()
+        self._spawn()
+        if jobId == self._lastJobId:
+            self.failed.emit(jobId, message)
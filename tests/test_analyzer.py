@@ -0,0 +1,39 @@
+import unittest
+
+from kodos import analyzer
+
+
+class AnalyzeTest(unittest.TestCase):
+
+    def assertRisk(self, pattern, risk):
+        self.assertEqual(analyzer.risk(analyzer.analyze(pattern)), risk)
+
+    def test_nested_quantifiers(self):
+        self.assertRisk(r"(a+)+", analyzer.EXPONENTIAL)
+        self.assertRisk(r"(\w+\s?)*", analyzer.EXPONENTIAL)
+
+    def test_overlapping_alternatives(self):
+        self.assertRisk(r"(a|a)*", analyzer.EXPONENTIAL)
+        self.assertRisk(r"(?:[^a]|b)*", analyzer.EXPONENTIAL)
+        self.assertRisk(r"(?:[^a]|[^b])*", analyzer.EXPONENTIAL)
+
+    def test_disjoint_alternatives(self):
+        self.assertRisk(r'"(?:[^"\\]|\\.)*"', 0)
+        self.assertRisk(r"'(?:[^'\\]|\\.)*'", 0)
+        self.assertRisk(r"(?:[^ab]|a)*c", 0)
+
+    def test_ignore_case(self):
+        self.assertRisk(r"(?i)(?:[^a]|A)*", 0)
+        self.assertRisk(r"(?i)(?:[^a]|B)*", analyzer.EXPONENTIAL)
+
+    def test_adjacent_quantifiers(self):
+        self.assertRisk(r"\d+\d*", analyzer.POLYNOMIAL)
+        self.assertRisk(r"[^x]*[^y]*", analyzer.POLYNOMIAL)
+        self.assertRisk(r"x[^x]*x*", 0)
+
+    def test_invalid_pattern(self):
+        self.assertEqual(analyzer.analyze(r"(a+"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
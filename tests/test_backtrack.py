@@ -0,0 +1,64 @@
+import re
+import unittest
+
+from kodos import backtrack
+
+
+class CountStepsTest(unittest.TestCase):
+
+    def test_literal(self):
+        count = backtrack.countSteps(r"abc", 0, "xabc")
+        # One failed attempt at 0, three steps to match, one attempt at 4
+        self.assertEqual(count.steps, [5])
+        self.assertEqual(count.backtracks, [0])
+        self.assertEqual(count.matches, [(1, 4, 4, 0)])
+        self.assertFalse(count.exhausted)
+
+    def test_one_step_per_position(self):
+        count = backtrack.countSteps(r"x", 0, "aaaa")
+        self.assertEqual(count.totalSteps(), 5)
+        self.assertEqual(count.matches, [])
+        self.assertEqual(count.scanned, 4)
+
+    def test_subexpressions(self):
+        count = backtrack.countSteps(r"(a|b)c", 0, "bc")
+        self.assertEqual(count.spans, [(0, 6), (0, 5)])
+        self.assertEqual(count.steps, [3, 2])
+
+    def test_exponential_growth(self):
+        steps = [backtrack.countSteps(r"(a+)+b", 0, "a" * size).totalSteps()
+                 for size in (10, 11, 12)]
+        self.assertEqual(steps, [10213, 20451, 40929])
+        # Each character doubles the number of ways to split the "a"s
+        for previous, current in zip(steps, steps[1:]):
+            self.assertTrue(1.9 * previous < current < 2.1 * previous)
+
+    def test_budget(self):
+        count = backtrack.countSteps(r"(a+)+b", 0, "a" * 40, budget=10000)
+        self.assertTrue(count.exhausted)
+        self.assertEqual(count.scanned, 0)
+        self.assertEqual(count.summary(),
+                         "10001 steps, 2984 backtracks (gave up at offset 0)")
+
+    def test_invalid_pattern(self):
+        count = backtrack.countSteps(r"(", 0, "a")
+        self.assertEqual(count.summary(),
+                         "Steps not counted: unbalanced parenthesis")
+
+    def test_same_matches_as_re(self):
+        text = "abab aab ba a1 b22 abba\nx a"
+        for pattern, flags in [(r"a+b", 0), (r"(a|ab)(c|bcd)?", 0),
+                               (r"a*?b", 0), (r"(\w)\1", 0),
+                               (r"\b\w", 0), (r"a(?=b)", 0),
+                               (r"(?<!a)b", 0), (r"^\w", re.M),
+                               (r"A\w", re.I), (r"x*", 0)]:
+            count = backtrack.countSteps(pattern, flags, text)
+            self.assertEqual(
+                [(start, end) for start, end, steps, backtracks
+                 in count.matches],
+                [match.span() for match
+                 in re.finditer(pattern, text, flags)], pattern)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import re
+import unittest
+
+from kodos import engine
+
+
+def spans(result):
+    return [result.span(index) for index in xrange(len(result))]
+
+
+class EvaluateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.window = engine.SCAN_WINDOW
+        engine.SCAN_WINDOW = 16 * 1024
+
+    def tearDown(self):
+        engine.SCAN_WINDOW = self.window
+
+    def test_windowed_scan(self):
+        text = "ab12 a1 x b22 " * 10000
+        for pattern in [r"[a-z]{1,2}\d\d", r"(a|b)\d?", r"x?", r"\d{2,3}"]:
+            expected = [match.span(1 if "(" in pattern else 0)
+                        for match in re.finditer(pattern, text)]
+            result = engine.evaluate(pattern, 0, text, progress=lambda p: 0)
+            self.assertEqual(
+                [result.span(index, 1 if result.groups else 0)
+                 for index in xrange(len(result))], expected)
+
+    def test_progress_without_matches(self):
+        reported = []
+        engine.evaluate(r"\d{2}X", 0, "12 " * 100000,
+                        progress=lambda p: reported.append(p.scanned),
+                        interval=0)
+        self.assertTrue(len(reported) > 1)
+        self.assertEqual(reported, sorted(reported))
+
+
+class RematchTest(unittest.TestCase):
+
+    def assertRematches(self, pattern, text, edited, edit):
+        previous = engine.evaluate(pattern, 0, text)
+        self.assertEqual(spans(engine.rematch(previous, edited, edit)),
+                         spans(engine.evaluate(pattern, 0, edited)))
+
+    def test_bounded_pattern(self):
+        text = "ab12 " * 1000
+        position = len(text) // 2
+        self.assertRematches(r"[a-z]{2}\d\d", text,
+                             text[:position] + "x" + text[position + 1:],
+                             engine.Edit(position, 1, 1))
+
+    def test_unbounded_lookahead(self):
+        text = "word " * 1000 + "END"
+        self.assertRematches(r"\w+(?=[\s\S]*END)", text, text[:-3],
+                             engine.Edit(len(text) - 3, 3, 0))
+
+    def test_bounded_repeat_wider_than_context(self):
+        text = "1" * 3000
+        self.assertRematches(r"\d{1,1500}X|\d", text,
+                             text[:1400] + "X" + text[1400:],
+                             engine.Edit(1400, 0, 1))
+
+    def test_bounded_alternative_wider_than_context(self):
+        text = "a" * 2000
+        self.assertRematches(r"(?:a{1,3000}c|a)", text, text + "c",
+                             engine.Edit(len(text), 0, 1))
+
+    def test_capped_result(self):
+        text = "ab12 " * 20000
+        previous = engine.evaluate(r"[a-z]{2}\d\d", 0, text[:64 * 1024])
+        previous.capped = True
+        # The end of the text is deleted
+        edited = text[:50 * 1024]
+        edit = engine.Edit(len(edited), len(text) - len(edited), 0)
+        self.assertEqual(len(engine.rematch(previous, edited, edit)), 10240)
+
+    def test_can_rematch(self):
+        self.assertTrue(engine.canRematch(r"[a-z]{2}\d{1,3}", 0))
+        self.assertFalse(engine.canRematch(r"\w+", 0))
+        self.assertFalse(engine.canRematch(r"a(?=b)", 0))
+        self.assertFalse(engine.canRematch(r"^a", 0))
+        self.assertFalse(engine.canRematch(r"(a)\1", 0))
+        self.assertFalse(engine.canRematch(r"(?:a|b+)c", 0))
+        self.assertFalse(engine.canRematch(r"a{1,2000}", 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from kodos import engine, largefile
+
+
+class MappedFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def mapFile(self, data):
+        path = os.path.join(self.directory, "text")
+        with open(path, 'wb') as output:
+            output.write(data)
+        mapped = largefile.MappedFile(path)
+        self.addCleanup(mapped.close)
+        return mapped
+
+    def test_slicing(self):
+        data = "".join("line %d\n" % number for number in xrange(1000))
+        mapped = self.mapFile(data)
+        self.assertEqual(len(mapped), len(data))
+        self.assertEqual(mapped[5:9], data[5:9])
+        self.assertEqual(mapped[len(data) - 4:], data[-4:])
+        self.assertEqual(mapped[0], "l")
+
+    def test_empty_file(self):
+        path = os.path.join(self.directory, "empty")
+        open(path, 'wb').close()
+        self.assertRaises(IOError, largefile.MappedFile, path)
+
+    def test_page(self):
+        data = "".join("line %d\n" % number for number in xrange(100000))
+        mapped = self.mapFile(data)
+        start = data.index("line 50000\n")
+        pageStart, page = mapped.page(start, start + 10)
+        self.assertEqual(page, data[pageStart:pageStart + len(page)])
+        self.assertTrue(pageStart < start)
+        self.assertTrue(start + 10 < pageStart + len(page))
+        self.assertTrue(len(page) <= 2 * largefile.MappedFile.PAGE_SIZE)
+        # The page is cut at line boundaries
+        self.assertEqual(data[pageStart - 1], "\n")
+        self.assertEqual(data[pageStart + len(page)], "\n")
+
+    def test_scan_file(self):
+        data = "".join("id=%d\n" % number for number in xrange(1000))
+        path = self.mapFile(data).path
+        result = largefile.scanFile(r"id=(\d+)", 0, path)
+        self.assertEqual(len(result), 1000)
+        self.assertEqual(result.group(data, 999, 1), "999")
+
+    def test_sort_by_group(self):
+        data = u"k=\xe9t\xe9 k=zz k=abc k= k=\u4e2d".encode('utf-8')
+        mapped = self.mapFile(data)
+        result = engine.evaluate(r"k=(\S*)", 0, mapped.mapped)
+        values = sorted(result.group(data, index, 1)
+                        for index in xrange(len(result)))
+        self.assertEqual([result.group(mapped, index, 1) for index
+                          in result.sortedByGroup(mapped, 1)], values)
+        self.assertEqual([result.group(mapped, index, 1) for index
+                          in result.sortedByGroup(mapped, 1, reverse=True)],
+                         values[::-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
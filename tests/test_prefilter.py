@@ -0,0 +1,60 @@
+import random
+import re
+import unittest
+
+from kodos import prefilter
+
+
+PATTERN = r"\w{1,8} user_id=(\d+)"
+
+
+class RequiredLiteralTest(unittest.TestCase):
+
+    def test_bounded_prefix(self):
+        literal = prefilter.requiredLiteral(PATTERN)
+        self.assertEqual(literal.text, " user_id=")
+        self.assertEqual((literal.minOffset, literal.maxOffset), (1, 8))
+
+    def test_no_safe_literal(self):
+        for pattern in [r"(?i)\w{1,8} user_id=", r"user_id=\d+",
+                        r"\w+ user_id=", r"\d\dabc|xyz", r"\d{2}ab"]:
+            self.assertEqual(prefilter.requiredLiteral(pattern), None)
+
+
+class FinditerTest(unittest.TestCase):
+
+    def assertSameMatches(self, pattern, text):
+        regex = re.compile(pattern)
+        literal = prefilter.requiredLiteral(pattern)
+        self.assertNotEqual(literal, None)
+        self.assertEqual(
+            [match.span(0) + match.span(1) for match
+             in prefilter.finditer(regex, text, literal)],
+            [match.span(0) + match.span(1) for match
+             in regex.finditer(text)])
+
+    def test_rare_literal(self):
+        lines = ["GET /index.html 200 %d bytes\n" % size
+                 for size in xrange(5000)]
+        lines[1000] = "login user_id=42\n"
+        lines[3000] = "x" * 20 + " user_id=7 user_id=8\n"
+        self.assertSameMatches(PATTERN, "".join(lines))
+
+    def test_common_literal(self):
+        self.assertSameMatches(PATTERN, "ab user_id=" * 10000 + "ab user_id=1")
+
+    def test_random_texts(self):
+        random.seed(0)
+        for pattern in [PATTERN, r"(\d{0,3})abc", r"(a|bb)xyz",
+                        r"(?:[ab]{2,4}|c)(1)xyz", r"[ab](\d{0,3})xyz"]:
+            for size in xrange(0, 400, 10):
+                text = "".join(random.choice("abcxyz1 ") for i in
+                               xrange(size))
+                for word in ["abc", "xyz", " user_id=1"]:
+                    position = random.randint(0, len(text))
+                    text = text[:position] + word + text[position:]
+                self.assertSameMatches(pattern, text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import random
+import unittest
+
+from kodos import engine, snapshot
+
+
+def utf16Units(text):
+    return len(text.encode('utf-16-le')) // 2
+
+
+class TextSnapshotTest(unittest.TestCase):
+
+    def makeText(self, size):
+        random.seed(size)
+        chars = [u"a", u" ", u"\xe9", u"\u4e2d", u"\U0001f600", u"\n"]
+        return u"".join(random.choice(chars) for i in xrange(size))
+
+    def test_ascii(self):
+        current = snapshot.TextSnapshot(u"plain text")
+        self.assertEqual(current.toChars(6), 6)
+        self.assertEqual(current.toBytes(6), 6)
+
+    def test_round_trips(self):
+        text = self.makeText(3000)
+        current = snapshot.TextSnapshot(text)
+        data = current.data
+        self.assertEqual(snapshot.utf16Length(data), utf16Units(text))
+
+        offset = 0
+        for char in text:
+            units = utf16Units(data[:offset].decode('utf-8'))
+            self.assertEqual(current.toChars(offset), units)
+            self.assertEqual(current.toBytes(units), offset)
+            offset += len(char.encode('utf-8'))
+        self.assertEqual(current.toChars(len(data)), utf16Units(text))
+        self.assertEqual(current.toBytes(utf16Units(text)), len(data))
+
+    def test_astral_characters(self):
+        current = snapshot.TextSnapshot(u"\U0001f600x\U0001f600")
+        # Each of them is 4 bytes long, and takes 2 UTF-16 code units
+        self.assertEqual([current.toChars(offset) for offset in (0, 4, 5, 9)],
+                         [0, 2, 3, 5])
+        self.assertEqual([current.toBytes(units) for units in (0, 2, 3, 5)],
+                         [0, 4, 5, 9])
+
+    def test_invalid_utf8(self):
+        current = snapshot.TextSnapshot.fromBytes("caf\xe9")
+        self.assertEqual(current.text, u"caf\xe9")
+        self.assertEqual(current.toChars(4), 4)
+
+    def test_byte_edit(self):
+        old = snapshot.TextSnapshot(u"\xe9\xe9 \U0001f600 end")
+        new = snapshot.TextSnapshot(u"\xe9\xe9 \U0001f600\U0001f600 end")
+        # The second emoji is inserted after the first one
+        edit = snapshot.byteEdit(engine.Edit(5, 0, 2), old, new)
+        self.assertEqual((edit.start, edit.oldEnd, edit.newEnd),
+                         (9, 9, 13))
+
+
+if __name__ == '__main__':
+    unittest.main()